@@ -0,0 +1,430 @@
+"""Funnel analytics over conversation event logs.
+
+Streams the JSONL segments written by ``event_log.EventLog`` and reports,
+per day and language, how many conversations reach each step of the
+flow and where the rest leave: a 'no', no Biology in 12th, or going
+quiet. Also counts clarification turns per step and the time from
+greeting to the end of the flow.
+
+    python analytics.py events/
+    python analytics.py events/ --workers 4 --timeout 1800 --json
+
+Lines go through a generator pipeline (lines -> events -> finished
+conversations -> counters), so memory holds only the conversations still
+open, never the log. Segments of several writers (worker processes
+logging to one directory) are read side by side and merged by time. With
+``--workers`` each process reads every file but parses and follows only
+its share of users, picked by a hash of the user id, so a conversation
+that spans segments is still seen whole.
+"""
+
+import argparse
+import heapq
+import json
+import os
+import re
+import sys
+import zlib
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+from multiprocessing import Pool
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from chatbot import FLOW, ConversationState
+
+# (ts, user key, from_state, to_state, lang, intent, reply kind); labels stay
+# bytes. The reply kind is None in logs written before it was recorded.
+Event = Tuple[float, bytes, bytes, bytes, bytes, Optional[bytes], Optional[bytes]]
+
+
+def funnel_stages() -> Tuple[str, ...]:
+    """The steps a 'yes' to everything walks through, from the first question."""
+    stages = []
+    state = FLOW[ConversationState.INITIAL].on_yes
+    while state != ConversationState.END and state.value not in stages:
+        stages.append(state.value)
+        state = FLOW[state].on_yes
+    return tuple(stages)
+
+
+STAGES = funnel_stages()
+COMPLETED = 'completed'
+EXITS = ('said_no', 'no_biology', 'went_quiet', COMPLETED)
+PERCENTILES = (50, 90, 99)
+
+_INITIAL = ConversationState.INITIAL.value.encode()
+_END = ConversationState.END.value.encode()
+_BIOLOGY = ConversationState.BIOLOGY_CHECK.value.encode()
+_LAST_STAGE = STAGES[-1].encode()
+_STAGE_INDEX = {stage.encode(): i for i, stage in enumerate(STAGES)}
+_NO = b'no'
+_UNKNOWN = b'unknown'
+_CLARIFY = b'clarify'
+
+# The layout EventLog writes; anything else falls back to json.loads
+_TS = b'{"ts": '
+_USER = b', "user_id": '
+_FROM = b', "from_state": "'
+# A segment's sequence number; what comes before it names the writer
+_SEQUENCE = re.compile(r'-\d+\.jsonl\Z')
+
+
+def segment_paths(inputs: Iterable[str]) -> List[str]:
+    """Files named on the command line, with directories expanded to their segments in order."""
+    paths = []
+    for path in inputs:
+        if os.path.isdir(path):
+            paths += sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.jsonl'))
+        else:
+            paths.append(path)
+    return paths
+
+
+def writers(paths: Iterable[str]) -> List[List[str]]:
+    """``paths`` grouped by the writer of each segment, each group in the order given."""
+    groups: Dict[str, List[str]] = {}
+    for path in paths:
+        groups.setdefault(_SEQUENCE.sub('', path), []).append(path)
+    return list(groups.values())
+
+
+def read_lines(paths: Iterable[str]) -> Iterator[bytes]:
+    for path in paths:
+        with open(path, 'rb') as f:
+            for line in f:
+                # A crash mid-write can leave the last line cut short
+                if line.endswith(b'\n'):
+                    yield line
+
+
+def _parse_json(line: bytes) -> Optional[Event]:
+    try:
+        event = json.loads(line)
+        intent, reply = event.get('intent'), event.get('reply')
+        return (float(event['ts']), json.dumps(event['user_id'], ensure_ascii=False).encode('utf-8'),
+                event['from_state'].encode(), event['to_state'].encode(), event['lang'].encode(),
+                None if intent is None else intent.encode(), None if reply is None else reply.encode())
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+
+def merged_events(paths: Sequence[str], partition: int = 0, partitions: int = 1) -> Iterator[Event]:
+    """The events of ``paths`` in time order, merging the segments of separate writers."""
+    # Each writer's events are in time order already
+    streams = [parse_events(read_lines(group), partition, partitions) for group in writers(paths)]
+    if len(streams) == 1:
+        return streams[0]
+    return heapq.merge(*streams, key=itemgetter(0))
+
+
+def parse_events(lines: Iterable[bytes], partition: int = 0, partitions: int = 1) -> Iterator[Event]:
+    """Events of the users in ``partition`` of ``partitions``; lines that do not parse are skipped.
+
+    The user key is the user id as its JSON-encoded bytes, which is how it
+    appears in the line, so it needs no decoding.
+    """
+    crc32 = zlib.crc32
+    for line in lines:
+        u = line.find(_USER) if line.startswith(_TS) else -1
+        f = line.find(_FROM, u) if u > 0 else -1
+        if f > 0:
+            user = line[u + len(_USER):f]
+            if partitions > 1 and crc32(user) % partitions != partition:
+                continue
+            rest = line[f + len(_FROM):].split(b'"')
+            # from, ', ', to_state, ': ', to, ', ', lang, ': ', lang, ', ', intent, ': ', intent or ': null...',
+            # then optionally ', ', reply, ': ', reply or ': null}'
+            if len(rest) >= 12 and rest[2] == b'to_state' and rest[6] == b'lang' and rest[10] == b'intent':
+                try:
+                    ts = float(line[len(_TS):u])
+                except ValueError:
+                    continue
+                # Index of what follows the intent
+                after = 13 if rest[11] == b': ' and len(rest) > 13 else 11
+                intent = rest[12] if after == 13 else None
+                reply = (rest[after + 3] if len(rest) > after + 3 and rest[after + 1] == b'reply'
+                         and rest[after + 2] == b': ' else None)
+                yield ts, user, rest[0], rest[4], rest[8], intent, reply
+                continue
+        event = _parse_json(line)
+        if event is not None and (partitions == 1 or crc32(event[1]) % partitions == partition):
+            yield event
+
+
+class Conversation:
+    """What the report needs from one conversation, followed turn by turn."""
+    __slots__ = ('start', 'last', 'lang', 'stage', 'said_no', 'biology_no', 'completed', 'clarifications')
+
+    def __init__(self, ts: float, lang: bytes):
+        self.start = ts
+        self.last = ts
+        self.lang = lang
+        self.stage = -1  # furthest index in STAGES
+        self.said_no = False
+        self.biology_no = False
+        self.completed: Optional[float] = None
+        self.clarifications: Optional[Counter] = None
+
+    def exit(self) -> str:
+        if self.completed is not None:
+            return COMPLETED
+        if self.said_no:
+            return 'said_no'
+        return 'no_biology' if self.biology_no and self.stage <= _STAGE_INDEX[_BIOLOGY] else 'went_quiet'
+
+
+def conversations(events: Iterable[Event], timeout: float = 1800.0) -> Iterator[Conversation]:
+    """Group events into conversations and yield each once it is over.
+
+    A conversation is over when it reaches the end of the flow, when its
+    user starts again from the greeting, or when it has been quiet for
+    ``timeout`` seconds of log time. Events are expected in time order, as
+    the event log writes them. Conversations already under way when the
+    log starts have no greeting and are skipped.
+    """
+    # user -> conversation, least recently active first
+    open_: 'OrderedDict[bytes, Conversation]' = OrderedDict()
+    for ts, user, from_state, to_state, lang, intent, reply in events:
+        while open_:
+            oldest = next(iter(open_.values()))
+            if oldest.last > ts - timeout:
+                break
+            yield open_.popitem(last=False)[1]
+
+        conversation = open_.get(user)
+        if from_state == _INITIAL:
+            if conversation is not None:
+                yield open_.pop(user)
+            conversation = open_[user] = Conversation(ts, lang)
+        elif conversation is None:
+            continue
+        else:
+            open_.move_to_end(user)
+        conversation.last = ts
+        conversation.lang = lang
+
+        stage = _STAGE_INDEX.get(to_state)
+        if stage is not None and stage > conversation.stage:
+            conversation.stage = stage
+        if from_state == to_state:
+            # Logs without reply kinds can't tell an FAQ answer from a clarification
+            if reply == _CLARIFY or reply is None and intent == _UNKNOWN:
+                if conversation.clarifications is None:
+                    conversation.clarifications = Counter()
+                conversation.clarifications[from_state] += 1
+            elif intent == _NO and from_state == _BIOLOGY:
+                conversation.biology_no = True
+        elif to_state == _END:
+            if from_state == _LAST_STAGE:
+                conversation.completed = ts
+            elif intent == _NO:
+                conversation.said_no = True
+            yield open_.pop(user)
+    yield from open_.values()
+
+
+def _day(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%d')
+
+
+class FunnelReport:
+    """Counters over finished conversations; reports from separate workers add up."""
+
+    def __init__(self):
+        # (day, lang, furthest stage index, exit)
+        self.outcomes: Counter = Counter()
+        # (day, lang, state) -> clarification turns, and conversations with any
+        self.clarification_turns: Counter = Counter()
+        self.clarified: Counter = Counter()
+        # (lang, whole seconds) -> completed conversations
+        self.completion_seconds: Counter = Counter()
+        self.conversations = 0
+
+    def add(self, conversation: Conversation) -> None:
+        day, lang = _day(conversation.start), conversation.lang.decode()
+        self.conversations += 1
+        self.outcomes[day, lang, conversation.stage, conversation.exit()] += 1
+        if conversation.clarifications:
+            for state, turns in conversation.clarifications.items():
+                self.clarification_turns[day, lang, state.decode()] += turns
+                self.clarified[day, lang, state.decode()] += 1
+        if conversation.completed is not None:
+            self.completion_seconds[lang, int(conversation.completed - conversation.start)] += 1
+
+    def merge(self, other: 'FunnelReport') -> 'FunnelReport':
+        self.outcomes.update(other.outcomes)
+        self.clarification_turns.update(other.clarification_turns)
+        self.clarified.update(other.clarified)
+        self.completion_seconds.update(other.completion_seconds)
+        self.conversations += other.conversations
+        return self
+
+    def days(self) -> List[str]:
+        return sorted({day for day, _, _, _ in self.outcomes})
+
+    def langs(self) -> List[str]:
+        return sorted({lang for _, lang, _, _ in self.outcomes})
+
+    def funnel(self, day: Optional[str] = None, lang: Optional[str] = None) -> Dict[str, object]:
+        """Conversations reaching each stage, and how the others ended, for one day and/or language."""
+        furthest: Counter = Counter()
+        exits: Counter = Counter()
+        for (d, l, stage, exit_), count in self.outcomes.items():
+            if (day is None or d == day) and (lang is None or l == lang):
+                furthest[stage] += count
+                exits[stage, exit_] += count
+        started = sum(furthest.values())
+        # reached[i]: conversations whose furthest stage is i or later
+        reached = []
+        remaining = started - furthest[-1]
+        for i in range(len(STAGES)):
+            reached.append(remaining)
+            remaining -= furthest[i]
+        completed = sum(count for (_, exit_), count in exits.items() if exit_ == COMPLETED)
+        rows = []
+        previous = started
+        for i, stage in enumerate(STAGES + (COMPLETED,)):
+            count = reached[i] if i < len(STAGES) else completed
+            rows.append({
+                'stage': stage,
+                'reached': count,
+                'conversion': count / previous if previous else None,
+                'exits': {exit_: exits[i, exit_] for exit_ in EXITS if exit_ != COMPLETED and exits[i, exit_]},
+            })
+            previous = count
+        return {'conversations': started, 'completed': completed, 'stages': rows}
+
+    def clarifications(self, lang: Optional[str] = None) -> List[Dict[str, object]]:
+        turns: Counter = Counter()
+        clarified: Counter = Counter()
+        for (_, l, state), count in self.clarification_turns.items():
+            if lang is None or l == lang:
+                turns[state] += count
+        for (_, l, state), count in self.clarified.items():
+            if lang is None or l == lang:
+                clarified[state] += count
+        return [{'state': state, 'turns': turns[state], 'conversations': clarified[state],
+                 'turns_per_conversation': turns[state] / clarified[state]}
+                for state in STAGES if clarified[state]]
+
+    def completion_percentiles(self, lang: Optional[str] = None) -> Dict[int, Optional[int]]:
+        """Nearest-rank percentiles of seconds from greeting to the end of the flow."""
+        seconds = sorted((s, n) for (l, s), n in self.completion_seconds.items() if lang is None or l == lang)
+        total = sum(n for _, n in seconds)
+        result: Dict[int, Optional[int]] = {}
+        for pct in PERCENTILES:
+            rank = max(1, -(-pct * total // 100))
+            seen = 0
+            result[pct] = None
+            for s, n in seconds:
+                seen += n
+                if seen >= rank:
+                    result[pct] = s
+                    break
+        return result
+
+    def to_dict(self) -> Dict[str, object]:
+        langs = self.langs()
+        return {
+            'conversations': self.conversations,
+            'funnel': {lang or 'all': self.funnel(lang=lang) for lang in [None] + langs},
+            'daily': {day: {lang or 'all': self.funnel(day, lang) for lang in [None] + langs}
+                      for day in self.days()},
+            'clarifications': {lang or 'all': self.clarifications(lang) for lang in [None] + langs},
+            'completion_seconds': {lang or 'all': self.completion_percentiles(lang) for lang in [None] + langs},
+        }
+
+
+def analyze(paths: Sequence[str], timeout: float = 1800.0, partition: int = 0, partitions: int = 1) -> FunnelReport:
+    report = FunnelReport()
+    for conversation in conversations(merged_events(paths, partition, partitions), timeout):
+        report.add(conversation)
+    return report
+
+
+def _analyze_partition(args) -> FunnelReport:
+    return analyze(*args)
+
+
+def analyze_parallel(paths: Sequence[str], workers: int, timeout: float = 1800.0) -> FunnelReport:
+    if workers <= 1:
+        return analyze(paths, timeout)
+    with Pool(workers) as pool:
+        reports = pool.map(_analyze_partition, [(paths, timeout, k, workers) for k in range(workers)])
+    total = FunnelReport()
+    for report in reports:
+        total.merge(report)
+    return total
+
+
+def _percent(value: Optional[float]) -> str:
+    return '-' if value is None else '%.1f%%' % (value * 100)
+
+
+def _table(headers: Sequence[str], rows: List[Sequence[object]]) -> str:
+    cells = [[str(c) for c in headers]] + [[str(c) for c in row] for row in rows]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(headers))]
+    lines = ['  '.join(c.ljust(w) for c, w in zip(row, widths)).rstrip() for row in cells]
+    lines.insert(1, '  '.join('-' * w for w in widths))
+    return '\n'.join(lines)
+
+
+def format_report(report: FunnelReport) -> str:
+    langs = report.langs()
+    columns = [None] + langs
+    funnels = [report.funnel(lang=lang) for lang in columns]
+    out = ['%d conversations, %d completed' % (funnels[0]['conversations'], funnels[0]['completed']), '']
+
+    headers = ['stage'] + ['%s reached' % (lang or 'all') for lang in columns] + ['conversion', 'said no',
+                                                                                  'no biology', 'went quiet']
+    rows = []
+    for i, stage in enumerate(STAGES + (COMPLETED,)):
+        row = funnels[0]['stages'][i]
+        rows.append([stage] + [f['stages'][i]['reached'] for f in funnels] + [
+            _percent(row['conversion']), row['exits'].get('said_no', 0), row['exits'].get('no_biology', 0),
+            row['exits'].get('went_quiet', 0)])
+    out += ['Funnel', _table(headers, rows), '']
+
+    days = report.days()
+    if days:
+        keys = [(day, lang) for day in days for lang in columns]
+        daily = [report.funnel(day, lang)['stages'] for day, lang in keys]
+        rows = [[stage] + [_percent(None if stages[i]['conversion'] is None else 1 - stages[i]['conversion'])
+                           for stages in daily]
+                for i, stage in enumerate(STAGES + (COMPLETED,))]
+        headers = ['stage'] + ['%s %s' % (day, lang or 'all') for day, lang in keys]
+        out += ['Daily drop-off before each stage', _table(headers, rows), '']
+
+    rows = [[c['state'], c['turns'], c['conversations'], '%.2f' % c['turns_per_conversation']]
+            for c in report.clarifications()]
+    out += ['Clarification loops', _table(['state', 'turns', 'conversations', 'turns/conversation'], rows), '']
+
+    rows = [[lang or 'all'] + ['-' if v is None else v for v in report.completion_percentiles(lang).values()]
+            for lang in columns]
+    out += ['Seconds to complete', _table(['lang'] + ['p%d' % p for p in PERCENTILES], rows)]
+    return '\n'.join(out)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='+', help='event log segments or directories of them')
+    parser.add_argument('--workers', type=int, default=1, help='processes to split the users across')
+    parser.add_argument('--timeout', type=float, default=1800.0,
+                        help='seconds of silence after which a conversation counts as abandoned')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    paths = segment_paths(args.paths)
+    if not paths:
+        parser.error('no event log segments found')
+    report = analyze_parallel(paths, args.workers, args.timeout)
+    if args.json:
+        json.dump(report.to_dict(), sys.stdout, indent=2)
+        print()
+    else:
+        print(format_report(report))
+
+
+if __name__ == '__main__':
+    main()
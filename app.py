@@ -1,9 +1,50 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, g, render_template, request, jsonify
 from chatbot import NursingCollegeChatbot
+from metrics import CONTENT_TYPE
+from rate_limit import TOO_MANY_REQUESTS_BODY, RateLimiter, client_ip
+from reply_cache import ReplyCache
+from router import EXPORT_PATH, IMPORT_PATH, TOKEN_ENV, export_sessions, import_sessions, is_router_request
+from tenants import TenantRegistry
+import os
+import time
 import uuid
 
 app = Flask(__name__)
-chatbot = NursingCollegeChatbot()
+chatbot = NursingCollegeChatbot.from_env()
+replies = ReplyCache(chatbot.reply_texts())
+# Other colleges served by this process, picked by the request's tenant_id
+tenants = TenantRegistry.from_env(chatbot)
+tenants.track_replies(replies)
+
+# Limits on /chat and /chat/batch, and one reply for a message sent twice
+limiter = RateLimiter.from_env(chatbot.metrics)
+
+# Set by router.py for its workers; without it the session handover endpoints don't exist
+router_token = os.environ.get(TOKEN_ENV)
+
+def unknown_tenant():
+    return jsonify({'error': 'unknown tenant'}), 404
+
+def throttled(user_id=None):
+    """A 429 response if this request is over a limit, else None"""
+    ip = client_ip(request.remote_addr, request.headers.get('X-Forwarded-For'))
+    hit = limiter.check(user_id if isinstance(user_id, str) else None, ip)
+    if hit is None:
+        return None
+    return Response(TOO_MANY_REQUESTS_BODY, status=429, mimetype='application/json',
+                    headers={'Retry-After': hit.retry_after_header})
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    if chatbot.metrics is not None and 'request_start' in g:
+        # The route pattern, not the raw path, so unknown URLs don't add label values
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        chatbot.metrics.request_seconds.observe(time.perf_counter() - g.request_start, endpoint)
+    return response
 
 @app.route('/')
 def index():
@@ -13,24 +54,94 @@ def index():
 def chat():
     data = request.get_json()
     user_message = data.get('message', '')
-    user_id = data.get('user_id', str(uuid.uuid4()))
-    
-    response = chatbot.get_response(user_id, user_message)
+    user_id = data.get('user_id') or str(uuid.uuid4())
+    tenant = tenants.get(data.get('tenant_id'))
+    if tenant is None:
+        return unknown_tenant()
+    refused = throttled(user_id)
+    if refused is not None:
+        return refused
     
+    if isinstance(user_id, str):
+        response = limiter.reply((data.get('tenant_id') or '', user_id), user_message,
+                                 lambda: tenant.get_response(user_id, user_message), data.get('message_id'))
+    else:
+        response = tenant.get_response(user_id, user_message)
+
+    # The reply is pre-encoded; only the user_id is spliced in
+    gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+    headers = {'Vary': 'Accept-Encoding'}
+    if gzip:
+        headers['Content-Encoding'] = 'gzip'
+    return Response(replies.chat_body(response, user_id, gzip=gzip), mimetype='application/json',
+                    headers=headers)
+
+@app.route('/chat/batch', methods=['POST'])
+def chat_batch():
+    data = request.get_json()
+    messages = [(item.get('user_id') or str(uuid.uuid4()), item.get('message', ''))
+                for item in data.get('messages', [])]
+    tenant = tenants.get(data.get('tenant_id'))
+    if tenant is None:
+        return unknown_tenant()
+    refused = throttled()
+    if refused is not None:
+        return refused
+
+    responses = tenant.get_responses_batch(messages)
+
     return jsonify({
-        'response': response,
-        'user_id': user_id
+        'responses': [{'user_id': user_id, 'response': response}
+                      for (user_id, _), response in zip(messages, responses)]
     })
 
 @app.route('/reset', methods=['POST'])
 def reset():
     data = request.get_json()
     user_id = data.get('user_id', '')
+    tenant = tenants.get(data.get('tenant_id'))
+    if tenant is None:
+        return unknown_tenant()
     
-    if user_id in chatbot.sessions:
-        del chatbot.sessions[user_id]
+    if user_id in tenant.sessions:
+        del tenant.sessions[user_id]
+    if isinstance(user_id, str):
+        limiter.forget((data.get('tenant_id') or '', user_id))
     
     return jsonify({'status': 'success'})
 
+@app.route('/history', methods=['POST'])
+def history():
+    data = request.get_json()
+    user_id = data.get('user_id', '')
+    tenant = tenants.get(data.get('tenant_id'))
+    if tenant is None:
+        return unknown_tenant()
+
+    return jsonify({'user_id': user_id, 'history': tenant.get_history(user_id)})
+
+def handover(step):
+    headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in request.headers.items()]
+    if not is_router_request(router_token, headers):
+        return jsonify({'error': 'not found'}), 404
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'expected a JSON object'}), 400
+    return jsonify(step(tenants, data))
+
+@app.route(EXPORT_PATH, methods=['POST'])
+def sessions_export():
+    return handover(export_sessions)
+
+@app.route(IMPORT_PATH, methods=['POST'])
+def sessions_import():
+    return handover(import_sessions)
+
+@app.route('/metrics')
+def metrics():
+    if chatbot.metrics is None:
+        return Response('metrics are disabled\n', status=404, mimetype='text/plain')
+    return Response(chatbot.metrics.render(), content_type=CONTENT_TYPE)
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
@@ -0,0 +1,274 @@
+"""ASGI entry point serving the same /chat, /chat/batch, /reset and /history JSON contract as app.py.
+
+An idle browser tab costs a coroutine here instead of a worker thread.
+Turns are answered inline on the event loop: ``get_response`` is a few
+microseconds of CPU work and its session lock is never held across an
+await. Run it with any ASGI server, e.g.
+
+    uvicorn asgi_app:app --port 5000
+
+It also serves the chat page and a WebSocket at ``/ws``. The user (and
+college) are bound once, when the socket connects:
+
+    ws://host/ws?user_id=...&tenant_id=...
+
+Both are optional. The first frame from the server is
+``{"user_id": ...}``. After that every text frame from the client is one
+message and every text frame back is the reply, with no JSON or headers
+per turn. A socket that cannot connect leaves the page on ``POST /chat``.
+"""
+
+import json
+import os
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple, Union
+from urllib.parse import parse_qs
+
+from chatbot import NursingCollegeChatbot
+from metrics import CONTENT_TYPE
+from rate_limit import TOO_MANY_REQUESTS_BODY, RateLimiter, Throttled, client_ip
+from reply_cache import ReplyCache
+from router import EXPORT_PATH, IMPORT_PATH, TOKEN_ENV, export_sessions, import_sessions, is_router_request
+from tenants import TenantRegistry
+
+Scope = Dict
+Receive = Callable[[], Awaitable[Dict]]
+Send = Callable[[Dict], Awaitable[None]]
+
+JSON_HEADERS = [(b'content-type', b'application/json')]
+PAGE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'index.html')
+
+WEBSOCKET_PATH = '/ws'
+# Longer messages close the socket with 1009 (message too big)
+MAX_WEBSOCKET_MESSAGE = 4096
+# Close codes in the range left to applications
+CLOSE_NOT_FOUND = 4404
+# Over a rate limit (RFC 6455 "try again later")
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+class EncodedBody(NamedTuple):
+    body: bytes
+    gzipped: bool
+
+
+class ChatbotASGI:
+    def __init__(self, chatbot: NursingCollegeChatbot, tenants: Optional[TenantRegistry] = None,
+                 router_token: Optional[str] = None, limiter: Optional[RateLimiter] = None):
+        self.chatbot = chatbot
+        # Per-user and per-address limits and duplicate coalescing on /chat, /chat/batch and /ws; None for none
+        self.limiter = limiter
+        self.replies = ReplyCache(chatbot.reply_texts())
+        # Requests name their college in tenant_id; without one they go to ``chatbot``
+        self.tenants = tenants if tenants is not None else TenantRegistry(default=chatbot)
+        self.tenants.track_replies(self.replies)
+        # Handlers take the tenant's chatbot, the JSON payload and whether the client accepts gzip
+        self.routes: Dict[Tuple[str, str],
+                          Callable[[NursingCollegeChatbot, Dict, bool], Union[Dict, EncodedBody]]] = {
+            ('POST', '/chat'): self.chat,
+            ('POST', '/chat/batch'): self.chat_batch,
+            ('POST', '/reset'): self.reset,
+            ('POST', '/history'): self.history,
+        }
+        # Session handover between workers behind router.py; answered only to requests with its token
+        self.router_token = router_token
+        self.handover_routes: Dict[Tuple[str, str], Callable[[TenantRegistry, Dict], Dict]] = {
+            ('POST', EXPORT_PATH): export_sessions,
+            ('POST', IMPORT_PATH): import_sessions,
+        }
+
+    def chat(self, chatbot: NursingCollegeChatbot, data: Dict, gzip: bool) -> EncodedBody:
+        user_message = data.get('message', '')
+        user_id = data.get('user_id') or str(uuid.uuid4())
+        if self.limiter is not None and isinstance(user_id, str):
+            response = self.limiter.reply((data.get('tenant_id') or '', user_id), user_message,
+                                          lambda: chatbot.get_response(user_id, user_message), data.get('message_id'))
+        else:
+            response = chatbot.get_response(user_id, user_message)
+        return EncodedBody(self.replies.chat_body(response, user_id, gzip=gzip), gzip)
+
+    def chat_batch(self, chatbot: NursingCollegeChatbot, data: Dict, gzip: bool) -> Dict:
+        messages = [(item.get('user_id') or str(uuid.uuid4()), item.get('message', ''))
+                    for item in data.get('messages', [])]
+        responses = chatbot.get_responses_batch(messages)
+        return {'responses': [{'user_id': user_id, 'response': response}
+                              for (user_id, _), response in zip(messages, responses)]}
+
+    def reset(self, chatbot: NursingCollegeChatbot, data: Dict, gzip: bool) -> Dict:
+        chatbot.sessions.pop(data.get('user_id', ''))
+        if self.limiter is not None and isinstance(data.get('user_id'), str):
+            self.limiter.forget((data.get('tenant_id') or '', data['user_id']))
+        return {'status': 'success'}
+
+    def history(self, chatbot: NursingCollegeChatbot, data: Dict, gzip: bool) -> Dict:
+        user_id = data.get('user_id', '')
+        return {'user_id': user_id, 'history': chatbot.get_history(user_id)}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] == 'websocket':
+            await self._websocket(scope, receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        start = time.perf_counter()
+        route = (scope['method'], scope['path'])
+        await self._handle(route, scope, receive, send)
+        if self.chatbot.metrics is not None:
+            endpoint = scope['path'] if route in self.routes or route in (('GET', '/metrics'), ('GET', '/')) \
+                else 'unmatched'
+            self.chatbot.metrics.request_seconds.observe(time.perf_counter() - start, endpoint)
+
+    async def _handle(self, route: Tuple[str, str], scope: Scope, receive: Receive, send: Send) -> None:
+        if route == ('GET', '/metrics') and self.chatbot.metrics is not None:
+            await send({'type': 'http.response.start', 'status': 200,
+                        'headers': [(b'content-type', CONTENT_TYPE.encode())]})
+            await send({'type': 'http.response.body', 'body': self.chatbot.metrics.render().encode()})
+            return
+        if route == ('GET', '/'):
+            await self._send_page(send)
+            return
+
+        handover = self.handover_routes.get(route)
+        if handover is not None and is_router_request(self.router_token, scope.get('headers', ())):
+            data = await self._read_json(receive)
+            if not isinstance(data, dict):
+                await self._send(send, 400, {'error': 'expected a JSON object'})
+                return
+            await self._send(send, 200, handover(self.tenants, data))
+            return
+
+        handler = self.routes.get(route)
+        if handler is None:
+            status = 405 if any(path == scope['path'] for _, path in self.routes) else 404
+            await self._send(send, status, {'error': 'not found' if status == 404 else 'method not allowed'})
+            return
+
+        if self.limiter is not None and route[1] != '/reset':
+            # Before reading the body, so a flood from one address costs the least; a batch counts once
+            throttled = self.limiter.check(ip=self._client_ip(scope))
+            if throttled is not None:
+                await self._send_throttled(send, throttled)
+                return
+        data = await self._read_json(receive)
+        if not isinstance(data, dict):
+            await self._send(send, 400, {'error': 'expected a JSON object'})
+            return
+        chatbot = self.tenants.get(data.get('tenant_id'))
+        if chatbot is None:
+            await self._send(send, 404, {'error': 'unknown tenant'})
+            return
+        if self.limiter is not None and route[1] == '/chat' and isinstance(data.get('user_id'), str):
+            throttled = self.limiter.check(user_id=data['user_id'])
+            if throttled is not None:
+                await self._send_throttled(send, throttled)
+                return
+        gzip = any(name == b'accept-encoding' and b'gzip' in value for name, value in scope.get('headers', ()))
+        await self._send(send, 200, handler(chatbot, data, gzip))
+
+    async def _websocket(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """One conversation per socket: a text frame in is a message, a text frame out its reply."""
+        if (await receive())['type'] != 'websocket.connect':
+            return
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        tenant_id = query.get('tenant_id', [''])[0]
+        chatbot = self.tenants.get(tenant_id) if scope['path'] == WEBSOCKET_PATH else None
+        if chatbot is None:
+            # Closing before accepting refuses the handshake
+            await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+            return
+        user_id = query.get('user_id', [''])[0] or str(uuid.uuid4())
+        await send({'type': 'websocket.accept'})
+        await send({'type': 'websocket.send', 'text': json.dumps({'user_id': user_id})})
+
+        metrics = self.chatbot.metrics
+        while True:
+            message = await receive()
+            if message['type'] != 'websocket.receive':
+                return
+            start = time.perf_counter()
+            text = message.get('text')
+            if text is None:
+                text = (message.get('bytes') or b'').decode('utf-8', 'replace')
+            if len(text) > MAX_WEBSOCKET_MESSAGE:
+                await send({'type': 'websocket.close', 'code': 1009})
+                return
+            if self.limiter is None:
+                reply = chatbot.get_response(user_id, text)
+            else:
+                if self.limiter.check(user_id, self._client_ip(scope)) is not None:
+                    # The page carries on over POST /chat, where it is told when to retry
+                    await send({'type': 'websocket.close', 'code': CLOSE_TRY_AGAIN_LATER})
+                    return
+                reply = self.limiter.reply((tenant_id, user_id), text, lambda: chatbot.get_response(user_id, text))
+            await send({'type': 'websocket.send', 'text': reply})
+            if metrics is not None:
+                metrics.request_seconds.observe(time.perf_counter() - start, WEBSOCKET_PATH)
+
+    async def _send_page(self, send: Send) -> None:
+        try:
+            with open(PAGE_PATH, 'rb') as f:
+                page = f.read()
+        except FileNotFoundError:
+            await self._send(send, 404, {'error': 'not found'})
+            return
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'text/html; charset=utf-8')]})
+        await send({'type': 'http.response.body', 'body': page})
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.tenants.close()
+                self.chatbot.sessions.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    def _client_ip(scope: Scope) -> Optional[str]:
+        client = scope.get('client')
+        forwarded = next((value for name, value in scope.get('headers', ()) if name == b'x-forwarded-for'), None)
+        return client_ip(client[0] if client else None, forwarded.decode('latin-1') if forwarded else None)
+
+    @staticmethod
+    async def _send_throttled(send: Send, throttled: Throttled) -> None:
+        await send({'type': 'http.response.start', 'status': 429, 'headers': JSON_HEADERS + [
+            (b'retry-after', throttled.retry_after_header.encode())]})
+        await send({'type': 'http.response.body', 'body': TOO_MANY_REQUESTS_BODY})
+
+    @staticmethod
+    async def _read_json(receive: Receive) -> Optional[object]:
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        try:
+            return json.loads(body)
+        except ValueError:
+            return None
+
+    @staticmethod
+    async def _send(send: Send, status: int, payload: Union[Dict, EncodedBody]) -> None:
+        headers = JSON_HEADERS
+        if isinstance(payload, EncodedBody):
+            body = payload.body
+            if payload.gzipped:
+                headers = JSON_HEADERS + [(b'content-encoding', b'gzip'), (b'vary', b'accept-encoding')]
+        else:
+            body = json.dumps(payload).encode()
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+_chatbot = NursingCollegeChatbot.from_env()
+app = ChatbotASGI(_chatbot, TenantRegistry.from_env(_chatbot), os.environ.get(TOKEN_ENV),
+                  RateLimiter.from_env(_chatbot.metrics))
@@ -0,0 +1,4 @@
+"""Micro-benchmarks for the chatbot. Run from the repository root, e.g.
+
+    python -m benchmarks.bench_flow
+"""
@@ -0,0 +1,129 @@
+"""Throughput of the funnel analytics over a synthetic event log.
+
+Generates event log segments from random walks over the conversation
+flow (yes, no, unclear replies and users going quiet, in English and
+Hindi, interleaved in time across users and days), then times the
+analytics with one process and with several, and the plain
+``json.loads`` reader for comparison.
+
+    python -m benchmarks.bench_analytics [conversations] [workers]
+"""
+
+import heapq
+import os
+import random
+import sys
+import tempfile
+import time
+
+from analytics import analyze, analyze_parallel, segment_paths
+from chatbot import FLOW, ConversationState, Intent, ReplyKind
+from event_log import _encode, read_events
+from benchmarks.common import print_table
+
+CONVERSATIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+WORKERS = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+SEGMENT_BYTES = 16 * 2 ** 20
+START = 1760000000.0
+DAYS = 7
+
+P_UNCLEAR = 0.06
+P_NO = 0.05
+P_QUIET = 0.04
+
+
+def walk(rng: random.Random, user_id: str, ts: float):
+    """Events of one conversation, with a few seconds between turns."""
+    lang = 'hi' if rng.random() < 0.4 else 'en'
+    state = ConversationState.INITIAL
+    while state != ConversationState.END:
+        step = FLOW[state]
+        roll = rng.random()
+        if state != ConversationState.INITIAL and roll < P_QUIET:
+            return
+        if step.clarify is not None and roll < P_QUIET + P_UNCLEAR:
+            intent, to_state, reply = Intent.UNKNOWN, state, ReplyKind.CLARIFY
+        elif step.clarify is not None and roll < P_QUIET + P_UNCLEAR + P_NO:
+            intent, to_state, reply = Intent.NO, step.on_no, ReplyKind.STEP
+        else:
+            intent, to_state, reply = Intent.YES, step.on_yes, ReplyKind.STEP
+        yield (ts, user_id, state.value, to_state.value, lang, intent, reply)
+        state = to_state
+        ts += rng.expovariate(1 / 8.0)
+
+
+def generate(directory: str, conversations: int, seed: int = 17) -> int:
+    """Write ``conversations`` interleaved conversations as event log segments; returns the event count."""
+    rng = random.Random(seed)
+    span = DAYS * 86400.0
+    starts = sorted(START + rng.random() * span for _ in range(conversations))
+    # A few users come back for a second conversation
+    users = ['user-%d' % rng.randrange(int(conversations * 0.9)) for _ in range(conversations)]
+    walks = [walk(rng, user_id, ts) for user_id, ts in zip(users, starts)]
+    heap = []
+    for i, events in enumerate(walks):
+        event = next(events, None)
+        if event is not None:
+            heap.append((event[0], i, event))
+    heapq.heapify(heap)
+
+    written = sequence = size = 0
+    out = None
+    batch = []
+    while heap:
+        _, i, event = heap[0]
+        batch.append(_encode(event))
+        following = next(walks[i], None)
+        if following is None:
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, (following[0], i, following))
+        if len(batch) == 4096 or not heap:
+            data = ''.join(batch).encode('utf-8')
+            batch = []
+            if out is None or size + len(data) > SEGMENT_BYTES:
+                if out is not None:
+                    out.close()
+                sequence += 1
+                out = open(os.path.join(directory, 'events-%08d.jsonl' % sequence), 'wb')
+                size = 0
+            out.write(data)
+            size += len(data)
+            written += data.count(b'\n')
+    if out is not None:
+        out.close()
+    return written
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        events, generating = timed(lambda: generate(directory, CONVERSATIONS))
+        paths = segment_paths([directory])
+        size = sum(os.path.getsize(path) for path in paths)
+
+        def json_only():
+            return sum(1 for _ in read_events(paths))
+        _, json_read = timed(json_only)
+        report, single = timed(lambda: analyze(paths))
+        parallel_report, parallel = timed(lambda: analyze_parallel(paths, WORKERS))
+
+    assert parallel_report.to_dict() == report.to_dict()
+    rows = [('json.loads every line (no analysis)', json_read), ('analytics, 1 process', single),
+            ('analytics, %d processes' % WORKERS, parallel)]
+    print('%d conversations, %d events, %.1f MiB in %d segments (generated in %.1fs)\n' % (
+        CONVERSATIONS, events, size / 2 ** 20, len(paths), generating))
+    print_table(('pass', 'seconds', 'MiB/s', 'events/s'), [
+        (name, '%.2f' % seconds, '%.1f' % (size / 2 ** 20 / seconds), '%.0f' % (events / seconds))
+        for name, seconds in rows])
+    funnel = report.funnel()
+    print('\n%d conversations analysed, %d completed' % (funnel['conversations'], funnel['completed']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Flask (threaded) versus the ASGI entry point at high concurrency.
+
+Starts each server on a local port, then replays conversations from many
+concurrent keep-alive clients and reports requests per second and p99
+latency. Needs Flask and uvicorn installed.
+
+    python -m benchmarks.bench_asgi [concurrency ...]
+"""
+
+import asyncio
+import socket
+import subprocess
+import sys
+import time
+
+from benchmarks.common import print_table, server_env
+from benchmarks.loadgen import run_load
+
+REQUESTS_PER_CLIENT = 50
+REPLIES = ['hello', 'yes', 'haan', 'batao', 'tell me', 'ok', 'sure', 'interested', 'more', 'what',
+           'kya hai', 'bilkul']
+
+SERVERS = {
+    'flask (threaded)': [sys.executable, '-c',
+                         'import sys; from app import app; '
+                         'app.run(port=int(sys.argv[1]), threaded=True, debug=False)'],
+    'asgi (uvicorn)': [sys.executable, '-m', 'uvicorn', 'asgi_app:app', '--log-level', 'warning',
+                       '--backlog', '4096', '--port'],
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('server on port %d did not start' % port)
+
+
+def conversation(client_id, i):
+    return '/chat', {'user_id': 'bench-%d' % client_id, 'message': REPLIES[i % len(REPLIES)]}
+
+
+def main() -> None:
+    levels = [int(arg) for arg in sys.argv[1:]] or [10, 100, 500]
+    rows = []
+    for name, command in SERVERS.items():
+        port = free_port()
+        server = subprocess.Popen(command + [str(port)], stdout=subprocess.DEVNULL, env=server_env())
+        try:
+            wait_for_port(port)
+            for concurrency in levels:
+                result = asyncio.run(run_load('127.0.0.1', port, concurrency, REQUESTS_PER_CLIENT, conversation))
+                rows.append((name, concurrency, '%.0f' % result['rps'], '%.1f' % result['p50_ms'],
+                             '%.1f' % result['p99_ms'], result['errors']))
+        finally:
+            server.terminate()
+            server.wait()
+    print_table(('server', 'concurrency', 'req/s', 'p50 ms', 'p99 ms', 'errors'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""Per-message ``get_response`` versus ``get_responses_batch`` on gateway bursts.
+
+A burst mixes many users, most of them mid-conversation, with the short
+repetitive replies a WhatsApp/SMS gateway delivers.
+"""
+
+import random
+
+from chatbot import NursingCollegeChatbot
+from benchmarks.common import print_table, time_per_call
+
+REPLIES = ['yes', 'haan', 'Haan', 'ok', 'batao', 'tell me', 'nahi', 'no', 'हाँ', 'नहीं', 'hmm', 'kya hai']
+
+
+def make_burst(size, users):
+    rng = random.Random(size)
+    return [('user-%d' % rng.randrange(users), rng.choice(REPLIES)) for _ in range(size)]
+
+
+def main() -> None:
+    rows = []
+    for size in (10, 100, 500):
+        burst = make_burst(size, users=size // 2 or 1)
+        single = NursingCollegeChatbot()
+        batch = NursingCollegeChatbot()
+
+        def one_by_one():
+            for user_id, text in burst:
+                single.get_response(user_id, text)
+
+        per_message = time_per_call(one_by_one, number=200) / size
+        batched = time_per_call(lambda: batch.get_responses_batch(burst), number=200) / size
+        rows.append((size, '%.0f' % per_message, '%.0f' % batched, '%.2fx' % (per_message / batched)))
+
+    print_table(('burst size', 'per-message ns/msg', 'batch ns/msg', 'speedup'), rows)
+
+
+if __name__ == '__main__':
+    main()
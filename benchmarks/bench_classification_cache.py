@@ -0,0 +1,89 @@
+"""Hit rate and cost of ``ClassificationCache`` on the replies users actually send.
+
+Replies come from the load-test corpus in conversation order, once as
+they are and once with one reply in ten replaced by one-off free text.
+For each mix the table gives the hit rate of a freshly warmed cache and
+the cost of reading a reply three ways: language detection and intent
+classification with no memo, the same with ``LanguageDetector``'s own
+memo, and the cache. Each pass starts from a new detector or cache, so
+misses count as often as they would in traffic. Then come whole turns
+through ``get_response``, with the cache and with one of size 0.
+"""
+
+import random
+import time
+
+from chatbot import ClassificationCache, IntentClassifier, LanguageDetector, NursingCollegeChatbot
+from benchmarks.common import print_table
+from benchmarks.loadtest import DEFAULT_CORPUS, load_corpus
+
+ONE_OFF_SHARE = 0.1
+ONE_OFF = ['what is the fee for the {} year', 'is there a hostel for {} students', 'I scored {} percent in 12th',
+           'my name is {} and I want to apply', 'mera admission {} mein ho sakta hai kya']
+
+
+def with_one_offs(replies, seed=2024):
+    rng = random.Random(seed)
+    return [ONE_OFF[i % len(ONE_OFF)].format(rng.randrange(10 ** 6)) if rng.random() < ONE_OFF_SHARE else text
+            for i, text in enumerate(replies)]
+
+
+def per_reply_ns(make, replies, repeat=5) -> float:
+    """Best time per reply of one pass over ``replies``, each pass with a fresh reader from ``make()``."""
+    best = float('inf')
+    for _ in range(repeat):
+        fn = make()
+        start = time.perf_counter_ns()
+        for text in replies:
+            fn(text)
+        best = min(best, (time.perf_counter_ns() - start) / len(replies))
+    return best
+
+
+def main() -> None:
+    conversations = load_corpus(DEFAULT_CORPUS)
+    corpus = [text for conversation in conversations for text in conversation['messages']]
+    classifier = IntentClassifier()
+    rows = []
+    for name, replies in (('replay corpus', corpus), ('with 10% one-off text', with_one_offs(corpus))):
+        cache = ClassificationCache(LanguageDetector(), classifier)
+        for text in replies:
+            cache.read(text)
+        stats = cache.stats()
+        hit_rate = stats['hits'] / (stats['hits'] + stats['misses'])
+
+        def uncached(memo_size):
+            # What a turn did before the cache: detect, classify, and the bare-word check
+            detector = LanguageDetector(memo_size=memo_size, memo_max_length=64 if memo_size else -1)
+
+            def read(text):
+                detector.detect(text)
+                classifier.classify(text)
+                return text.strip().lower() in classifier.words
+            return read
+
+        rows.append((name, len(replies), len(set(replies)), '%.1f%%' % (hit_rate * 100),
+                     '%.0f' % per_reply_ns(lambda: uncached(0), replies),
+                     '%.0f' % per_reply_ns(lambda: uncached(4096), replies),
+                     '%.0f' % per_reply_ns(lambda: ClassificationCache(LanguageDetector(), classifier).read, replies)))
+    print_table(('replies', 'count', 'distinct', 'hit rate', 'no memo ns', 'language memo ns', 'cache ns'), rows)
+
+    print()
+    turn_rows = []
+    for name, size in (('cache', 4096), ('no cache (size 0)', 0)):
+        chatbot = NursingCollegeChatbot(classification_cache=ClassificationCache(LanguageDetector(), classifier,
+                                                                                 max_size=size))
+        best = float('inf')
+        for run in range(5):
+            start = time.perf_counter_ns()
+            for conversation in conversations:
+                user_id = '%s-%d' % (conversation['conversation_id'], run)
+                for text in conversation['messages']:
+                    chatbot.get_response(user_id, text)
+            best = min(best, (time.perf_counter_ns() - start) / len(corpus))
+        turn_rows.append((name, '%.0f' % best))
+    print_table(('get_response over the corpus', 'ns/turn'), turn_rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""Per-turn cost of the conversation event log.
+
+Replays the same conversations with and without an ``EventLog`` (the
+request path only buffers; the flush thread writes in the background),
+then times one ``record`` call and how fast events reach the disk.
+"""
+
+import tempfile
+import time
+
+from chatbot import NursingCollegeChatbot
+from event_log import EventLog
+from benchmarks.bench_metrics import per_turn
+from benchmarks.common import print_table, time_per_call
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        plain = per_turn(NursingCollegeChatbot())
+        log = EventLog(directory, max_bytes=16 * 2 ** 20, max_segments=4)
+        logged = per_turn(NursingCollegeChatbot(event_log=log))
+        record = time_per_call(lambda: log.record(time.time(), 'bench', 'fee_structure', 'hostel_facilities', 'en',
+                                                  'yes'), number=50000)
+        log.close()
+
+        # Record as fast as one thread can while the flush thread keeps up
+        events = 200000
+        log = EventLog(directory, max_bytes=16 * 2 ** 20, max_segments=4, capacity=events)
+        start = time.perf_counter()
+        for _ in range(events):
+            log.record(time.time(), 'bench', 'fee_structure', 'hostel_facilities', 'en', 'yes')
+        log.close()
+        elapsed = time.perf_counter() - start
+        stats = log.stats()
+
+    print_table(('chatbot', 'ns/turn'), [
+        ('no event log', '%.0f' % plain),
+        ('EventLog', '%.0f' % logged),
+    ])
+    print('\nevent log overhead: %.2f us/turn' % ((logged - plain) / 1000))
+    print('record(): %.0f ns' % record)
+    print('recorded and written: %.0f events/s, %d flushes' % (events / elapsed, stats['flushes']))
+    print('dropped: %d, rotations: %d' % (stats['dropped'], stats['rotations']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""FAQ lookup latency and top-1 accuracy over a labelled query corpus.
+
+Also reports the added cost of the lookup on an ordinary yes/no turn.
+"""
+
+from chatbot import NursingCollegeChatbot
+from benchmarks.common import percentile, print_table, time_per_call
+
+QUERIES = [
+    ('what is the fee?', 'fee_structure'),
+    ('how much are the fees per year', 'fee_structure'),
+    ('fees kitni hai', 'fee_structure'),
+    ('फीस कितनी है?', 'fee_structure'),
+    ('can I pay in installments', 'fee_structure'),
+    ('is there a hostel', 'hostel_facilities'),
+    ('hostel kaisa hai', 'hostel_facilities'),
+    ('छात्रावास की सुविधा है?', 'hostel_facilities'),
+    ('is there cctv and a warden for girls', 'hostel_facilities'),
+    ('where is the college located', 'college_location'),
+    ('college kahan hai', 'college_location'),
+    ('is it recognized by INC', 'recognition'),
+    ('manyata hai kya', 'recognition'),
+    ('which hospitals for clinical training', 'clinical_training'),
+    ('practical training kahan hoti hai', 'clinical_training'),
+    ('any scholarship available?', 'scholarship'),
+    ('छात्रवृत्ति मिलेगी?', 'scholarship'),
+    ('how many seats', 'total_seats'),
+    ('kitni seats hain', 'total_seats'),
+    ('what is the age limit', 'eligibility'),
+    ('is PNT exam required', 'eligibility'),
+    ('योग्यता क्या है', 'eligibility'),
+    ('how many years is the course', 'program_details'),
+    ('course duration', 'program_details'),
+    ('yes', None),
+    ('haan', None),
+    ('no thanks', None),
+    ('hmm', None),
+    ('tell me more', None),
+]
+
+
+def main() -> None:
+    chatbot = NursingCollegeChatbot()
+    faq = chatbot.faq
+    rows = []
+    timings = []
+    correct = 0
+    for query, expected in QUERIES:
+        ns = time_per_call(lambda: faq.best(query), number=20000)
+        timings.append(ns)
+        got = faq.best(query)
+        correct += got == expected
+        rows.append((query, expected or '-', got or '-', '%.0f' % ns))
+    print_table(('query', 'expected', 'answered', 'ns/lookup'), rows)
+    print('\ntop-1 accuracy: %d/%d, p50 %.1f us, p99 %.1f us' % (
+        correct, len(QUERIES), percentile(timings, 50) / 1000, percentile(timings, 99) / 1000))
+
+    session = chatbot.get_session('bench')
+    def yes_turn():
+        session.state = session.state.BIOLOGY_CHECK
+        chatbot.get_response('bench', 'haan')
+    def question_turn():
+        chatbot.get_response('bench', 'what is the fee?')
+    print('yes/no turn: %.0f ns, FAQ turn: %.0f ns' % (time_per_call(yes_turn), time_per_call(question_turn)))
+
+
+if __name__ == '__main__':
+    main()
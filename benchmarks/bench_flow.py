@@ -0,0 +1,33 @@
+"""Per-turn latency of ``get_response`` at every depth of the flow.
+
+With the table-driven engine the cost of a turn should not depend on how
+far into the conversation the session is.
+"""
+
+from chatbot import FLOW, NursingCollegeChatbot
+from benchmarks.common import print_table, time_per_call
+
+
+def main() -> None:
+    chatbot = NursingCollegeChatbot()
+    session = chatbot.get_session('bench')
+    rows = []
+
+    for depth, state in enumerate(FLOW):
+        def yes_turn(state=state):
+            session.state = state
+            chatbot.get_response('bench', 'yes')
+
+        def unclear_turn(state=state):
+            session.state = state
+            chatbot.get_response('bench', 'hmm')
+
+        rows.append((depth, state.name,
+                     '%.0f' % time_per_call(yes_turn, number=20000),
+                     '%.0f' % time_per_call(unclear_turn, number=20000)))
+
+    print_table(('depth', 'state', "'yes' ns/turn", "'hmm' ns/turn"), rows)
+
+
+if __name__ == '__main__':
+    main()
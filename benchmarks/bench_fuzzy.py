@@ -0,0 +1,62 @@
+"""Accuracy and cost of typo-tolerant yes/no matching.
+
+Replays a labelled corpus of misspelt replies, correctly spelt replies
+and look-alike words that are neither, through the classifier with and
+without the fuzzy index, and times a single ``FuzzyIndex.lookup``.
+"""
+
+from chatbot import DEFAULT_INTENT_CLASSIFIER, Intent, IntentClassifier
+from benchmarks.common import print_table, time_per_call
+
+YES, NO, UNKNOWN = Intent.YES, Intent.NO, Intent.UNKNOWN
+
+# (reply, intent the user meant)
+LABELLED = [
+    # Misspelt yes
+    ('yess', YES), ('yesss', YES), ('yse', YES), ('yas', YES), ('yes!!', YES), ('haa', YES), ('haaan', YES),
+    ('hn', YES), ('han', YES), ('hann ji', YES), ('okk', YES), ('okkk', YES), ('okya', YES), ('oaky', YES),
+    ('bilkull', YES), ('bilkool', YES), ('bilkl', YES), ('zarur', YES), ('jaroor', YES), ('zaroorr', YES),
+    ('sur', YES), ('suree', YES), ('intrested', YES), ('interstd', YES), ('intersted', YES), ('btao', YES),
+    ('bataoo', YES), ('alrigt', YES), ('allright', YES), ('fien', YES),
+    # Misspelt no
+    ('nhi', NO), ('nahii', NO), ('nai', NO), ('nahin', NO), ('nahe', NO), ('noo', NO), ('nooo', NO),
+    ('nop', NO), ('nopee', NO), ('dnt', NO), ('nahi jii', NO),
+    # Spelt correctly
+    ('yes', YES), ('haan', YES), ('ok', YES), ('no', NO), ('nahi', NO), ('nope', NO),
+    # Neither: ordinary words and fillers that must not turn into an answer
+    ('now', UNKNOWN), ('know', UNKNOWN), ('on', UNKNOWN), ('go', UNKNOWN), ('how', UNKNOWN), ('hmm', UNKNOWN),
+    ('hello', UNKNOWN), ('hi', UNKNOWN), ('ji', UNKNOWN), ('acha', UNKNOWN), ('maybe', UNKNOWN),
+    ('wait', UNKNOWN), ('one', UNKNOWN), ('note', UNKNOWN), ('food', UNKNOWN), ('?', UNKNOWN),
+    ('hope', UNKNOWN), ('hot', UNKNOWN), ('can', UNKNOWN), ('had', UNKNOWN), ('has', UNKNOWN), ('an', UNKNOWN),
+    ('less', UNKNOWN), ('mess', UNKNOWN), ('fees', UNKNOWN), ('grate', UNKNOWN), ('i hope so', UNKNOWN),
+    ('uninterested', UNKNOWN), ('im uninterested', UNKNOWN), ('fright', UNKNOWN), ('light', UNKNOWN),
+    ('bright', UNKNOWN), ('upright', UNKNOWN), ('blight', UNKNOWN), ('donut', UNKNOWN),
+]
+
+
+def accuracy(classifier: IntentClassifier):
+    wrong = [(text, expected, classifier.classify(text)) for text, expected in LABELLED]
+    wrong = [row for row in wrong if row[1] is not row[2]]
+    return 1 - len(wrong) / len(LABELLED), wrong
+
+
+def main() -> None:
+    exact = IntentClassifier(fuzzy=False)
+    rows = []
+    for name, classifier in (('exact', exact), ('fuzzy', DEFAULT_INTENT_CLASSIFIER)):
+        score, wrong = accuracy(classifier)
+        cost = time_per_call(lambda: [classifier.classify(text) for text, _ in LABELLED], number=2000)
+        rows.append((name, '%.1f%%' % (score * 100), len(wrong), '%.0f' % (cost / len(LABELLED))))
+    print_table(('classifier', 'accuracy', 'wrong', 'ns/reply'), rows)
+
+    index = DEFAULT_INTENT_CLASSIFIER.fuzzy
+    rows = [(word, '%.0f' % time_per_call(lambda: index.lookup(word), number=20000))
+            for word in ('okk', 'nhi', 'bilkull', 'intrested', 'hello')]
+    print_table(('lookup', 'ns'), rows)
+
+    for text, expected, got in accuracy(DEFAULT_INTENT_CLASSIFIER)[1]:
+        print('  %r: expected %s, got %s' % (text, expected.name, got.name))
+
+
+if __name__ == '__main__':
+    main()
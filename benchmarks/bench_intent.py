@@ -0,0 +1,73 @@
+"""Single-pass intent classifier vs. the original two-function regex path."""
+
+import re
+
+from chatbot import DEFAULT_INTENT_CLASSIFIER, Intent
+from benchmarks.common import print_table, time_per_call
+
+CORPUS = [
+    'yes', 'Yes', 'no', 'No', 'haan', 'Haan ji', 'nahi', 'Nahi', 'ok', 'okay', 'sure', 'bilkul', 'zaroor',
+    'batao', 'haan batao', 'tell me', 'tell me more', 'kya hai', 'what', 'not interested', 'no thanks',
+    'no thank you', 'nope', "don't want", 'na', 'hmm', 'maybe later', 'fees kitni hai?', 'hostel hai kya',
+    'I am interested in the nursing course', 'mujhe nahi chahiye', 'abhi nahi',
+    'Please tell me about the fee structure and the hostel, I want to know everything before applying',
+    'हाँ', 'नहीं', '?', '',
+]
+
+
+def legacy_is_positive(text):
+    positive_patterns = [
+        r'\b(haan|yes|batao|tell me|kya hai|what|more|ok|okay|sure|bilkul|zaroor)\b',
+        r'\b(interested|want|like|good|great|fine|alright)\b'
+    ]
+    text_lower = text.lower().strip()
+    for pattern in positive_patterns:
+        if re.search(pattern, text_lower):
+            return True
+    return False
+
+
+def legacy_is_negative(text):
+    negative_patterns = [
+        r'\b(nahi|no|not|dont|don\'t|na|nope)\b',
+        r'\b(not interested|no thanks|no thank you)\b'
+    ]
+    text_lower = text.lower().strip()
+    for pattern in negative_patterns:
+        if re.search(pattern, text_lower):
+            return True
+    return False
+
+
+def legacy_classify(text):
+    if legacy_is_positive(text):
+        return Intent.YES
+    if legacy_is_negative(text):
+        return Intent.NO
+    return Intent.UNKNOWN
+
+
+def main() -> None:
+    classify = DEFAULT_INTENT_CLASSIFIER.classify
+    mismatches = [text for text in CORPUS if classify(text) is not legacy_classify(text)]
+
+    def run_legacy():
+        for text in CORPUS:
+            legacy_classify(text)
+
+    def run_single_pass():
+        for text in CORPUS:
+            classify(text)
+
+    legacy = time_per_call(run_legacy, number=2000) / len(CORPUS)
+    single = time_per_call(run_single_pass, number=2000) / len(CORPUS)
+    print_table(('path', 'ns/message'), [
+        ('is_positive + is_negative (regex)', '%.0f' % legacy),
+        ('IntentClassifier.classify', '%.0f' % single),
+    ])
+    print('\nspeedup: %.1fx over %d messages, %d disagreements %s' % (
+        legacy / single, len(CORPUS), len(mismatches), mismatches or ''))
+
+
+if __name__ == '__main__':
+    main()
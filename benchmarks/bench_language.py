@@ -0,0 +1,40 @@
+"""``detect_language`` cost on short replies and long pasted text.
+
+Compares the original per-character generator (Devanagari only) with
+``LanguageDetector``, with and without its memo.
+"""
+
+from chatbot import LanguageDetector
+from benchmarks.common import print_table, time_per_call
+
+INPUTS = [
+    ('short en', 'yes'),
+    ('short romanized', 'haan batao'),
+    ('short hi', 'हाँ'),
+    ('paragraph en', 'I would like to know more about the admission process and fees. ' * 20),
+    ('paragraph hi at end', 'Please tell me about the hostel and the bus service. ' * 20 + 'धन्यवाद'),
+    ('spam 10k', 'buy now ' * 1250),
+]
+
+
+def generator_detect(text):
+    if any('ऀ' <= c <= 'ॿ' for c in text):
+        return 'hi'
+    return 'en'
+
+
+def main() -> None:
+    memoized = LanguageDetector()
+    unmemoized = LanguageDetector(memo_size=0, memo_max_length=-1)
+    rows = []
+    for name, text in INPUTS:
+        number = 100000 if len(text) < 100 else 2000
+        before = time_per_call(lambda: generator_detect(text), number=number)
+        regex = time_per_call(lambda: unmemoized.detect(text), number=number)
+        memo = time_per_call(lambda: memoized.detect(text), number=number)
+        rows.append((name, len(text), '%.0f' % before, '%.0f' % regex, '%.0f' % memo, '%.1fx' % (before / memo)))
+    print_table(('input', 'chars', 'generator ns', 'regex+tokens ns', 'memoized ns', 'speedup'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""Per-turn cost of the funnel and latency metrics.
+
+Replays the same conversations with and without ``ChatMetrics`` and
+reports the difference per turn, which should stay within a few
+microseconds.
+"""
+
+from chatbot import NursingCollegeChatbot
+from metrics import ChatMetrics
+from benchmarks.common import print_table, time_per_call
+
+REPLIES = ['hello', 'yes', 'hmm', 'haan', 'batao', 'tell me', 'ok', 'sure', 'interested', 'more', 'what',
+           'kya hai', 'bilkul', 'no']
+
+
+def per_turn(chatbot):
+    def conversation():
+        for reply in REPLIES:
+            chatbot.get_response('bench', reply)
+        chatbot.sessions.pop('bench')
+
+    return time_per_call(conversation, number=5000) / len(REPLIES)
+
+
+def main() -> None:
+    plain = per_turn(NursingCollegeChatbot())
+    metrics = ChatMetrics()
+    instrumented = per_turn(NursingCollegeChatbot(metrics=metrics))
+    render = time_per_call(metrics.render, number=1000)
+    print_table(('chatbot', 'ns/turn'), [
+        ('no metrics', '%.0f' % plain),
+        ('ChatMetrics', '%.0f' % instrumented),
+    ])
+    print('\nmetrics overhead: %.2f us/turn' % ((instrumented - plain) / 1000))
+    print('render /metrics: %.0f us' % (render / 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""Latency of well-behaved users while others flood /chat, with and without the rate limits.
+
+Runs the ASGI app on one event loop, as a server does. Well-behaved
+users each send a message a second on a schedule. Their latency counts
+from the moment the message was due, so time spent queued behind other
+requests is included. Alongside them comes a flood at 1.5 times the
+turns a second the app can serve. Half of it is a script sending from
+one address with a new user id every time; the other half is stuck
+clients retrying the same message, with the same message id, for the
+same user. The table compares
+the well-behaved users' p50/p99 alone, flooded with no limits and
+flooded with the default limits. Then come the cost of a refused
+request against a turn and the size of the bucket table.
+
+    python -m benchmarks.bench_rate_limit [seconds per run]
+"""
+
+import asyncio
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from typing import Dict, Optional, Tuple
+
+from asgi_app import ChatbotASGI
+from chatbot import NursingCollegeChatbot
+from rate_limit import Coalescer, RateLimiter, TokenBuckets
+from benchmarks.bench_asgi import REPLIES
+from benchmarks.common import percentile, print_table, time_per_call
+
+SECONDS = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+GOOD_USERS = 200
+STUCK_CLIENTS = 50
+# Abusive requests a second, as a multiple of the turns a second the app can serve
+FLOOD = 1.5
+SCRIPT_ADDRESS = '203.0.113.7'
+
+
+def default_limiter() -> RateLimiter:
+    # The defaults of RateLimiter.from_env
+    return RateLimiter(TokenBuckets(1, 10), TokenBuckets(20, 100), Coalescer(2.0))
+
+
+async def post(app: ChatbotASGI, address: str, body: bytes) -> int:
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+    await app({'type': 'http', 'method': 'POST', 'path': '/chat', 'client': (address, 50000),
+               'headers': [(b'content-type', b'application/json')]}, receive, send)
+    return sent[0]['status']
+
+
+def chat_body(user_id: str, message: str) -> bytes:
+    return json.dumps({'user_id': user_id, 'message': message}).encode()
+
+
+def abusive(i: int) -> Tuple[str, bytes]:
+    """Every other request a script's (one address, a new user each time), else a stuck client's retry."""
+    if i % 2:
+        return SCRIPT_ADDRESS, b'{"user_id": "script-%d", "message": "hello"}' % i
+    n = i // 2 % STUCK_CLIENTS
+    return '192.0.2.%d' % n, b'{"user_id": "stuck-%d", "message": "yes", "message_id": "retry"}' % n
+
+
+def turns_per_second() -> float:
+    """How many /chat turns a second the app serves here without limits."""
+    app = ChatbotASGI(NursingCollegeChatbot())
+    bodies = [chat_body('capacity-%d' % (i % 500), REPLIES[i // 500 % len(REPLIES)]) for i in range(5000)]
+
+    async def run():
+        start = time.perf_counter()
+        for body in bodies:
+            await post(app, '192.0.2.250', body)
+        return len(bodies) / (time.perf_counter() - start)
+    return asyncio.run(run())
+
+
+async def scenario(limiter: Optional[RateLimiter], flood_rate: float):
+    app = ChatbotASGI(NursingCollegeChatbot(), limiter=limiter)
+    loop = asyncio.get_running_loop()
+    start = loop.time() + 0.1
+    stop = start + SECONDS
+    latencies = []
+    statuses: Dict[int, int] = {}
+
+    async def good_user(n: int) -> None:
+        # Spread over the first second so they don't all arrive together
+        due = start + n / GOOD_USERS
+        i = 0
+        while due < stop:
+            await asyncio.sleep(max(0.0, due - loop.time()))
+            await post(app, '198.51.100.%d' % (n % 250), chat_body('good-%d' % n, REPLIES[i % len(REPLIES)]))
+            latencies.append((loop.time() - due) * 1000)
+            due += 1.0
+            i += 1
+
+    async def flood() -> None:
+        # Open loop: requests arrive on schedule however far behind the app is
+        due = start
+        i = 0
+        while due < stop:
+            await asyncio.sleep(max(0.0, due - loop.time()))
+            now = loop.time()
+            while due <= now and due < stop:
+                status = await post(app, *abusive(i))
+                statuses[status] = statuses.get(status, 0) + 1
+                due += 1.0 / flood_rate
+                i += 1
+
+    await asyncio.gather(*([flood()] if flood_rate else []), *(good_user(n) for n in range(GOOD_USERS)))
+    coalesced = limiter.coalescer.coalesced if limiter is not None else 0
+    return latencies, statuses, coalesced
+
+
+def costs() -> None:
+    chatbot = NursingCollegeChatbot()
+    unlimited = ChatbotASGI(chatbot)
+    # Buckets that are empty after the first request
+    by_user = ChatbotASGI(chatbot, limiter=RateLimiter(users=TokenBuckets(1e-9, 1)))
+    by_address = ChatbotASGI(chatbot, limiter=RateLimiter(ips=TokenBuckets(1e-9, 1)))
+    asyncio.run(post(by_user, '192.0.2.1', chat_body('spent', 'hello')))
+    asyncio.run(post(by_address, '192.0.2.2', chat_body('spent', 'hello')))
+
+    def timed(app, user_id, address='192.0.2.1', number=5000):
+        body = chat_body(user_id, 'fee')
+
+        async def run():
+            start = time.perf_counter()
+            for _ in range(number):
+                await post(app, address, body)
+            return (time.perf_counter() - start) / number * 1e6
+        return asyncio.run(run())
+    buckets = TokenBuckets(1, 10)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    table = TokenBuckets(1, 10, max_keys=10 ** 6)
+    keys = ['user-%d' % i for i in range(100000)]
+    for key in keys:
+        table.take(key)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print()
+    print_table(('', 'us'), [
+        ('turn through /chat', '%.1f' % timed(unlimited, 'turns')),
+        ('refused by user', '%.1f' % timed(by_user, 'spent')),
+        ('refused by address', '%.1f' % timed(by_address, 'spent', '192.0.2.2')),
+        ('TokenBuckets.take', '%.2f' % (time_per_call(lambda: buckets.take('user-1')) / 1000)),
+    ])
+    print('bucket table: %.0f bytes per client, key strings included' % (used / len(keys)))
+
+
+def main() -> None:
+    capacity = turns_per_second()
+    flood_rate = FLOOD * capacity
+    rows = []
+    for name, limiter, rate in (('alone', default_limiter(), 0),
+                                ('flooded, no limits', None, flood_rate),
+                                ('flooded, default limits', default_limiter(), flood_rate)):
+        latencies, statuses, coalesced = asyncio.run(scenario(limiter, rate))
+        rows.append((name, len(latencies), '%.1f' % percentile(latencies, 50), '%.1f' % percentile(latencies, 99),
+                     sum(statuses.values()), statuses.get(429, 0), coalesced))
+    print('%d well-behaved users at 1 msg/s; flood of %.0f req/s (%.1fx the %.0f turns/s served here), %.0f s each:' % (
+        GOOD_USERS, flood_rate, FLOOD, capacity, SECONDS))
+    print_table(('run', 'good msgs', 'good p50 ms', 'good p99 ms', 'flood reqs', 'refused', 'coalesced'), rows)
+    costs()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+"""Time the chatbot's hot paths and fail if any got slower than its recorded baseline.
+
+Covers ``detect_language``, the intent functions (through the
+classification cache and the classifier itself), ``get_response`` on
+the kinds of turn users send and a whole funnel from a new session.
+Each path is timed in alternation with a fixed pure-Python workload and
+kept as a multiple of it. A baseline recorded on one machine therefore
+still means something on another, and on a box that is busier than usual. Each path
+is compared with its baseline in ``benchmarks/baselines.json``, and the
+script exits with status 1 if any path is more than ``--threshold``
+slower. A path that looks slower is measured again before it counts,
+since on a shared box one run can be. Re-record the baselines with
+``--record`` after a change that is meant to move them, and commit the
+file with that change.
+
+    python -m benchmarks.bench_regression [--threshold 0.25] [--retries 2] [--record] [--only NAME ...]
+
+``CHATBOT_PERF_THRESHOLD`` sets the default threshold. Needs nothing
+beyond the standard library and runs offline.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from chatbot import ConversationState, LanguageDetector, NursingCollegeChatbot
+from benchmarks.common import print_table, time_per_call
+
+DEFAULT_BASELINES = os.path.join(os.path.dirname(__file__), 'baselines.json')
+DEFAULT_THRESHOLD = 0.25
+# Each timed run takes at least this long, so timer resolution and loop overhead stay small
+MIN_RUN_SECONDS = 0.005
+# Calibration and path timed in alternation this many times; the median ratio counts
+ROUNDS = 15
+
+POSITIVE_FUNNEL = ['yes', 'haan', 'batao', 'tell me', 'ok', 'sure', 'interested', 'more', 'what', 'kya hai',
+                   'bilkul']
+HINDI_FUNNEL = ['हाँ, haan', 'haan ji', 'batao', 'ठीक है, ok', 'haan', 'bilkul', 'zaroor', 'haan batao',
+                'acha, ok', 'haan', 'theek hai ok']
+CALIBRATION_WORDS = ['Yes', 'haan ji', 'tell me more', 'NAHI', 'hostel kaisa hai', 'ok'] * 10
+
+
+class HotPath(NamedTuple):
+    name: str
+    fn: Callable[[], object]
+
+
+def calibration() -> int:
+    """The fixed workload every hot path is timed against: string, dict and loop work like a turn's."""
+    seen: Dict[str, int] = {}
+    for word in CALIBRATION_WORDS:
+        key = word.lower().strip()
+        seen[key] = seen.get(key, 0) + len(key.split())
+    return sum(seen.values())
+
+
+def hot_paths() -> List[HotPath]:
+    chatbot = NursingCollegeChatbot()
+    detector = chatbot.language_detector
+    classifier = chatbot.intent_classifier
+    unmemoized = LanguageDetector(memo_size=0, memo_max_length=-1)
+    paragraph = 'Please tell me about the admission process, the fees and the hostel. ' * 10
+    session = chatbot.get_session('bench')
+
+    def turn(state: ConversationState, message: str) -> Callable[[], str]:
+        def run():
+            session.state = state
+            return chatbot.get_response('bench', message)
+        return run
+
+    funnels = {'en': POSITIVE_FUNNEL, 'hi': HINDI_FUNNEL}
+    counter = [0]
+
+    def funnel(lang: str) -> Callable[[], None]:
+        replies = funnels[lang]
+
+        def run():
+            # A new user every time, so session creation is part of it; the store stays small
+            counter[0] += 1
+            user_id = 'funnel-%d' % (counter[0] % 1000)
+            chatbot.sessions.pop(user_id)
+            for reply in replies:
+                chatbot.get_response(user_id, reply)
+        return run
+
+    return [
+        HotPath('detect_language short en', lambda: detector.detect('yes')),
+        HotPath('detect_language romanized', lambda: detector.detect('haan batao')),
+        HotPath('detect_language devanagari', lambda: detector.detect('हाँ ठीक है')),
+        HotPath('detect_language unmemoized', lambda: unmemoized.detect('haan ji, tell me more')),
+        HotPath('detect_language paragraph', lambda: detector.detect(paragraph)),
+        HotPath('classify_intent word', lambda: chatbot.classify_intent('yes')),
+        HotPath('classify_intent cache miss', lambda: chatbot.classification_cache._read('haan ji, tell me more')),
+        HotPath('IntentClassifier.classify phrase', lambda: classifier.classify('no thank you')),
+        HotPath('IntentClassifier.classify sentence', lambda: classifier.classify('I am interested in the course')),
+        HotPath('IntentClassifier.classify typo', lambda: classifier.classify('yess')),
+        HotPath('IntentClassifier.classify unknown', lambda: classifier.classify('hmm')),
+        HotPath('is_positive_response', lambda: chatbot.is_positive_response('haan ji')),
+        HotPath('is_negative_response', lambda: chatbot.is_negative_response('not interested')),
+        HotPath('get_response yes', turn(ConversationState.FEE_STRUCTURE, 'yes')),
+        HotPath('get_response no', turn(ConversationState.FEE_STRUCTURE, 'nahi')),
+        HotPath('get_response unclear', turn(ConversationState.FEE_STRUCTURE, 'hmm')),
+        HotPath('get_response question', turn(ConversationState.FEE_STRUCTURE, 'hostel kaisa hai')),
+        HotPath('funnel en', funnel('en')),
+        HotPath('funnel hi', funnel('hi')),
+    ]
+
+
+def number_for(fn: Callable[[], object]) -> int:
+    """Calls per timed run so that one run takes about ``MIN_RUN_SECONDS``."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - start >= MIN_RUN_SECONDS:
+            return number
+        number *= 2
+
+
+def measure(paths: Sequence[HotPath], rounds: int = ROUNDS) -> Tuple[float, Dict[str, float]]:
+    """The calibration's nanoseconds per call, and each path's cost as a multiple of it.
+
+    Each round times the calibration and then the path, and the median
+    ratio over ``rounds`` is kept. The two runs of a round are a few
+    milliseconds apart, so a box that speeds up or slows down in the
+    meantime changes both alike.
+    """
+    calibration_number = number_for(calibration)
+    calibration_ns: List[float] = []
+    relative = {}
+    for path in paths:
+        number = number_for(path.fn)
+        ratios = []
+        for _ in range(rounds):
+            calibration_ns.append(time_per_call(calibration, calibration_number, repeat=3))
+            ratios.append(time_per_call(path.fn, number, repeat=3) / calibration_ns[-1])
+        relative[path.name] = statistics.median(ratios)
+    return statistics.median(calibration_ns) if calibration_ns else 0.0, relative
+
+
+class Change(NamedTuple):
+    name: str
+    baseline: Optional[float]  # relative cost, None if not recorded
+    now: float
+    regressed: bool
+
+    @property
+    def ratio(self) -> Optional[float]:
+        return None if self.baseline is None else self.now / self.baseline
+
+
+def compare(baselines: Dict[str, float], relative: Dict[str, float], threshold: float) -> List[Change]:
+    """Each measured path against its baseline; regressed if more than ``threshold`` costlier.
+
+    A path with no baseline is reported but never counts as regressed.
+    """
+    changes = []
+    for name, now in relative.items():
+        baseline = baselines.get(name)
+        changes.append(Change(name, baseline, now, baseline is not None and now > baseline * (1 + threshold)))
+    return changes
+
+
+def load_baselines(path: str) -> Dict[str, float]:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['relative']
+
+
+def record(path: str, calibration_ns: float, relative: Dict[str, float],
+           previous: Optional[Dict[str, float]] = None) -> None:
+    """Write ``relative`` as the baselines, keeping the previous ones for paths not measured this time."""
+    merged = dict(previous or {}, **relative)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'python': sys.version.split()[0], 'calibration_ns': round(calibration_ns),
+                   'relative': {name: round(cost, 5) for name, cost in sorted(merged.items())}}, f, indent=2)
+        f.write('\n')
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', 1)[0])
+    parser.add_argument('--baselines', default=DEFAULT_BASELINES)
+    parser.add_argument('--threshold', type=float,
+                        default=float(os.environ.get('CHATBOT_PERF_THRESHOLD', DEFAULT_THRESHOLD)),
+                        help='allowed slowdown as a fraction of the baseline (default %(default)s)')
+    parser.add_argument('--retries', type=int, default=2,
+                        help='times a path that looks slower is measured again before it counts (default %(default)s)')
+    parser.add_argument('--record', action='store_true', help='write the measured costs as the new baselines')
+    parser.add_argument('--only', nargs='+', metavar='NAME', help='measure only the paths whose name starts with NAME')
+    args = parser.parse_args(argv)
+
+    paths = hot_paths()
+    if args.only:
+        paths = [path for path in paths if path.name.startswith(tuple(args.only))]
+    calibration_ns, relative = measure(paths)
+    baselines = load_baselines(args.baselines) if os.path.exists(args.baselines) else None
+
+    if args.record:
+        # Baselines of paths that no longer exist are dropped
+        names = {path.name for path in hot_paths()}
+        record(args.baselines, calibration_ns, relative,
+               {name: cost for name, cost in (baselines or {}).items() if name in names})
+        print('recorded %d baselines in %s' % (len(relative), args.baselines))
+        return 0
+    if baselines is None:
+        print('no baselines at %s; record them with --record' % args.baselines)
+        return 1
+
+    changes = compare(baselines, relative, args.threshold)
+    for _ in range(args.retries):
+        # A real regression is there on every run; noise rarely is twice
+        suspects = {c.name for c in changes if c.regressed}
+        if not suspects:
+            break
+        _, again = measure([path for path in paths if path.name in suspects])
+        relative.update({name: min(relative[name], cost) for name, cost in again.items()})
+        changes = compare(baselines, relative, args.threshold)
+    print_table(('hot path', 'baseline ns', 'now ns', 'change', ''), [
+        (c.name, '-' if c.baseline is None else '%.0f' % (c.baseline * calibration_ns), '%.0f' % (c.now * calibration_ns),
+         '-' if c.ratio is None else '%+.0f%%' % ((c.ratio - 1) * 100),
+         'REGRESSED' if c.regressed else '' if c.baseline is not None else 'no baseline')
+        for c in changes])
+    regressed = [c.name for c in changes if c.regressed]
+    print('\nns at this run\'s calibration of %.0f ns; threshold +%.0f%%' % (calibration_ns, args.threshold * 100))
+    if regressed:
+        print('%d of %d hot paths regressed: %s' % (len(regressed), len(changes), ', '.join(regressed)))
+        return 1
+    print('no regressions in %d hot paths' % len(changes))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""CPU per ``/chat`` response body: encoding on every request versus ``ReplyCache``.
+
+``json.dumps`` with ASCII escaping is what ``jsonify`` did for each reply;
+the gzip rows compare compressing the whole body with resuming a
+compressor that has already consumed the reply.
+"""
+
+import gzip
+import json
+
+from chatbot import NursingCollegeChatbot
+from reply_cache import ReplyCache
+from benchmarks.common import print_table, time_per_call
+
+USER_ID = '6f1c2a4e-2b8d-4c35-9d0e-7a51f3c9b2aa'
+
+
+def main() -> None:
+    chatbot = NursingCollegeChatbot()
+    cache = ReplyCache(chatbot.reply_texts())
+    samples = [
+        ('fee structure (hi)', chatbot.get_fee_structure_message('hi')),
+        ('clinical training (en)', chatbot.get_clinical_training_message('en')),
+        ('clarification (hi)', chatbot.get_clarification_message('biology_check', 'hi')),
+    ]
+    rows = []
+    for name, response in samples:
+        per_request = time_per_call(lambda: json.dumps({'response': response, 'user_id': USER_ID}).encode(),
+                                    number=20000)
+        cached = time_per_call(lambda: cache.chat_body(response, USER_ID), number=20000)
+        gzip_per_request = time_per_call(
+            lambda: gzip.compress(json.dumps({'response': response, 'user_id': USER_ID}).encode(), 6),
+            number=5000)
+        gzip_cached = time_per_call(lambda: cache.chat_body(response, USER_ID, gzip=True), number=5000)
+        rows.append((name, '%.0f' % per_request, '%.0f' % cached, '%.0f' % gzip_per_request, '%.0f' % gzip_cached))
+
+    clarify = time_per_call(lambda: chatbot.get_clarification_message('total_seats', 'hi'))
+    print_table(('reply', 'json ns', 'cached ns', 'gzip ns', 'cached gzip ns'), rows)
+    print('\nget_clarification_message: %.0f ns/call' % clarify)
+
+
+if __name__ == '__main__':
+    main()
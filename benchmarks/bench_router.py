@@ -0,0 +1,137 @@
+"""Sticky routing across worker processes: the hash ring, the router's own cost and scaling with workers.
+
+First the ring: lookup time, how evenly users spread over the workers
+and what share of them move when a worker is added, against picking the
+worker by ``hash % workers``. Then, in process, a turn routed through
+``Router.dispatch`` against calling the app directly, and the time to
+hand sessions over when a worker joins. Last, if uvicorn is installed,
+``router.py`` with 1, 2, 4, ... workers over local sockets: requests per
+second, latency and the router process's CPU per request, which bounds
+how far one router scales.
+
+    python -m benchmarks.bench_router [max_workers]
+
+``CHATBOT_WORKER_COMMAND`` picks another worker server, as for router.py.
+"""
+
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from asgi_app import ChatbotASGI
+from chatbot import NursingCollegeChatbot
+from router import ASGIWorker, DEFAULT_WORKER_COMMAND, HashRing, Router, ring_hash
+from benchmarks.bench_asgi import REPLIES, free_port, wait_for_port
+from benchmarks.bench_websocket import process_cpu
+from benchmarks.common import print_table, server_env, time_per_call
+from benchmarks.loadgen import run_load
+
+KEYS = 100000
+USERS = 3000
+CONCURRENCY = 100
+REQUESTS_PER_CLIENT = 100
+# Each client takes turns for this many users, so the load spreads over the ring
+USERS_PER_CLIENT = 10
+JSON_HEADERS = [(b'content-type', b'application/json')]
+
+
+def ring_rows():
+    keys = ['user-%d' % i for i in range(KEYS)]
+    rows = []
+    for workers in (2, 4, 8, 16):
+        names = ['worker-%d' % i for i in range(workers)]
+        ring = HashRing(names)
+        owners = [ring.node_for(key) for key in keys]
+        shares = [owners.count(name) for name in names]
+        grown = HashRing(names + ['worker-%d' % workers])
+        moved = sum(owner != grown.node_for(key) for key, owner in zip(keys, owners))
+        modulo = sum(ring_hash(key) % workers != ring_hash(key) % (workers + 1) for key in keys)
+        rows.append((workers, '%.2f' % (max(shares) / (KEYS / workers)),
+                     '%.1f' % (statistics.pstdev(shares) / (KEYS / workers) * 100),
+                     '%.1f%%' % (moved / KEYS * 100), '%.1f%%' % (100 / (workers + 1)),
+                     '%.1f%%' % (modulo / KEYS * 100)))
+    print('Ring of %d keys:' % KEYS)
+    print_table(('workers', 'max/mean load', 'stdev %', 'moved on +1', 'ideal', 'moved, hash % n'), rows)
+    ring = HashRing(['worker-%d' % i for i in range(8)])
+    print('node_for: %.0f ns' % time_per_call(lambda: ring.node_for('user-12345')))
+
+
+def body(user: int, i: int) -> bytes:
+    return json.dumps({'user_id': 'user-%d' % user, 'message': REPLIES[i % len(REPLIES)]}).encode()
+
+
+def in_process() -> None:
+    async def turns(call) -> float:
+        start = time.perf_counter()
+        for i in range(len(REPLIES)):
+            for user in range(USERS):
+                await call(body(user, i))
+        return (time.perf_counter() - start) / (USERS * len(REPLIES)) * 1e6
+
+    async def run():
+        direct = ASGIWorker('direct', ChatbotASGI(NursingCollegeChatbot()))
+        direct_us = await turns(lambda b: direct.request('POST', '/chat', JSON_HEADERS, b))
+        workers = [ASGIWorker('worker-%d' % i, ChatbotASGI(NursingCollegeChatbot(), router_token='t'))
+                   for i in range(4)]
+        router = Router(workers, 't')
+        routed_us = await turns(lambda b: router.dispatch('POST', '/chat', JSON_HEADERS, b))
+        start = time.perf_counter()
+        moved = await router.add_worker(ASGIWorker('worker-4', ChatbotASGI(NursingCollegeChatbot(), router_token='t')))
+        handover = time.perf_counter() - start
+        return direct_us, routed_us, moved, handover
+
+    direct_us, routed_us, moved, handover = asyncio.run(run())
+    print('\nIn process, %d users x %d turns:' % (USERS, len(REPLIES)))
+    print_table(('turn', 'us'), [('app directly', '%.1f' % direct_us), ('through Router.dispatch', '%.1f' % routed_us)])
+    print('adding a 5th worker moved %d of %d sessions (%.0f%%) in %.1f ms' % (
+        moved, USERS, moved / USERS * 100, handover * 1000))
+
+
+def over_sockets(max_workers: int, command: str) -> None:
+    def make_request(client, i):
+        return '/chat', {'user_id': 'bench-%d-%d' % (client, i % USERS_PER_CLIENT),
+                         'message': REPLIES[i // USERS_PER_CLIENT % len(REPLIES)]}
+
+    rows = []
+    counts = [1]
+    while counts[-1] * 2 <= max_workers:
+        counts.append(counts[-1] * 2)
+    for workers in counts:
+        port = free_port()
+        router = subprocess.Popen([sys.executable, 'router.py', '--port', str(port), '--workers', str(workers),
+                                   '--worker-command', command], stderr=subprocess.DEVNULL, env=server_env())
+        try:
+            wait_for_port(port, timeout=60)
+            asyncio.run(run_load('127.0.0.1', port, 10, 10, make_request))  # warm up every worker
+            cpu = process_cpu(router.pid)
+            result = asyncio.run(run_load('127.0.0.1', port, CONCURRENCY, REQUESTS_PER_CLIENT, make_request))
+            cpu = process_cpu(router.pid) - cpu
+        finally:
+            router.terminate()
+            router.wait()
+        rows.append((workers, '%.0f' % result['rps'], '%.1f' % result['p50_ms'], '%.1f' % result['p99_ms'],
+                     '%.0f' % (cpu / max(1, result['requests']) * 1e6), result['errors']))
+    print('\nOver local sockets, %d clients, %d CPUs:' % (CONCURRENCY, os.cpu_count()))
+    print_table(('workers', 'req/s', 'p50 ms', 'p99 ms', 'router CPU us/req', 'errors'), rows)
+
+
+def main() -> None:
+    ring_rows()
+    in_process()
+    command = os.environ.get('CHATBOT_WORKER_COMMAND')
+    if command is None:
+        try:
+            import uvicorn  # noqa: F401
+        except ImportError:
+            print('\nuvicorn is not installed; skipping the run over sockets')
+            return
+        command = DEFAULT_WORKER_COMMAND
+    over_sockets(int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count() or 1, command)
+
+
+if __name__ == '__main__':
+    main()
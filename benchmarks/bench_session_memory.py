@@ -0,0 +1,53 @@
+"""Bytes per ``UserSession`` for a million concurrent sessions.
+
+Compares the original ``@dataclass`` layout (a ``__dict__``, an empty
+``responses`` dict and an Enum reference per session) with the slot-based
+``UserSession``. User ids are allocated before measuring, since both layouts
+share them.
+"""
+
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from chatbot import ConversationState, UserSession
+from benchmarks.common import print_table
+
+SESSIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+
+@dataclass
+class DataclassSession:
+    user_id: str
+    state: ConversationState
+    responses: Dict[str, str]
+    biology_studied: Optional[bool] = None
+    admission_interested: Optional[bool] = None
+    language: Optional[str] = None
+
+
+def bytes_per_session(cls, user_ids):
+    tracemalloc.start()
+    sessions = [cls(user_id=user_id, state=ConversationState.BIOLOGY_CHECK, responses={},
+                    admission_interested=True, language='hi') for user_id in user_ids]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # The list holding the sessions is not part of a session's cost
+    return (current - sys.getsizeof(sessions)) / len(sessions)
+
+
+def main() -> None:
+    user_ids = ['user-%d' % i for i in range(SESSIONS)]
+    before = bytes_per_session(DataclassSession, user_ids)
+    after = bytes_per_session(UserSession, user_ids)
+    print_table(('layout', 'bytes/session'), [
+        ('@dataclass', '%.1f' % before),
+        ('__slots__ + packed fields', '%.1f' % after),
+    ])
+    print('\n%d sessions: %.0f MiB -> %.0f MiB' % (
+        SESSIONS, before * SESSIONS / 2 ** 20, after * SESSIONS / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main()
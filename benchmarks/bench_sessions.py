@@ -0,0 +1,72 @@
+"""Session table growth under a stream of one-shot visitors.
+
+Every request comes from a new ``user_id`` (as when clients omit it), which
+is the worst case for the session table: an unbounded dict keeps growing
+while ``SessionStore`` stays at ``max_sessions``.
+"""
+
+import time
+import tracemalloc
+import uuid
+
+from chatbot import NursingCollegeChatbot, UserSession, ConversationState
+from session_store import SessionStore
+from benchmarks.common import print_table
+
+VISITORS = 200000
+MAX_SESSIONS = 20000
+
+
+def new_session(user_id):
+    return UserSession(user_id=user_id, state=ConversationState.INITIAL, responses={})
+
+
+def run(label, get_session, table):
+    user_ids = [str(uuid.uuid4()) for _ in range(VISITORS)]
+    tracemalloc.start()
+    start = time.perf_counter()
+    for user_id in user_ids:
+        get_session(user_id)
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (label, len(table), '%.0f' % (elapsed / VISITORS * 1e9), '%.1f' % (current / 2 ** 20))
+
+
+def main() -> None:
+    plain = {}
+
+    def plain_get(user_id):
+        if user_id not in plain:
+            plain[user_id] = new_session(user_id)
+        return plain[user_id]
+
+    store = SessionStore(new_session, max_sessions=MAX_SESSIONS, ttl=1800)
+    rows = [
+        run('dict', plain_get, plain),
+        run('SessionStore', store.get_or_create, store),
+    ]
+
+    # Idle TTL: advance a fake clock so that every visitor expires in turn
+    now = [0.0]
+    expiring = SessionStore(new_session, max_sessions=MAX_SESSIONS, ttl=60, clock=lambda: now[0])
+
+    def tick(user_id):
+        now[0] += 0.01
+        return expiring.get_or_create(user_id)
+
+    rows.append(run('SessionStore (ttl=60s)', tick, expiring))
+    print_table(('table', 'live sessions', 'ns/request (traced)', 'MiB held'), rows)
+    print('\nSessionStore stats:', store.stats())
+    print('TTL stats:', expiring.stats())
+
+    chatbot = NursingCollegeChatbot(max_sessions=MAX_SESSIONS)
+    start = time.perf_counter()
+    for _ in range(VISITORS):
+        chatbot.get_response(str(uuid.uuid4()), '')
+    print('\nget_response for %d new visitors: %.2f us/turn, %d live sessions' % (
+        VISITORS, (time.perf_counter() - start) / VISITORS * 1e6, len(chatbot.sessions)))
+
+
+if __name__ == '__main__':
+    main()
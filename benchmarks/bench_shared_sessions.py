@@ -0,0 +1,72 @@
+"""Turn throughput with several worker processes sharing one SQLite session file.
+
+Each worker process plays as gunicorn would: its own ``NursingCollegeChatbot``
+over a ``SQLiteSessionStore`` on the same database, driving whole
+conversations. Scaling with the worker count shows whether the shared
+backend (WAL mode, write-behind batches) becomes the bottleneck.
+
+    python -m benchmarks.bench_shared_sessions [max_workers]
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from chatbot import NursingCollegeChatbot, UserSession, new_session
+from session_store import SQLiteSessionStore
+from benchmarks.common import print_table
+
+CONVERSATIONS = 2000
+REPLIES = ['hello', 'yes', 'haan', 'batao', 'tell me', 'ok', 'sure', 'interested', 'more', 'what',
+           'kya hai', 'bilkul']
+
+
+def worker(path, worker_id, start_event, results):
+    sessions = SQLiteSessionStore(path, new_session, UserSession.dumps, UserSession.loads)
+    chatbot = NursingCollegeChatbot(sessions=sessions)
+    start_event.wait()
+    start = time.perf_counter()
+    for i in range(CONVERSATIONS):
+        user_id = 'w%d-u%d' % (worker_id, i)
+        for reply in REPLIES:
+            chatbot.get_response(user_id, reply)
+    sessions.close()
+    results.put(time.perf_counter() - start)
+
+
+def run(workers, tmp):
+    path = os.path.join(tmp, 'sessions-%d.db' % workers)
+    start_event = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=worker, args=(path, i, start_event, results))
+             for i in range(workers)]
+    for proc in procs:
+        proc.start()
+    time.sleep(0.5)  # let every worker open the database
+    start = time.perf_counter()
+    start_event.set()
+    for proc in procs:
+        proc.join()
+    wall = time.perf_counter() - start
+    per_worker = max(results.get() for _ in procs)
+    turns = workers * CONVERSATIONS * len(REPLIES)
+    return turns / wall, per_worker / (CONVERSATIONS * len(REPLIES)) * 1e6
+
+
+def main() -> None:
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else min(8, os.cpu_count() or 1)
+    counts = sorted({1, 2, 4, 8, max_workers} & set(range(1, max_workers + 1)))
+    rows = []
+    base = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in counts:
+            throughput, us_per_turn = run(workers, tmp)
+            base = base or throughput
+            rows.append((workers, '%.0f' % throughput, '%.1fx' % (throughput / base), '%.1f' % us_per_turn))
+    print_table(('workers', 'turns/s', 'scaling', 'us/turn (slowest worker)'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Snapshot and startup restore of a million in-memory sessions.
+
+Fills a chatbot's session table with conversations of the load-test
+corpus, each session carrying its transcript of recent turns, writes a
+snapshot, and times: how long the table lock is held (for a fork, or to copy the table where there is
+no fork), the whole snapshot, restoring it into a fresh chatbot, the
+first turn of a restored user, and restoring by rebuilding every session
+object up front, the approach the mmap-backed restore avoids.
+"""
+
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+from chatbot import SNAPSHOT_SCHEMA, NursingCollegeChatbot, UserSession
+from snapshot import ColdSessions
+from benchmarks.common import print_table
+from benchmarks.loadtest import DEFAULT_CORPUS, load_corpus
+
+SESSIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main() -> None:
+    # Each corpus conversation is played once and copied to its share of the users
+    played = NursingCollegeChatbot(session_ttl=None)
+    encoded, turns = [], 0
+    for n, conversation in enumerate(load_corpus(DEFAULT_CORPUS)):
+        for text in conversation['messages']:
+            played.get_response('corpus-%d' % n, text)
+        session = played.get_session('corpus-%d' % n)
+        encoded.append(session.dumps())
+        turns += len(session.transcript or ())
+    chatbot = NursingCollegeChatbot(max_sessions=SESSIONS)
+    user_ids = [str(uuid.uuid4()) for _ in range(SESSIONS)]
+    for i, user_id in enumerate(user_ids):
+        # Decoded per user, so no two sessions share their message texts
+        chatbot.sessions.put(user_id, UserSession.loads(user_id, encoded[i % len(encoded)]))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'sessions.snap')
+        chatbot.enable_snapshots(path, interval=3600)
+        _, copy_locked = timed(chatbot.sessions.snapshot_entries)
+        count, save = timed(chatbot.snapshotter.save)
+
+        def fork():
+            pid = chatbot.sessions.fork()
+            if pid == 0:
+                os._exit(0)
+            return pid
+        pid, fork_locked = timed(fork)
+        os.waitpid(pid, 0)
+        chatbot.snapshotter.fork = False
+        _, save_copy = timed(chatbot.snapshotter.save)
+        size = os.path.getsize(path)
+
+        restored_bot = NursingCollegeChatbot(max_sessions=SESSIONS)
+        restored, restore = timed(lambda: restored_bot.enable_snapshots(path, interval=3600))
+        _, first_turn = timed(lambda: restored_bot.get_response(user_ids[-1], 'haan'))
+
+        def eager():
+            cold = ColdSessions(path, UserSession.unpack, SNAPSHOT_SCHEMA)
+            return [UserSession.unpack(row[0], *row[2:]) for row in cold.rows(0.0)]
+        _, eager_restore = timed(eager)
+
+    print_table(('step', 'seconds'), [
+        ('table lock held: fork', '%.3f' % fork_locked),
+        ('table lock held: copy', '%.3f' % copy_locked),
+        ('snapshot in a forked child', '%.3f' % save),
+        ('snapshot on the thread (copy)', '%.3f' % save_copy),
+        ('restore at startup (mmap + id index)', '%.3f' % restore),
+        ('first turn of a restored user', '%.6f' % first_turn),
+        ('restore building every session', '%.3f' % eager_restore),
+    ])
+    print('\n%d sessions of %.1f turns on average snapshotted, %d restored, %.1f MiB on disk (%.1f bytes/session)' % (
+        count, turns / len(encoded), restored, size / 2 ** 20, size / count))
+
+
+if __name__ == '__main__':
+    main()
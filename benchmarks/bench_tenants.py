@@ -0,0 +1,114 @@
+"""Memory per college and routing cost of serving many colleges in one process.
+
+Writes tenant files that differ, as real colleges do, in fees, location,
+seats and clinical sites, loads them into a ``TenantRegistry`` and
+measures the memory each tenant adds, with and without its pre-encoded
+replies. For comparison it measures the resident memory of a process
+serving one college, the cost per college of a copy of ``chatbot.py`` in
+its own process. It then times a turn through the registry against
+calling the chatbot directly, and a hot reload of one tenant.
+
+    python -m benchmarks.bench_tenants [tenants]
+"""
+
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from chatbot import DEFAULT_CONTENT, MESSAGES, NursingCollegeChatbot
+from reply_cache import ReplyCache
+from tenants import TenantRegistry
+from benchmarks.common import print_table, time_per_call
+
+TENANTS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+CITIES = ('Delhi', 'Ranchi', 'Patna', 'Lucknow', 'Jaipur', 'Bhopal', 'Raipur', 'Dehradun')
+
+
+def tenant_data(i: int) -> dict:
+    """One college: its own fee, seats, city and hospitals, the rest as built in."""
+    city = CITIES[i % len(CITIES)]
+    fee = 60000 + 5000 * (i % 7)
+    replace = {
+        'fee_structure': ('₹60,000', '₹{:,}'.format(fee)),
+        'total_seats': ('**60 seats**', '**%d seats**' % (40 + 10 * (i % 5))),
+        'college_location': ('Delhi', city),
+        'clinical_training': ('Backundpur', '%s Civil Hospital %d' % (city, i)),
+    }
+    return {'messages': {key: {lang: text.replace(old, new) for lang, text in MESSAGES[key].items()}
+                         for key, (old, new) in replace.items()}}
+
+
+def process_rss() -> int:
+    """Peak resident bytes of a fresh process serving the built-in college."""
+    code = ('import resource, chatbot, reply_cache; bot = chatbot.NursingCollegeChatbot(); '
+            'reply_cache.ReplyCache(bot.reply_texts()); '
+            'print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)')
+    return int(subprocess.check_output([sys.executable, '-c', code])) * 1024
+
+
+def traced(fn):
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    result = fn()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    return result, used
+
+
+def main() -> None:
+    default = NursingCollegeChatbot()
+    with tempfile.TemporaryDirectory() as directory:
+        for i in range(TENANTS):
+            with open(os.path.join(directory, 'college-%d.json' % i), 'w', encoding='utf-8') as f:
+                json.dump(tenant_data(i), f, ensure_ascii=False)
+
+        def factory(content):
+            return NursingCollegeChatbot(content=content, intent_classifier=default.intent_classifier,
+                                         language_detector=default.language_detector)
+        registry, shared = traced(lambda: TenantRegistry(directory, factory, default))
+        contents = [registry.get(tenant_id).content for tenant_id in registry if tenant_id != 'default']
+        replies = ReplyCache(default.reply_texts())
+        _, encoded = traced(lambda: registry.track_replies(replies))
+
+        tenant = registry.get('college-7')
+        direct = time_per_call(lambda: tenant.get_response('bench', 'what is the fee'), number=20000)
+        routed = time_per_call(lambda: registry.get('college-7').get_response('bench', 'what is the fee'),
+                               number=20000)
+        lookup = time_per_call(lambda: registry.get('college-7'))
+
+        path = os.path.join(directory, 'college-7.json')
+        data = tenant_data(7)
+        data['messages']['fee_structure']['en'] += '\n\nFees revised.'
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+        start = time.perf_counter()
+        registry.reload()
+        reload_seconds = time.perf_counter() - start
+        assert registry.get('college-7').get_fee_structure_message('en').endswith('Fees revised.')
+
+    print_table(('colleges as', 'KiB per college'), [
+        ('tenants of one process', '%.1f' % (shared / TENANTS / 1024)),
+        ('  with pre-encoded replies', '%.1f' % ((shared + encoded) / TENANTS / 1024)),
+        ('one process each', '%.1f' % (process_rss() / 1024)),
+    ])
+    print()
+    print_table(('turn', 'ns'), [
+        ('chatbot.get_response', '%.0f' % direct),
+        ('registry.get + get_response', '%.0f' % routed),
+        ('registry.get alone', '%.0f' % lookup),
+    ])
+    print('\nhot reload of one college: %.2f ms' % (reload_seconds * 1000))
+    print('built-in hostel reply shared by every college: %s' % all(
+        content.messages['hostel_facilities'] is DEFAULT_CONTENT.messages['hostel_facilities'] for content in contents))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Memory a session's transcript costs, for the turns /history returns.
+
+Plays the load-test corpus through ``get_response``, each conversation
+once per user until ``SESSIONS`` users have talked. Messages are decoded
+from JSON per turn, as a server receives them, so no two turns share a
+string unless the chatbot makes them. The table gives bytes per session
+with transcripts off, with the compact ring (message text and a two-byte
+reply id) and with a ``deque`` of ``(message, reply)`` tuples, the
+obvious layout. Then come the bytes a session encodes to for the shared
+backend, with the transcript's reply slot names and with the replies
+written out.
+
+    python -m benchmarks.bench_transcript [sessions, default 20000]
+"""
+
+import collections
+import gc
+import json
+import sys
+import tracemalloc
+from typing import Tuple
+
+from chatbot import NursingCollegeChatbot
+from benchmarks.common import print_table
+from benchmarks.loadtest import DEFAULT_CORPUS, load_corpus
+
+SESSIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+TRANSCRIPT_SIZE = 10
+
+
+def play(chatbot, conversations) -> None:
+    for i in range(SESSIONS):
+        conversation = conversations[i % len(conversations)]
+        user_id = 'user-%d' % i
+        for text in conversation['messages']:
+            chatbot.get_response(user_id, json.loads(json.dumps(text)))
+
+
+def bytes_per_session(transcript_size, conversations) -> Tuple[float, NursingCollegeChatbot]:
+    chatbot = NursingCollegeChatbot(transcript_size=transcript_size, session_ttl=None, max_sessions=SESSIONS)
+    # Content tables and reply slots come before measuring; every chatbot shares them
+    chatbot.get_response('warm-up', 'hello')
+    chatbot.sessions.pop('warm-up')
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    play(chatbot, conversations)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / SESSIONS, chatbot
+
+
+def deque_bytes(chatbot) -> float:
+    """What the same turns cost as a deque of (message, reply) tuples per session."""
+    histories = [chatbot.get_history('user-%d' % i) for i in range(SESSIONS)]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    rings = [collections.deque(((json.loads(json.dumps(turn['message'])), turn['response']) for turn in history),
+                               maxlen=TRANSCRIPT_SIZE) for history in histories]
+    used = tracemalloc.get_traced_memory()[0] - before - sys.getsizeof(rings)
+    tracemalloc.stop()
+    return used / SESSIONS
+
+
+def main() -> None:
+    conversations = load_corpus(DEFAULT_CORPUS)
+    off, _ = bytes_per_session(0, conversations)
+    ring, chatbot = bytes_per_session(TRANSCRIPT_SIZE, conversations)
+    tuples = off + deque_bytes(chatbot)
+    print('%d sessions from %d corpus conversations, last %d turns kept:' % (
+        SESSIONS, len(conversations), TRANSCRIPT_SIZE))
+    print_table(('transcript', 'bytes/session', 'transcript bytes'), [
+        ('off', '%.0f' % off, '-'),
+        ('ring: text + reply id', '%.0f' % ring, '%.0f' % (ring - off)),
+        ('deque of (text, reply)', '%.0f' % tuples, '%.0f' % (tuples - off)),
+    ])
+
+    encoded = slot_names = 0
+    sampled = range(0, SESSIONS, max(1, SESSIONS // 1000))
+    for i in sampled:
+        user_id = 'user-%d' % i
+        data = chatbot.get_session(user_id).dumps()
+        fields = json.loads(data)
+        fields[4] = [[turn['message'], turn['response']] for turn in chatbot.get_history(user_id)]
+        slot_names += len(data.encode())
+        encoded += len(json.dumps(fields, ensure_ascii=False, separators=(',', ':')).encode())
+    print('\nshared backend encoding: %.0f bytes/session with slot names, %.0f with reply texts' % (
+        slot_names / len(sampled), encoded / len(sampled)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""WebSocket channel versus POST /chat, per message.
+
+First, in process: the same conversations driven through the ASGI app as
+HTTP requests and as frames on one socket per user, timing the app's CPU
+per turn (JSON parsing, headers, user id handling and the turn itself).
+Then, if uvicorn is installed with a WebSocket implementation, over
+local sockets. That part reports messages per second, latency and the
+server process's CPU per turn.
+
+    python -m benchmarks.bench_websocket [concurrency ...]
+"""
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from asgi_app import ChatbotASGI, WEBSOCKET_PATH
+from chatbot import NursingCollegeChatbot
+from benchmarks.bench_asgi import REPLIES, free_port, wait_for_port
+from benchmarks.common import print_table, server_env
+from benchmarks.loadgen import run_load, run_websocket_load
+
+USERS = 200
+TURNS = len(REPLIES)
+MESSAGES_PER_CLIENT = 200
+
+
+async def http_turns(app: ChatbotASGI) -> None:
+    sink = []
+
+    async def send(message):
+        sink.append(message)
+
+    for i in range(TURNS):
+        for user in range(USERS):
+            body = json.dumps({'user_id': 'http-%d' % user, 'message': REPLIES[i]}).encode()
+            messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+
+            async def receive():
+                return messages.pop()
+            scope = {'type': 'http', 'method': 'POST', 'path': '/chat', 'headers': [
+                (b'content-type', b'application/json'), (b'accept', b'*/*'), (b'host', b'localhost')]}
+            await app(scope, receive, send)
+            sink.clear()
+
+
+async def websocket_turns(app: ChatbotASGI) -> None:
+    # One socket per user, the turns interleaved across users like the HTTP run
+    queues = [asyncio.Queue() for _ in range(USERS)]
+    replies = asyncio.Queue()
+
+    async def connection(user: int) -> None:
+        queue = queues[user]
+
+        async def send(message):
+            if message['type'] == 'websocket.send':
+                replies.put_nowait(None)
+        scope = {'type': 'websocket', 'path': WEBSOCKET_PATH, 'query_string': b'user_id=ws-%d' % user}
+        await app(scope, queue.get, send)
+
+    tasks = [asyncio.create_task(connection(user)) for user in range(USERS)]
+    for queue in queues:
+        queue.put_nowait({'type': 'websocket.connect'})
+    for _ in range(USERS):
+        await replies.get()  # the user id frame
+    for i in range(TURNS):
+        for queue in queues:
+            queue.put_nowait({'type': 'websocket.receive', 'text': REPLIES[i]})
+        for _ in range(USERS):
+            await replies.get()
+    for queue in queues:
+        queue.put_nowait({'type': 'websocket.disconnect', 'code': 1000})
+    await asyncio.gather(*tasks)
+
+
+def in_process() -> None:
+    rows = []
+    for name, run in (('POST /chat', http_turns), ('WebSocket', websocket_turns)):
+        app = ChatbotASGI(NursingCollegeChatbot())
+        start = time.process_time()
+        asyncio.run(run(app))
+        cpu = time.process_time() - start
+        rows.append((name, '%.1f' % (cpu / (USERS * TURNS) * 1e6)))
+    print('In process, %d users x %d turns:' % (USERS, TURNS))
+    print_table(('channel', 'app CPU us/turn'), rows)
+
+
+def process_cpu(pid: int) -> float:
+    """User plus system CPU seconds of ``pid`` so far (Linux)."""
+    with open('/proc/%d/stat' % pid) as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def over_sockets(levels) -> None:
+    port = free_port()
+    server = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'asgi_app:app', '--log-level', 'warning',
+                               '--backlog', '4096', '--port', str(port)], stdout=subprocess.DEVNULL,
+                              env=server_env())
+    rows = []
+    try:
+        wait_for_port(port)
+        for concurrency in levels:
+            runs = {
+                'POST /chat': run_load('127.0.0.1', port, concurrency, MESSAGES_PER_CLIENT, lambda client, i: (
+                    '/chat', {'user_id': 'http-%d' % client, 'message': REPLIES[i % TURNS]})),
+                'WebSocket': run_websocket_load('127.0.0.1', port, concurrency, MESSAGES_PER_CLIENT, lambda client, i: (
+                    '%s?user_id=ws-%d' % (WEBSOCKET_PATH, client), REPLIES[i % TURNS])),
+            }
+            for name, run in runs.items():
+                cpu = process_cpu(server.pid)
+                result = asyncio.run(run)
+                cpu = process_cpu(server.pid) - cpu
+                rows.append((name, concurrency, '%.0f' % result['rps'], '%.1f' % result['p50_ms'],
+                             '%.1f' % result['p99_ms'], '%.0f' % (cpu / max(1, result['requests']) * 1e6),
+                             result['errors']))
+    finally:
+        server.terminate()
+        server.wait()
+    print('\nOver local sockets (uvicorn):')
+    print_table(('channel', 'concurrency', 'msg/s', 'p50 ms', 'p99 ms', 'server CPU us/turn', 'errors'), rows)
+
+
+def main() -> None:
+    in_process()
+    try:
+        import uvicorn  # noqa: F401
+    except ImportError:
+        print('\nuvicorn is not installed; skipping the run over sockets')
+        return
+    over_sockets([int(arg) for arg in sys.argv[1:]] or [10, 100])
+
+
+if __name__ == '__main__':
+    main()
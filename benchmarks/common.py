@@ -0,0 +1,44 @@
+"""Small timing helpers shared by the benchmark scripts."""
+
+import os
+import time
+from typing import Callable, List, Sequence
+
+
+# Servers under load tests send each user's turns back to back, far above the per-user and per-address limits
+UNLIMITED_ENV = {'CHATBOT_USER_RATE': '0', 'CHATBOT_IP_RATE': '0', 'CHATBOT_COALESCE_WINDOW': '0'}
+
+
+def server_env() -> dict:
+    """The environment for a server process under load: this one's, with rate limits and coalescing off."""
+    return dict(os.environ, **UNLIMITED_ENV)
+
+
+def time_per_call(fn: Callable[[], object], number: int = 100000, repeat: int = 5) -> float:
+    """Best-of-``repeat`` time of one ``fn()`` call, in nanoseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter_ns() - start) / number)
+    return best
+
+
+def percentile(samples: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of ``samples`` (``pct`` in 0-100)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def print_table(headers: Sequence[str], rows: List[Sequence[object]]) -> None:
+    """Print ``rows`` as a left-aligned plain-text table."""
+    cells = [[str(c) for c in headers]] + [[str(c) for c in row] for row in rows]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(headers))]
+    for i, row in enumerate(cells):
+        print('  '.join(c.ljust(w) for c, w in zip(row, widths)))
+        if i == 0:
+            print('  '.join('-' * w for w in widths))
@@ -0,0 +1,222 @@
+"""A small asyncio HTTP/1.1 and WebSocket load generator for the chat endpoints.
+
+Each simulated client holds one keep-alive connection (or one socket)
+and sends its requests back to back, so ``concurrency`` is the number of
+open connections, like browser tabs with a request in flight.
+"""
+
+import asyncio
+import base64
+import json
+import os
+import struct
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks.common import percentile
+
+
+async def _read_response(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('server closed the connection')
+    status = int(status_line.split()[1])
+    length = 0
+    chunked = False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'transfer-encoding' and 'chunked' in value.lower():
+            chunked = True
+    if not chunked:
+        return status, await reader.readexactly(length)
+    body = b''
+    while True:
+        size = int((await reader.readline()).split(b';')[0], 16)
+        chunk = await reader.readexactly(size + 2)
+        if size == 0:
+            return status, body
+        body += chunk[:-2]
+
+
+class Client:
+    """One keep-alive connection posting JSON."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._reader = None
+        self._writer = None
+
+    async def post(self, path: str, payload: Dict) -> Tuple[int, Dict]:
+        body = json.dumps(payload).encode()
+        request = ('POST %s HTTP/1.1\r\nHost: %s:%d\r\nContent-Type: application/json\r\n'
+                   'Content-Length: %d\r\n\r\n' % (path, self.host, self.port, len(body))).encode() + body
+        for attempt in range(2):
+            if self._writer is None:
+                self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                self._writer.write(request)
+                status, raw = await _read_response(self._reader)
+                return status, json.loads(raw) if raw else {}
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # The server may close idle keep-alive connections; reconnect once
+                await self.close()
+                if attempt:
+                    raise
+        raise AssertionError('unreachable')
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+async def run_load(host: str, port: int, concurrency: int, requests_per_client: int,
+                   make_request: Callable[[int, int], Tuple[str, Dict]]) -> Dict[str, float]:
+    """Drive ``concurrency`` clients; ``make_request(client, i)`` returns (path, payload).
+
+    Returns requests per second, error count and latency percentiles in ms.
+    """
+    latencies: List[float] = []
+    errors = [0]
+
+    async def client_loop(client_id: int) -> None:
+        client = Client(host, port)
+        try:
+            for i in range(requests_per_client):
+                path, payload = make_request(client_id, i)
+                start = time.perf_counter()
+                try:
+                    status, _ = await client.post(path, payload)
+                except (OSError, asyncio.IncompleteReadError):
+                    errors[0] += 1
+                    continue
+                latencies.append((time.perf_counter() - start) * 1000)
+                if status != 200:
+                    errors[0] += 1
+        finally:
+            await client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50),
+        'p99_ms': percentile(latencies, 99),
+    }
+
+
+class WebSocketClient:
+    """One WebSocket (RFC 6455) connection exchanging text frames; no extensions."""
+
+    def __init__(self, host: str, port: int, path: str):
+        self.host = host
+        self.port = port
+        self.path = path
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def connect(self) -> str:
+        """Open the socket; returns the server's first frame."""
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        key = base64.b64encode(os.urandom(16)).decode()
+        self._writer.write(('GET %s HTTP/1.1\r\nHost: %s:%d\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                            'Sec-WebSocket-Key: %s\r\nSec-WebSocket-Version: 13\r\n\r\n'
+                            % (self.path, self.host, self.port, key)).encode())
+        status_line = await self._reader.readline()
+        if not status_line.startswith(b'HTTP/1.1 101'):
+            raise ConnectionError('handshake refused: %r' % status_line)
+        while (await self._reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        return await self.receive()
+
+    def _frame(self, opcode: int, payload: bytes) -> bytes:
+        # Client frames are always masked
+        n = len(payload)
+        if n < 126:
+            header = struct.pack('!BB', 0x80 | opcode, 0x80 | n)
+        elif n < 65536:
+            header = struct.pack('!BBH', 0x80 | opcode, 0x80 | 126, n)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 0x80 | 127, n)
+        mask = os.urandom(4)
+        key = (mask * (n // 4 + 1))[:n]
+        masked = (int.from_bytes(payload, 'big') ^ int.from_bytes(key, 'big')).to_bytes(n, 'big')
+        return header + mask + masked
+
+    async def send(self, text: str) -> None:
+        self._writer.write(self._frame(0x1, text.encode('utf-8')))
+
+    async def receive(self) -> str:
+        """The next text message, answering pings on the way."""
+        parts = []
+        while True:
+            first, second = await self._reader.readexactly(2)
+            n = second & 0x7F
+            if n == 126:
+                n, = struct.unpack('!H', await self._reader.readexactly(2))
+            elif n == 127:
+                n, = struct.unpack('!Q', await self._reader.readexactly(8))
+            payload = await self._reader.readexactly(n)
+            opcode = first & 0x0F
+            if opcode == 0x8:
+                raise ConnectionError('server closed the socket')
+            if opcode == 0x9:
+                self._writer.write(self._frame(0xA, payload))
+                continue
+            if opcode in (0x0, 0x1):
+                parts.append(payload)
+                if first & 0x80:
+                    return b''.join(parts).decode('utf-8')
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.write(self._frame(0x8, struct.pack('!H', 1000)))
+            self._writer.close()
+            self._writer = None
+
+
+async def run_websocket_load(host: str, port: int, concurrency: int, messages_per_client: int,
+                             make_message: Callable[[int, int], Tuple[str, str]]) -> Dict[str, float]:
+    """Like ``run_load`` over sockets; ``make_message(client, i)`` returns (path to connect to, message).
+
+    Each client connects once, to the path of its first message, and
+    counts the round trip of every message after that.
+    """
+    latencies: List[float] = []
+    errors = [0]
+
+    async def client_loop(client_id: int) -> None:
+        client = WebSocketClient(host, port, make_message(client_id, 0)[0])
+        try:
+            await client.connect()
+            for i in range(messages_per_client):
+                _, message = make_message(client_id, i)
+                start = time.perf_counter()
+                await client.send(message)
+                await client.receive()
+                latencies.append((time.perf_counter() - start) * 1000)
+        except (OSError, asyncio.IncompleteReadError):
+            errors[0] += 1
+        finally:
+            await client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50),
+        'p99_ms': percentile(latencies, 99),
+    }
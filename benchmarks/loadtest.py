@@ -0,0 +1,223 @@
+"""Replay realistic conversations against the chatbot and report latency.
+
+The corpus mixes complete positive funnels, early exits, the
+biology-required loop and clarification retries, in English, Hindi and
+romanized Hindi. Generate it once, then replay it against a target:
+
+    python -m benchmarks.loadtest generate --count 500
+    python -m benchmarks.loadtest run --target chatbot --concurrency 50
+    python -m benchmarks.loadtest run --target flask --concurrency 50
+    python -m benchmarks.loadtest run --target http://127.0.0.1:5000 --concurrency 500
+
+``chatbot`` calls ``get_response`` directly, ``flask`` goes through the
+Flask test client in-process and a URL drives a running server over
+keep-alive connections. Each worker plays whole conversations, one turn
+at a time, so turns of one conversation never overlap.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+from urllib.parse import urlparse
+
+from benchmarks.common import UNLIMITED_ENV, percentile, print_table
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), 'conversations.jsonl')
+
+REPLIES = {
+    'en': {'yes': ['yes', 'Yes', 'ok', 'sure', 'tell me more', 'yes please', 'interested', 'okay'],
+           'no': ['no', 'No', 'not now', 'no thanks', 'nope'],
+           'unclear': ['hmm', '?', 'maybe', 'I am not sure', 'wait']},
+    # The yes/no vocabulary is romanized, so Devanagari typists still answer in it
+    'hi': {'yes': ['हाँ haan', 'haan ji', 'ठीक है, ok', 'batao'],
+           'no': ['nahi', 'नहीं, nahi'],
+           'unclear': ['हम्म', '?', 'क्या मतलब?']},
+    'roman': {'yes': ['haan', 'Haan', 'haan ji', 'batao', 'kya hai', 'bilkul', 'zaroor'],
+              'no': ['nahi', 'Nahi', 'nahi ji', 'na'],
+              'unclear': ['hmm', 'acha', '?', 'dekhte hai']},
+}
+GREETINGS = {'en': ['hello', 'Hi', 'hello, I want information'], 'hi': ['नमस्ते'], 'roman': ['namaste', 'hello ji']}
+# Yes/no questions in the flow before the end: admission, biology, then nine topics
+STEPS = 11
+
+# Share of each kind of conversation in a generated corpus
+KINDS = (('positive', 0.4), ('early_exit', 0.25), ('biology_loop', 0.15), ('clarify', 0.2))
+
+
+def _make_conversation(rng: random.Random, kind: str, lang: str) -> List[str]:
+    replies = REPLIES[lang]
+    messages = [rng.choice(GREETINGS[lang])]
+    yes = lambda: rng.choice(replies['yes'])
+    if kind == 'early_exit':
+        messages += [yes() for _ in range(rng.randrange(STEPS))]
+        messages.append(rng.choice(replies['no']))
+    elif kind == 'biology_loop':
+        messages.append(yes())
+        messages += [rng.choice(replies['no']) for _ in range(rng.randint(1, 3))]
+        messages += [yes() for _ in range(rng.randint(1, STEPS - 1))]
+    elif kind == 'clarify':
+        for _ in range(STEPS):
+            messages += [rng.choice(replies['unclear']) for _ in range(rng.choice((0, 0, 1, 2)))]
+            messages.append(yes())
+    else:
+        messages += [yes() for _ in range(STEPS)]
+    return messages
+
+
+def generate(count: int, seed: int) -> Iterator[Dict]:
+    rng = random.Random(seed)
+    kinds, weights = zip(*KINDS)
+    for i in range(count):
+        kind = rng.choices(kinds, weights)[0]
+        lang = rng.choice(('en', 'en', 'hi', 'roman'))
+        yield {'conversation_id': 'c%05d' % i, 'kind': kind, 'lang': lang,
+               'messages': _make_conversation(rng, kind, lang)}
+
+
+def load_corpus(path: str) -> List[Dict]:
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def rss_bytes() -> int:
+    """Current resident set size, or the peak where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _run_threaded(conversations: List[Dict], concurrency: int,
+                  make_send: Callable[[], Callable[[str, str], None]]) -> List[float]:
+    latencies: List[float] = []
+    lock = threading.Lock()
+    queue = iter(conversations)
+
+    def worker():
+        send = make_send()
+        mine = []
+        while True:
+            with lock:
+                conversation = next(queue, None)
+            if conversation is None:
+                break
+            for message in conversation['messages']:
+                start = time.perf_counter()
+                send(conversation['user_id'], message)
+                mine.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def _run_http(conversations: List[Dict], concurrency: int, url: str) -> List[float]:
+    from benchmarks.loadgen import Client
+
+    target = urlparse(url)
+    latencies: List[float] = []
+
+    async def worker(queue):
+        client = Client(target.hostname, target.port or 80)
+        try:
+            while not queue.empty():
+                conversation = queue.get_nowait()
+                for message in conversation['messages']:
+                    start = time.perf_counter()
+                    await client.post('/chat', {'user_id': conversation['user_id'], 'message': message})
+                    latencies.append((time.perf_counter() - start) * 1000)
+        finally:
+            await client.close()
+
+    async def main():
+        queue = asyncio.Queue()
+        for conversation in conversations:
+            queue.put_nowait(conversation)
+        await asyncio.gather(*(worker(queue) for _ in range(concurrency)))
+
+    asyncio.run(main())
+    return latencies
+
+
+def replay(conversations: List[Dict], target: str, concurrency: int) -> Dict[str, Optional[float]]:
+    if target == 'chatbot':
+        from chatbot import NursingCollegeChatbot
+        chatbot = NursingCollegeChatbot()
+        run = lambda: _run_threaded(conversations, concurrency, lambda: chatbot.get_response)
+    elif target == 'flask':
+        # Limits are read at import; every request here comes from one address
+        os.environ.update(UNLIMITED_ENV)
+        from app import app
+
+        def make_send():
+            client = app.test_client()
+            return lambda user_id, message: client.post('/chat', json={'user_id': user_id, 'message': message})
+
+        run = lambda: _run_threaded(conversations, concurrency, make_send)
+    else:
+        run = lambda: _run_http(conversations, concurrency, target)
+
+    rss_before = rss_bytes()
+    start = time.perf_counter()
+    latencies = run()
+    elapsed = time.perf_counter() - start
+    # A remote server's memory is not ours to measure
+    in_process = target in ('chatbot', 'flask')
+    return {
+        'conversations': len(conversations),
+        'requests': len(latencies),
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'rss_growth_mib': (rss_bytes() - rss_before) / 2 ** 20 if in_process else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    gen = commands.add_parser('generate', help='write a replay corpus')
+    gen.add_argument('--count', type=int, default=500)
+    gen.add_argument('--seed', type=int, default=2024)
+    gen.add_argument('--out', default=DEFAULT_CORPUS)
+    run = commands.add_parser('run', help='replay a corpus against a target')
+    run.add_argument('--target', default='chatbot', help="'chatbot', 'flask' or a server URL")
+    run.add_argument('--concurrency', type=int, default=50)
+    run.add_argument('--repeat', type=int, default=1, help='replay the corpus this many times')
+    run.add_argument('--corpus', default=DEFAULT_CORPUS)
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        with open(args.out, 'w', encoding='utf-8') as f:
+            for conversation in generate(args.count, args.seed):
+                f.write(json.dumps(conversation, ensure_ascii=False) + '\n')
+        print('wrote %d conversations to %s' % (args.count, args.out))
+        return
+
+    corpus = load_corpus(args.corpus)
+    # Every replay gets fresh user ids so it starts each conversation from the top
+    run_id = int(time.time() * 1000)
+    conversations = [dict(c, user_id='%s-%d-%d' % (c['conversation_id'], run_id, r))
+                     for r in range(args.repeat) for c in corpus]
+    result = replay(conversations, args.target, args.concurrency)
+    rss = result['rss_growth_mib']
+    print_table(('target', 'concurrency', 'requests', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'RSS growth MiB'), [(
+        args.target, args.concurrency, result['requests'], '%.0f' % result['rps'], '%.3f' % result['p50_ms'],
+        '%.3f' % result['p95_ms'], '%.3f' % result['p99_ms'], '-' if rss is None else '%.1f' % rss)])
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,26 @@
+import atexit
+import functools
 import json
+import logging
+import os
 import re
-from typing import Dict, List, Optional
-from dataclasses import dataclass
+import sys
+import threading
+import time
+from array import array
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Tuple
 from enum import Enum
 
+from event_log import EventLog
+from faq import TOPIC_KEYWORDS, FaqIndex, answer_body, asks
+from fuzzy import FuzzyIndex
+from metrics import ChatMetrics
+from session_store import LockStripes, SessionBackend, SessionStore, SQLiteSessionStore
+from snapshot import SessionSnapshotter, SnapshotError
+
+log = logging.getLogger(__name__)
+
 class ConversationState(Enum):
     INITIAL = "initial"
     ADMISSION_INTEREST = "admission_interest"
@@ -19,330 +36,1061 @@ class ConversationState(Enum):
     ELIGIBILITY = "eligibility"
     END = "end"
 
-@dataclass
+_STATES = tuple(ConversationState)
+_STATE_CODES = {state: code for code, state in enumerate(_STATES)}
+_STATE_VALUES = tuple(state.value for state in _STATES)
+_LANGUAGES = (None, 'en', 'hi')
+_LANGUAGE_CODES = {lang: code for code, lang in enumerate(_LANGUAGES)}
+# Optional[bool] packed into two bits: 0 = unknown, 1 = False, 2 = True
+_BIOLOGY_SHIFT = 0
+_ADMISSION_SHIFT = 2
+
+def _pack_flag(value: Optional[bool]) -> int:
+    return 0 if value is None else 2 if value else 1
+
+# Reply slots by small integer id, for transcripts. A slot names a reply
+# rather than holding its text: 'fee_structure/hi' for a message,
+# 'clarify:fee_structure/en' for a clarification, 'clarify:' for the
+# generic one and 'faq:hostel_facilities:fee_structure/hi' for an FAQ
+# answer. Ids are handed out as content is loaded and never reused, so
+# every chatbot in the process shares them. Sessions leaving the process
+# carry slot names instead, since another process numbers them its own way.
+_REPLY_SLOTS: List[str] = []
+_REPLY_SLOT_IDS: Dict[str, int] = {}
+_REPLY_SLOTS_LOCK = threading.Lock()
+# Transcripts keep ids in two bytes; this one stands for a reply with no slot
+NO_REPLY = 0xFFFF
+# Longer messages are cut to this many characters in a transcript
+MAX_TRANSCRIPT_TEXT = 200
+
+def reply_slot_id(slot: str) -> int:
+    """The id of ``slot``, handing out the next one if it has none yet."""
+    slot_id = _REPLY_SLOT_IDS.get(slot)
+    if slot_id is None:
+        with _REPLY_SLOTS_LOCK:
+            slot_id = _REPLY_SLOT_IDS.get(slot)
+            if slot_id is None:
+                if len(_REPLY_SLOTS) >= NO_REPLY:
+                    return NO_REPLY
+                slot_id = len(_REPLY_SLOTS)
+                _REPLY_SLOTS.append(sys.intern(slot))
+                _REPLY_SLOT_IDS[_REPLY_SLOTS[-1]] = slot_id
+    return slot_id
+
+def reply_slot(slot_id: int) -> Optional[str]:
+    return _REPLY_SLOTS[slot_id] if slot_id < len(_REPLY_SLOTS) else None
+
+class Transcript:
+    """A session's last turns: what the user wrote and the id of the reply slot it got.
+
+    A ring buffer that grows to the size the chatbot asks for and then
+    overwrites its oldest turn. Reply ids sit two bytes each in an
+    array, and common replies such as "yes" are one string shared by
+    every session, so a turn costs little more than a pointer.
+    """
+    __slots__ = ('texts', 'replies', 'end')
+
+    def __init__(self):
+        self.texts: List[str] = []
+        self.replies = array('H')
+        # Where the next turn goes once the buffer is full
+        self.end = 0
+
+    def append(self, text: str, reply_id: int, size: int) -> None:
+        if len(text) > MAX_TRANSCRIPT_TEXT:
+            text = text[:MAX_TRANSCRIPT_TEXT]
+        texts = self.texts
+        if len(texts) < size:
+            texts.append(text)
+            self.replies.append(reply_id)
+            return
+        if len(texts) > size:
+            self._keep(size)
+            texts = self.texts
+        end = self.end
+        texts[end] = text
+        self.replies[end] = reply_id
+        self.end = (end + 1) % size
+
+    def _keep(self, size: int) -> None:
+        """Keep the latest ``size`` turns, for turns recorded by a chatbot that kept more."""
+        end, drop = self.end, len(self.texts) - size
+        self.texts = (self.texts[end:] + self.texts[:end])[drop:]
+        self.replies = (self.replies[end:] + self.replies[:end])[drop:]
+        self.end = 0
+
+    def __iter__(self) -> Iterator[Tuple[str, int]]:
+        """Turns from the oldest to the latest."""
+        end = self.end
+        texts, replies = self.texts, self.replies
+        return zip(texts[end:] + texts[:end], replies[end:] + replies[:end])
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def dump(self) -> List[List[Optional[str]]]:
+        """The turns with slot names for ids, for a session leaving the process."""
+        return [[text, reply_slot(reply_id)] for text, reply_id in self]
+
+    @classmethod
+    def load(cls, turns: Iterable[Sequence[Optional[str]]]) -> 'Transcript':
+        transcript = cls()
+        for text, slot in turns:
+            transcript.texts.append(text)
+            transcript.replies.append(NO_REPLY if slot is None else reply_slot_id(slot))
+        return transcript
+
 class UserSession:
-    user_id: str
-    state: ConversationState
-    responses: Dict[str, str]
-    biology_studied: Optional[bool] = None
-    admission_interested: Optional[bool] = None
-    language: Optional[str] = None  # 'hi' for Hindi, 'en' for English
+    """Conversation state for one user.
+
+    Sessions are kept for every prospect, so the state, the two yes/no
+    answers and the language are stored as small integers in slots (all
+    interned by CPython) rather than in a per-instance ``__dict__``.
+    """
+    __slots__ = ('user_id', '_state', '_flags', '_lang', '_responses', '_transcript')
+
+    def __init__(self, user_id: str, state: ConversationState, responses: Optional[Dict[str, str]] = None,
+                 biology_studied: Optional[bool] = None, admission_interested: Optional[bool] = None,
+                 language: Optional[str] = None):
+        self.user_id = user_id
+        self._state = _STATE_CODES[state]
+        self._flags = (_pack_flag(biology_studied) << _BIOLOGY_SHIFT
+                       | _pack_flag(admission_interested) << _ADMISSION_SHIFT)
+        self._lang = _LANGUAGE_CODES[language]
+        self._responses = responses or None
+        self._transcript: Optional[Transcript] = None
+
+    @property
+    def state(self) -> ConversationState:
+        return _STATES[self._state]
+
+    @state.setter
+    def state(self, state: ConversationState) -> None:
+        self._state = _STATE_CODES[state]
+
+    def _get_flag(self, shift: int) -> Optional[bool]:
+        bits = (self._flags >> shift) & 3
+        return None if bits == 0 else bits == 2
+
+    def _set_flag(self, shift: int, value: Optional[bool]) -> None:
+        self._flags = (self._flags & ~(3 << shift)) | (_pack_flag(value) << shift)
+
+    @property
+    def biology_studied(self) -> Optional[bool]:
+        return self._get_flag(_BIOLOGY_SHIFT)
+
+    @biology_studied.setter
+    def biology_studied(self, value: Optional[bool]) -> None:
+        self._set_flag(_BIOLOGY_SHIFT, value)
+
+    @property
+    def admission_interested(self) -> Optional[bool]:
+        return self._get_flag(_ADMISSION_SHIFT)
+
+    @admission_interested.setter
+    def admission_interested(self, value: Optional[bool]) -> None:
+        self._set_flag(_ADMISSION_SHIFT, value)
+
+    @property
+    def language(self) -> Optional[str]:
+        """'hi' for Hindi, 'en' for English"""
+        return _LANGUAGES[self._lang]
+
+    @language.setter
+    def language(self, language: Optional[str]) -> None:
+        try:
+            self._lang = _LANGUAGE_CODES[language]
+        except KeyError:
+            raise ValueError("unsupported language: %r" % (language,)) from None
+
+    @property
+    def responses(self) -> Dict[str, str]:
+        # Allocated on first use; most sessions never need it
+        if self._responses is None:
+            self._responses = {}
+        return self._responses
+
+    @property
+    def transcript(self) -> Optional[Transcript]:
+        """The last turns, if the chatbot keeps them and there have been any."""
+        return self._transcript
+
+    def dumps(self) -> str:
+        """Encode the session for a shared session backend."""
+        fields = [self.state.value, self._flags, self.language, self._responses or {}]
+        if self._transcript:
+            fields.append(self._transcript.dump())
+        return json.dumps(fields, ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def loads(cls, user_id: str, data: str) -> 'UserSession':
+        state, flags, language, responses, *transcript = json.loads(data)
+        session = cls(user_id, ConversationState(state), responses, language=language)
+        session._flags = flags
+        if transcript:
+            session._transcript = Transcript.load(transcript[0])
+        return session
+
+    def pack(self) -> Tuple[int, int, int, Optional[str], Optional[List[List[Optional[str]]]]]:
+        """State, flags and language codes, plus for a snapshot the responses as JSON and the turns, if any."""
+        extra = json.dumps(self._responses, ensure_ascii=False) if self._responses else None
+        return self._state, self._flags, self._lang, extra, self._transcript.dump() if self._transcript else None
+
+    @classmethod
+    def unpack(cls, user_id: str, state: int, flags: int, lang: int, extra: Optional[str] = None,
+               turns: Optional[Iterable[Sequence[Optional[str]]]] = None) -> 'UserSession':
+        session = cls.__new__(cls)
+        session.user_id = user_id
+        session._state = state
+        session._flags = flags
+        session._lang = lang
+        session._responses = json.loads(extra) if extra else None
+        session._transcript = Transcript.load(turns) if turns else None
+        return session
+
+    def _fields(self) -> Tuple:
+        return (self.user_id, self._state, self._flags, self._lang, self._responses or {},
+                self._transcript.dump() if self._transcript else [])
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._fields() == other._fields()
+
+    __hash__ = None  # sessions are mutable
+
+    def __repr__(self) -> str:
+        return ('UserSession(user_id=%r, state=%s, responses=%r, biology_studied=%r, '
+                'admission_interested=%r, language=%r)' % (
+                    self.user_id, self.state, self._responses or {},
+                    self.biology_studied, self.admission_interested, self.language))
+
+# Snapshots hold the codes above, so they only restore into the same tables
+SNAPSHOT_SCHEMA = 'states=%s langs=%s flags=%d,%d' % (
+    ','.join(_STATE_VALUES), ','.join(map(str, _LANGUAGES)), _BIOLOGY_SHIFT, _ADMISSION_SHIFT)
+
+def new_session(user_id: str) -> UserSession:
+    """A fresh session at the start of the conversation."""
+    return UserSession(user_id=user_id, state=ConversationState.INITIAL)
+
+class Intent(Enum):
+    YES = "yes"
+    NO = "no"
+    UNKNOWN = "unknown"
+
+class ReplyKind(Enum):
+    """What a turn answered with, as recorded in the conversation log."""
+    STEP = "step"  # a step of the flow, moving on or ending it
+    CLARIFY = "clarify"  # the step's question again, asked differently
+    FAQ = "faq"  # a topic the user asked about, then the step's question
+    DEFAULT = "default"  # anything after the conversation ended
+
+POSITIVE_WORDS = (
+    'haan', 'yes', 'batao', 'tell me', 'kya hai', 'what', 'more', 'ok', 'okay', 'sure', 'bilkul', 'zaroor',
+    'interested', 'want', 'like', 'good', 'great', 'fine', 'alright',
+)
+NEGATIVE_WORDS = (
+    'nahi', 'no', 'not', 'dont', "don't", 'na', 'nope',
+    'not interested', 'no thanks', 'no thank you',
+)
+
+# Everyday words a typo away from the yes/no vocabulary that must stay unknown. Short
+# words only match typos that keep their first letter and replace none, which
+# rules out most ("hope", "move", "less"); these are what that leaves.
+FUZZY_IGNORE = (
+    'now', 'know', 'go', 'how', 'who', 'why', 'yet', 'one', 'none', 'done', 'gone', 'god', 'don', 'dot', 'nod',
+    'nor', 'net', 'nut', 'note', 'nose', 'lie', 'line', 'mine', 'fin', 'fire', 'find', 'sue', 'sun',
+    'cure', 'pure', 'ant', 'wan', 'ore', 'mare', 'mere', 'food', 'hood', 'wood', 'gold', 'wait', 'that', 'hat',
+    'nine', 'wine', 'bike', 'lake', 'lime', 'mike', 'eyes', 'hai', 'hain', 'kya', 'yeh', 'ye', 'treat',
+)
+# Known misspellings the typo rules leave out: of the three-letter words, which have
+# no typo neighbourhood, and with a letter added to a short word ("nahin")
+FUZZY_TYPOS = {
+    'yas': 'yes', 'yse': 'yes', 'ys': 'yes', 'yea': 'yes', 'ha': 'haan', 'hn': 'haan', 'hna': 'haan',
+    'nt': 'not', 'nto': 'not', 'nahe': 'nahi', 'nahin': 'nahi',
+}
+# Typo matching is for short replies; in longer text a near-miss is more likely a different word
+FUZZY_MAX_TOKENS = 3
+
+_TOKEN_RE = re.compile(r"\w+")
+_NO_INTENTS: FrozenSet[Intent] = frozenset()
+_ONE_INTENT = {intent: frozenset((intent,)) for intent in Intent}
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase ``text`` and split it into word tokens.
+
+    An apostrophe splits a word, as the ``\\b`` patterns this replaced did:
+    "what's" is "what" and "s", and "don't" is matched as a phrase.
+    """
+    return _TOKEN_RE.findall(text.lower())
+
+class IntentClassifier:
+    """Single-pass yes/no classifier over precomputed word and phrase tables.
+
+    A reply containing both a positive and a negative word is positive
+    ("not interested" matches "interested"), unless ``negative_wins`` is set.
+    Short replies with no exact match are retried against a typo-tolerant
+    index of the single words ("yess", "nhi"), unless ``fuzzy`` is off.
+    """
+
+    def __init__(self, positive: Iterable[str] = POSITIVE_WORDS, negative: Iterable[str] = NEGATIVE_WORDS,
+                 negative_wins: bool = False, fuzzy: bool = True):
+        self.words: Dict[str, Intent] = {}
+        # First word of a multi-word phrase -> (phrase tokens, intent)
+        self.phrases: Dict[str, List[Tuple[Tuple[str, ...], Intent]]] = {}
+        # Every word and phrase as it is written ("don't"), lowercased
+        self.entries: List[str] = []
+        for vocabulary, intent in ((negative, Intent.NO), (positive, Intent.YES)):
+            for entry in vocabulary:
+                tokens = tuple(tokenize(entry))
+                if tokens:
+                    self.entries.append(' '.join(entry.lower().split()))
+                if len(tokens) == 1:
+                    self.words[tokens[0]] = intent
+                elif tokens:
+                    self.phrases.setdefault(tokens[0], []).append((tokens, intent))
+        self.negative_wins = negative_wins
+        self._winner = Intent.NO if negative_wins else Intent.YES
+        self._runner_up = Intent.YES if negative_wins else Intent.NO
+        self.fuzzy: Optional[FuzzyIndex[Intent]] = FuzzyIndex(self.words, ignore=FUZZY_IGNORE, typos=FUZZY_TYPOS) if fuzzy else None
+
+    def _fuzzy_matches(self, tokens: Sequence[str]) -> FrozenSet[Intent]:
+        if self.fuzzy is None or len(tokens) > FUZZY_MAX_TOKENS:
+            return frozenset()
+        return frozenset(intent for intent in map(self.fuzzy.lookup, tokens) if intent is not None)
+
+    def _match_phrase(self, tokens: Sequence[str], i: int) -> Optional[Intent]:
+        for phrase, intent in self.phrases[tokens[i]]:
+            if tuple(tokens[i:i + len(phrase)]) == phrase:
+                return intent
+        return None
+
+    def _matches(self, tokens: Sequence[str]):
+        words, phrases = self.words, self.phrases
+        for i, token in enumerate(tokens):
+            intent = words.get(token)
+            if intent is None and token in phrases:
+                intent = self._match_phrase(tokens, i)
+            if intent is not None:
+                yield intent
+
+    def classify_tokens(self, tokens: Sequence[str]) -> Intent:
+        words, phrases, winner = self.words, self.phrases, self._winner
+        seen_runner_up = False
+        for i, token in enumerate(tokens):
+            intent = words.get(token)
+            if intent is None:
+                if token not in phrases:
+                    continue
+                intent = self._match_phrase(tokens, i)
+                if intent is None:
+                    continue
+            if intent is winner:
+                return intent
+            seen_runner_up = True
+        if seen_runner_up:
+            return self._runner_up
+        fuzzy = self._fuzzy_matches(tokens)
+        if not fuzzy:
+            return Intent.UNKNOWN
+        return winner if winner in fuzzy else self._runner_up
+
+    def classify(self, text: str) -> Intent:
+        text = text.lower()
+        # Most replies are a single vocabulary word
+        intent = self.words.get(text.strip())
+        if intent is not None:
+            return intent
+        return self.classify_tokens(_TOKEN_RE.findall(text))
+
+    def intents(self, text: str) -> FrozenSet[Intent]:
+        """Every intent with at least one match in ``text``."""
+        tokens = tokenize(text)
+        return frozenset(self._matches(tokens)) or self._fuzzy_matches(tokens)
+
+    def classify_with_intents(self, text: str) -> Tuple[Intent, FrozenSet[Intent]]:
+        """``classify(text)`` and ``intents(text)``, matching the reply a second time only when it must."""
+        intent = self.classify(text)
+        if intent is Intent.UNKNOWN:
+            return intent, _NO_INTENTS
+        # Only a reply read as the winner may also hold a runner-up match
+        if intent is not self._winner or text.lower().strip() in self.words:
+            return intent, _ONE_INTENT[intent]
+        return intent, self.intents(text)
+
+DEFAULT_INTENT_CLASSIFIER = IntentClassifier()
+
+# Romanized Hindi that marks a reply as Hindi even without Devanagari
+ROMANIZED_HINDI_WORDS = (
+    'haan', 'haa', 'han', 'ji', 'nahi', 'nahin', 'nai', 'batao', 'bataiye', 'bataye', 'kya', 'hai',
+    'hain', 'bilkul', 'zaroor', 'jaroor', 'theek', 'thik', 'accha', 'acha', 'achha', 'namaste', 'kripya',
+    'mujhe', 'chahiye', 'kitna', 'kitni', 'kaise', 'kahan', 'aur', 'kyun',
+)
+
+_DEVANAGARI_RE = re.compile('[\u0900-\u097F]')
+# Maps every ASCII byte that is not part of a word to a space, for bytes.split()
+_ASCII_WORD_BYTES = bytes(b if chr(b).isalnum() or chr(b) == '_' else 0x20 for b in range(256))
+
+class LanguageDetector:
+    """Labels a reply 'hi' (Devanagari or romanized Hindi) or 'en'.
+
+    Replies of up to ``memo_max_length`` characters are memoized in a
+    bounded LRU, since most of them are the same few words.
+    """
+
+    def __init__(self, romanized_hindi: Iterable[str] = ROMANIZED_HINDI_WORDS, memo_size: int = 4096,
+                 memo_max_length: int = 64):
+        self.romanized_hindi = frozenset(word.lower() for word in romanized_hindi)
+        self._romanized_hindi_bytes = frozenset(word.encode('utf-8') for word in self.romanized_hindi)
+        self.memo_max_length = memo_max_length
+        self._memo = functools.lru_cache(maxsize=memo_size)(self._detect)
+
+    def _detect(self, text: str) -> str:
+        if text.isascii():
+            # Most replies: no Devanagari possible, split words at the bytes level
+            words = text.encode('ascii').lower().translate(_ASCII_WORD_BYTES).split()
+            return 'en' if self._romanized_hindi_bytes.isdisjoint(words) else 'hi'
+        if _DEVANAGARI_RE.search(text) is not None:
+            return 'hi'
+        return 'en' if self.romanized_hindi.isdisjoint(_TOKEN_RE.findall(text.lower())) else 'hi'
+
+    def detect(self, text: str) -> str:
+        if len(text) <= self.memo_max_length:
+            return self._memo(text)
+        return self._detect(text)
+
+DEFAULT_LANGUAGE_DETECTOR = LanguageDetector()
+
+class Reading(NamedTuple):
+    """What a turn needs to know about a reply, apart from FAQ topics."""
+    lang: str
+    intent: Intent
+    # Every intent with a match, for is_positive_response / is_negative_response
+    intents: FrozenSet[Intent]
+    # A bare yes/no word, which is never an FAQ question
+    vocabulary: bool
+
+class ClassificationCache:
+    """Language and intent of replies, memoized by the reply lowercased and stripped.
+
+    A handful of replies ("yes", "haan", "ok", "no", "nahi") make up most
+    turns. The yes/no vocabulary is read at startup and pinned in a dict
+    under the spellings clients send ("yes", "Yes", "YES"), so those
+    replies cost one dict lookup. Other replies of up to ``max_length``
+    characters are read once and kept in a bounded LRU
+    (``functools.lru_cache``, which is thread-safe and counts hits and
+    misses); longer ones are read every time. Language and intent ignore
+    case and surrounding whitespace, so the LRU keys are normalized.
+    """
+
+    def __init__(self, language_detector: LanguageDetector, intent_classifier: IntentClassifier,
+                 max_size: int = 4096, max_length: int = 64):
+        self.language_detector = language_detector
+        self.intent_classifier = intent_classifier
+        self.max_size = max_size
+        self.max_length = max_length
+        self._cached = functools.lru_cache(maxsize=max_size)(self._read)
+        # Filled at startup and replaced whole, never changed in place, so reads need no lock
+        self._pinned: Dict[str, Reading] = {}
+        # The pinned spellings themselves, so transcripts can hold one copy of each
+        self._spellings: Dict[str, str] = {}
+        # Not locked, so concurrent hits can be lost: a lock would cost more than the
+        # pinned read itself. The LRU's own hit and miss counts are exact.
+        self._pinned_hits = 0
+        self.pin(self.vocabulary())
+
+    def vocabulary(self) -> List[str]:
+        """The classifier's yes/no words and phrases."""
+        return list(self.intent_classifier.entries)
+
+    def pin(self, texts: Iterable[str]) -> None:
+        """Read ``texts`` now and keep them for good, as given, lowercase, capitalized and uppercase."""
+        pinned = dict(self._pinned)
+        for text in texts:
+            reading = self._read(text.lower().strip())
+            for spelling in (text, text.lower(), text.capitalize(), text.title(), text.upper()):
+                pinned[spelling] = reading
+        self._spellings = {spelling: spelling for spelling in pinned}
+        self._pinned = pinned
+
+    def shared(self, text: str) -> str:
+        """``text``, or the pinned string equal to it, which is the same object every time."""
+        return self._spellings.get(text, text)
+
+    def _read(self, key: str) -> Reading:
+        intent, intents = self.intent_classifier.classify_with_intents(key)
+        return Reading(self.language_detector.detect(key), intent, intents, key in self.intent_classifier.words)
+
+    def read(self, text: str) -> Reading:
+        reading = self._pinned.get(text)
+        if reading is not None:
+            self._pinned_hits += 1
+            return reading
+        key = text.lower().strip()
+        if len(key) <= self.max_length:
+            return self._cached(key)
+        return self._read(key)
+
+    def clear(self) -> None:
+        """Forget the replies read since startup; pinned ones stay."""
+        self._cached.cache_clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Hits, misses and sizes; hits of pinned replies are approximate under concurrent turns."""
+        info = self._cached.cache_info()
+        return {'hits': self._pinned_hits + info.hits, 'misses': info.misses, 'pinned': len(self._pinned),
+                'size': info.currsize, 'max_size': self.max_size}
+
+    def __len__(self) -> int:
+        return len(self._pinned) + self._cached.cache_info().currsize
+
+DEFAULT_CLASSIFICATION_CACHE = ClassificationCache(DEFAULT_LANGUAGE_DETECTOR, DEFAULT_INTENT_CLASSIFIER)
+
+class Transition(NamedTuple):
+    """One step of the conversation flow.
+
+    Reply keys name an entry of the chatbot's messages (``MESSAGES`` by
+    default). A step without a ``clarify`` key advances on any reply;
+    ``flag`` names the session attribute that records the yes/no answer.
+    """
+    on_yes: ConversationState
+    yes_reply: str
+    on_no: ConversationState
+    no_reply: str
+    clarify: Optional[str] = None
+    flag: Optional[str] = None
+
+def _question(state: ConversationState, on_yes: ConversationState, yes_reply: str) -> Transition:
+    """A yes/no step that moves on with ``yes_reply`` or ends the conversation."""
+    return Transition(on_yes, yes_reply, ConversationState.END, 'end', clarify=state.value)
+
+# The conversation flow: current state -> what happens on 'yes' / 'no'.
+# Adding a step is a new state, a new entry here and its message in MESSAGES.
+FLOW: Dict[ConversationState, Transition] = {
+    ConversationState.INITIAL: Transition(
+        ConversationState.ADMISSION_INTEREST, 'admission_interest',
+        ConversationState.ADMISSION_INTEREST, 'admission_interest'),
+    ConversationState.ADMISSION_INTEREST: Transition(
+        ConversationState.BIOLOGY_CHECK, 'biology_check',
+        ConversationState.END, 'end',
+        clarify='admission_interest', flag='admission_interested'),
+    ConversationState.BIOLOGY_CHECK: Transition(
+        ConversationState.PROGRAM_DETAILS, 'program_details',
+        ConversationState.BIOLOGY_CHECK, 'biology_required',
+        clarify='biology_check', flag='biology_studied'),
+    ConversationState.PROGRAM_DETAILS: _question(
+        ConversationState.PROGRAM_DETAILS, ConversationState.FEE_STRUCTURE, 'fee_structure'),
+    ConversationState.FEE_STRUCTURE: _question(
+        ConversationState.FEE_STRUCTURE, ConversationState.HOSTEL_FACILITIES, 'hostel_facilities'),
+    ConversationState.HOSTEL_FACILITIES: _question(
+        ConversationState.HOSTEL_FACILITIES, ConversationState.COLLEGE_LOCATION, 'college_location'),
+    ConversationState.COLLEGE_LOCATION: _question(
+        ConversationState.COLLEGE_LOCATION, ConversationState.RECOGNITION, 'recognition'),
+    ConversationState.RECOGNITION: _question(
+        ConversationState.RECOGNITION, ConversationState.CLINICAL_TRAINING, 'clinical_training'),
+    ConversationState.CLINICAL_TRAINING: _question(
+        ConversationState.CLINICAL_TRAINING, ConversationState.SCHOLARSHIP, 'scholarship'),
+    ConversationState.SCHOLARSHIP: _question(
+        ConversationState.SCHOLARSHIP, ConversationState.TOTAL_SEATS, 'total_seats'),
+    ConversationState.TOTAL_SEATS: _question(
+        ConversationState.TOTAL_SEATS, ConversationState.ELIGIBILITY, 'eligibility'),
+    ConversationState.ELIGIBILITY: Transition(
+        ConversationState.END, 'final',
+        ConversationState.END, 'final'),
+    ConversationState.END: Transition(
+        ConversationState.END, 'end',
+        ConversationState.END, 'end'),
+}
+
+# Replies by message key; flow steps name them in yes_reply and no_reply
+MESSAGES: Dict[str, Dict[str, str]] = {
+    'admission_interest': {
+        'hi': "नमस्ते! 👋\n\nक्या आप Nursing College में admission लेना चाहते हैं?\n\n('Haan' या 'Nahi' में उत्तर दें)",
+        'en': "Hello! 👋\n\nAre you interested in admission to the Nursing College?\n\n(Please respond with 'Yes' or 'No')"
+    },
+    'biology_check': {
+        'hi': "बहुत अच्छा! \n\nक्या आपने 12th में Biology पढ़ी है?\n\n('Haan' या 'Nahi' में उत्तर दें)",
+        'en': "Great!\n\nDid you study Biology in 12th grade?\n\n(Please respond with 'Yes' or 'No')"
+    },
+    'biology_required': {
+        'hi': "B.Sc Nursing में admission के लिए Biology आवश्यक है।",
+        'en': "Biology is mandatory for admission to B.Sc Nursing."
+    },
+    'program_details': {
+        'hi': "B.Sc Nursing Program के बारे में जानकारी:\n\n🎓 **B.Sc Nursing Program**\n- यह एक full-time program है\n- 4 साल का undergraduate course\n- Practical training के साथ theoretical knowledge\n- Real patients के साथ hands-on experience\n\nक्या आप program के बारे में और जानकारी चाहते हैं?\n\n('Haan' या 'Nahi' में उत्तर दें)",
+        'en': "About the B.Sc Nursing Program:\n\n🎓 **B.Sc Nursing Program**\n- This is a full-time program\n- 4-year undergraduate course\n- Theoretical knowledge with practical training\n- Hands-on experience with real patients\n\nWould you like more information about the program?\n\n(Please respond with 'Yes' or 'No')"
+    },
+    'fee_structure': {
+        'hi': "💰 **Fee Structure:**\n\n**Annual Fees Breakdown:**\n- Tuition Fee: ₹60,000 INR\n- Bus Fee: ₹10,000 INR\n- **Total Annual Fees: ₹70,000 INR**\n\n**Installment Plan:**\n- 1st Installment: ₹30,000 (admission के समय)\n- 2nd Installment: ₹20,000 (first semester के बाद)\n- 3rd Installment: ₹20,000 (second semester के बाद)\n\nक्या आप hostel facilities के बारे में जानना चाहते हैं?\n\n('Haan' या 'Nahi' में उत्तर दें)",
+        'en': "💰 **Fee Structure:**\n\n**Annual Fees Breakdown:**\n- Tuition Fee: ₹60,000 INR\n- Bus Fee: ₹10,000 INR\n- **Total Annual Fees: ₹70,000 INR**\n\n**Installment Plan:**\n- 1st Installment: ₹30,000 (at the time of admission)\n- 2nd Installment: ₹20,000 (after the first semester)\n- 3rd Installment: ₹20,000 (after the second semester)\n\nWould you like to know about hostel facilities?\n\n(Please respond with 'Yes' or 'No')"
+    },
+    'hostel_facilities': {
+        'hi': "🏠 **Hostel Facilities:**\n\n**Accommodation:**\n- 4x7 water and electricity supply\n- CCTV surveillance for security\n- On-site warden available\n\n**Training Facilities:**\n- Hospital training included\n- Real patients के साथ practical training\n- Professional medical environment\n\nक्या आप college location के बारे में जानना चाहते हैं?\n\n('Haan' या 'Nahi' में उत्तर दें)",
+        'en': "🏠 **Hostel Facilities:**\n\n**Accommodation:**\n- 4x7 water and electricity supply\n- CCTV surveillance for security\n- On-site warden available\n\n**Training Facilities:**\n- Hospital training included\n- Practical training with real patients\n- Professional medical environment\n\nWould you like to know about the college location?\n\n(Please respond with 'Yes' or 'No')"
+    },
+    'college_location': {
+        'hi': "📍 **College Location:**\n\nहमारा college Delhi में स्थित है।\n\nक्या आप location या surrounding area के बारे में और जानकारी चाहते हैं?\n\n('Haan' या 'Nahi' में उत्तर दें)",
+        'en': "📍 **College Location:**\n\nOur college is located in Delhi.\n\nWould you like to know more about the location or surrounding area?\n\n(Please respond with 'Yes' or 'No')"
+    },
+    'recognition': {
+        'hi': "🏛️ **Recognition & Accreditation:**\n\nहमारा college officially recognized है:\n- **Indian Nursing Council (INC)** (Delhi) द्वारा\n\nक्या आप clinical training locations के बारे में जानना चाहते हैं?\n\n('Haan' या 'Nahi' में उत्तर दें)",
+        'en': "🏛️ **Recognition & Accreditation:**\n\nOur college is officially recognized by:\n- **Indian Nursing Council (INC)** (Delhi)\n\nWould you like to know about clinical training locations?\n\n(Please respond with 'Yes' or 'No')"
+    },
+    'clinical_training': {
+        'hi': "🏥 **Clinical Training Locations:**\n\nहमारे students इन locations पर training करते हैं:\n\n- District Hospital (Backundpur)\n- Community Health Centers\n- Regional Hospital (Chartha)\n- Ranchi Neurosurgery and Allied Science Hospital (Ranchi, Jharkhand)\n\nक्या आप scholarship options के बारे में जानना चाहते हैं?\n\n('Haan' या 'Nahi' में उत्तर दें)",
+        'en': "🏥 **Clinical Training Locations:**\n\nOur students receive training at the following locations:\n\n- District Hospital (Backundpur)\n- Community Health Centers\n- Regional Hospital (Chartha)\n- Ranchi Neurosurgery and Allied Science Hospital (Ranchi, Jharkhand)\n\nWould you like to know about scholarship options?\n\n(Please respond with 'Yes' or 'No')"
+    },
+    'scholarship': {
+        'hi': "🎓 **Scholarship Options:**\n\nAvailable scholarships:\n- **Government Post-Matric Scholarship:** ₹18k-₹23k\n- **Labour Ministry Scholarships:** ₹40k-₹48k (Labour Registration वालों के लिए)\n\nक्या आप total seats के बारे में जानना चाहते हैं?\n\n('Haan' या 'Nahi' में उत्तर दें)",
+        'en': "🎓 **Scholarship Options:**\n\nAvailable scholarships:\n- **Government Post-Matric Scholarship:** ₹18k-₹23k\n- **Labour Ministry Scholarships:** ₹40k-₹48k (for those with Labour Registration)\n\nWould you like to know about total seats available?\n\n(Please respond with 'Yes' or 'No')"
+    },
+    'total_seats': {
+        'hi': "👥 **Total Seats Available:**\n\nNursing program में कुल **60 seats** available हैं।\n\nक्या आप eligibility criteria के बारे में जानना चाहते हैं?\n\n('Haan' या 'Nahi' में उत्तर दें)",
+        'en': "👥 **Total Seats Available:**\n\nThere are a total of **60 seats** available in the Nursing program.\n\nWould you like to know about the eligibility criteria?\n\n(Please respond with 'Yes' or 'No')"
+    },
+    'eligibility': {
+        'hi': "✅ **Eligibility Criteria for Admission:**\n\n**Required Qualifications:**\n- Biology in 12th grade (mandatory)\n- PNT Exam (must be passed)\n- Age: 17 to 35 years\n\n**Additional Requirements:**\n- Good health and fitness\n- English language proficiency\n- Commitment to nursing profession\n\nधन्यवाद! 🙏",
+        'en': "✅ **Eligibility Criteria for Admission:**\n\n**Required Qualifications:**\n- Biology in 12th grade (mandatory)\n- PNT Exam (must be passed)\n- Age: 17 to 35 years\n\n**Additional Requirements:**\n- Good health and fitness\n- English language proficiency\n- Commitment to the nursing profession\n\nThank you! 🙏"
+    },
+    'final': {
+        'hi': "🎉 **Thank you for your interest!**\n\nआपको हमारे B.Sc Nursing program के बारे में सभी जानकारी मिल गई है।\n\n**Next Steps:**\n- Application form भरें\n- Required documents तैयार करें\n- PNT Exam की तैयारी करें\n\nकोई और सवाल हो तो हमसे संपर्क करें!\n\nधन्यवाद! 🙏",
+        'en': "🎉 **Thank you for your interest!**\n\nYou have received all the information about our B.Sc Nursing program.\n\n**Next Steps:**\n- Fill out the application form\n- Prepare the required documents\n- Prepare for the PNT Exam\n\nIf you have any more questions, feel free to contact us!\n\nThank you! 🙏"
+    },
+    'end': {
+        'hi': "धन्यवाद! 🙏\n\nआपका समय देने के लिए धन्यवाद। भविष्य में कोई सहायता चाहिए तो हमसे संपर्क करें।\n\nTake care! 👋",
+        'en': "Thank you! 🙏\n\nThank you for your time. If you need any assistance in the future, feel free to contact us.\n\nTake care! 👋"
+    },
+    'default': {
+        'hi': "माफ़ कीजिए, मैं समझ नहीं पाया। कृपया फिर से प्रयास करें।",
+        'en': "I'm sorry, I didn't understand. Please try again."
+    },
+}
+
+# Clarification prompts by flow step, asked when a reply is neither yes nor no
+CLARIFICATIONS: Dict[str, Dict[str, str]] = {
+    'admission_interest': {
+        'hi': "Kripya 'Haan' ya 'Nahi' mein jawab dein. क्या आप Nursing College में admission लेना चाहते हैं?",
+        'en': "Please reply with 'Yes' or 'No'. Are you interested in admission to the Nursing College?"
+    },
+    'biology_check': {
+        'hi': "Kripya 'Haan' ya 'Nahi' mein jawab dein. क्या आपने 12th में Biology पढ़ी है?",
+        'en': "Please reply with 'Yes' or 'No'. Did you study Biology in 12th grade?"
+    },
+    'program_details': {
+        'hi': "Kripya 'Haan' ya 'Nahi' mein jawab dein. क्या आप program के बारे में और जानकारी चाहते हैं?",
+        'en': "Please reply with 'Yes' or 'No'. Would you like more information about the program?"
+    },
+    'fee_structure': {
+        'hi': "Kripya 'Haan' ya 'Nahi' mein jawab dein. क्या आप hostel facilities के बारे में जानना चाहते हैं?",
+        'en': "Please reply with 'Yes' or 'No'. Would you like to know about hostel facilities?"
+    },
+    'hostel_facilities': {
+        'hi': "Kripya 'Haan' ya 'Nahi' mein jawab dein. क्या आप college location के बारे में जानना चाहते हैं?",
+        'en': "Please reply with 'Yes' or 'No'. Would you like to know about the college location?"
+    },
+    'college_location': {
+        'hi': "Kripya 'Haan' ya 'Nahi' mein jawab dein. क्या आप college की recognition के बारे में जानना चाहते हैं?",
+        'en': "Please reply with 'Yes' or 'No'. Would you like to know about the college's recognition?"
+    },
+    'recognition': {
+        'hi': "Kripya 'Haan' ya 'Nahi' mein jawab dein. क्या आप clinical training locations के बारे में जानना चाहते हैं?",
+        'en': "Please reply with 'Yes' or 'No'. Would you like to know about clinical training locations?"
+    },
+    'clinical_training': {
+        'hi': "Kripya 'Haan' ya 'Nahi' mein jawab dein. क्या आप scholarship options के बारे में जानना चाहते हैं?",
+        'en': "Please reply with 'Yes' or 'No'. Would you like to know about scholarship options?"
+    },
+    'scholarship': {
+        'hi': "Kripya 'Haan' ya 'Nahi' mein jawab dein. क्या आप total seats के बारे में जानना चाहते हैं?",
+        'en': "Please reply with 'Yes' or 'No'. Would you like to know about total seats available?"
+    },
+    'total_seats': {
+        'hi': "Kripya 'Haan' ya 'Nahi' mein jawab dein. क्या आप eligibility criteria के बारे में जानना चाहते हैं?",
+        'en': "Please reply with 'Yes' or 'No'. Would you like to know about the eligibility criteria?"
+    },
+}
+
+DEFAULT_CLARIFICATION = "Please reply with 'Yes' or 'No'."
+
+LANGUAGES = ('en', 'hi')
+
+class Content(NamedTuple):
+    """What a chatbot says, and the flow that decides when.
+
+    Messages and clarifications map a key to its text by language. Several
+    chatbots (one per college) can share one instance, so it is never
+    changed in place; ``tenants.load_content`` builds read-only ones.
+    """
+    flow: Mapping[ConversationState, Transition]
+    messages: Mapping[str, Mapping[str, str]]
+    clarifications: Mapping[str, Mapping[str, str]]
+
+DEFAULT_CONTENT = Content(FLOW, MESSAGES, CLARIFICATIONS)
+
+# Compiled flows by their transitions, so equal flows share one graph
+_COMPILED_FLOWS: Dict[Tuple, Mapping[ConversationState, Transition]] = {}
+
+def compile_flow(flow: Mapping[ConversationState, Transition]) -> Mapping[ConversationState, Transition]:
+    """A read-only copy of ``flow`` with interned reply keys, shared by every chatbot with an equal flow."""
+    key = tuple(flow.items())
+    steps = _COMPILED_FLOWS.get(key)
+    if steps is None:
+        steps = _COMPILED_FLOWS[key] = MappingProxyType({
+            state: Transition(t.on_yes, sys.intern(t.yes_reply), t.on_no, sys.intern(t.no_reply),
+                              t.clarify and sys.intern(t.clarify), t.flag and sys.intern(t.flag))
+            for state, t in flow.items()
+        })
+    return steps
+
+class _ContentTables(NamedTuple):
+    """Everything a turn reads that depends on the content, swapped as one reference."""
+    content: Content
+    steps: Mapping[ConversationState, Transition]
+    faq: FaqIndex
+    faq_replies: Dict[Tuple[str, Optional[str], str], str]
+    # Reply text -> reply slot id, and back, for transcripts
+    reply_ids: Dict[str, int]
+    replies_by_id: Dict[int, str]
 
 class NursingCollegeChatbot:
-    def __init__(self):
-        self.sessions: Dict[str, UserSession] = {}
-        
+    def __init__(self, flow: Optional[Dict[ConversationState, Transition]] = None,
+                 intent_classifier: Optional[IntentClassifier] = None,
+                 language_detector: Optional[LanguageDetector] = None,
+                 max_sessions: int = 100000, session_ttl: Optional[float] = 1800.0,
+                 sessions: Optional[SessionBackend[UserSession]] = None, lock_stripes: int = 256,
+                 metrics: Optional[ChatMetrics] = None, event_log: Optional[EventLog] = None,
+                 content: Optional[Content] = None, classification_cache: Optional[ClassificationCache] = None,
+                 transcript_size: int = 10):
+        if sessions is None:
+            sessions = SessionStore(self._new_session, max_sessions=max_sessions, ttl=session_ttl)
+        self.sessions: SessionBackend[UserSession] = sessions
+        # Serializes turns of one session (double clicks, client retries)
+        self.session_locks = LockStripes(lock_stripes)
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.track_sessions(self.sessions)
+        self.event_log = event_log
+        self.snapshotter: Optional[SessionSnapshotter[UserSession]] = None
+        self.intent_classifier = intent_classifier or DEFAULT_INTENT_CLASSIFIER
+        self.language_detector = language_detector or DEFAULT_LANGUAGE_DETECTOR
+        if classification_cache is None:
+            # Chatbots with the default classifier and detector share one cache
+            classification_cache = (
+                DEFAULT_CLASSIFICATION_CACHE if intent_classifier is None and language_detector is None
+                else ClassificationCache(self.language_detector, self.intent_classifier))
+        self.classification_cache = classification_cache
+        # Turns each session keeps for /history; 0 keeps none
+        self.transcript_size = transcript_size
+        content = content or DEFAULT_CONTENT
+        self.set_content(content if flow is None else content._replace(flow=flow))
+
+    @classmethod
+    def from_env(cls) -> 'NursingCollegeChatbot':
+        """Build the chatbot served by the web entry points from CHATBOT_* variables."""
+        session_ttl = float(os.environ.get('CHATBOT_SESSION_TTL', 1800))
+        sessions = None
+        if os.environ.get('CHATBOT_SESSION_BACKEND', 'memory') == 'sqlite':
+            # Shared by every worker process, so a conversation survives switching workers
+            sessions = SQLiteSessionStore(
+                os.environ.get('CHATBOT_SESSION_DB', 'sessions.db'),
+                new_session, UserSession.dumps, UserSession.loads, ttl=session_ttl)
+            atexit.register(sessions.close)
+        event_log = None
+        if os.environ.get('CHATBOT_EVENT_LOG'):
+            # Workers sharing the directory write segments of their own, named by worker id or pid
+            event_log = EventLog(os.environ['CHATBOT_EVENT_LOG'],
+                                 max_bytes=int(os.environ.get('CHATBOT_EVENT_LOG_MAX_BYTES', 64 * 2 ** 20)),
+                                 writer=os.environ.get('CHATBOT_WORKER_ID') or None)
+            atexit.register(event_log.close)
+        chatbot = cls(
+            max_sessions=int(os.environ.get('CHATBOT_MAX_SESSIONS', 100000)),
+            session_ttl=session_ttl,
+            sessions=sessions,
+            metrics=ChatMetrics() if os.environ.get('CHATBOT_METRICS', '1') != '0' else None,
+            event_log=event_log,
+            transcript_size=int(os.environ.get('CHATBOT_TRANSCRIPT_SIZE', 10)),
+        )
+        # SQLite sessions are durable already; snapshots are for the in-memory table
+        if os.environ.get('CHATBOT_SNAPSHOT') and sessions is None:
+            chatbot.enable_snapshots(os.environ['CHATBOT_SNAPSHOT'],
+                                     float(os.environ.get('CHATBOT_SNAPSHOT_INTERVAL', 60)))
+            atexit.register(chatbot.snapshotter.close)
+        return chatbot
+
+    def enable_snapshots(self, path: str, interval: float = 60.0) -> int:
+        """Restore the sessions snapshotted at ``path`` and snapshot them there every ``interval`` seconds.
+
+        Returns how many sessions were restored. A snapshot that cannot be
+        restored is logged and replaced by the next one.
+        """
+        if not isinstance(self.sessions, SessionStore):
+            raise ValueError("snapshots need the in-memory session store")
+        self.snapshotter = SessionSnapshotter(self.sessions, path, UserSession.pack, UserSession.unpack,
+                                              SNAPSHOT_SCHEMA, interval)
+        try:
+            restored = self.snapshotter.restore()
+        except SnapshotError as e:
+            log.warning("not restoring sessions: %s", e)
+            restored = 0
+        self.snapshotter.start()
+        return restored
+
+    @property
+    def content(self) -> Content:
+        return self._tables.content
+
+    @property
+    def faq(self) -> FaqIndex:
+        return self._tables.faq
+
+    def set_content(self, content: Content) -> None:
+        """Answer from ``content`` from now on; sessions are kept, turns under way finish with the old content."""
+        steps = compile_flow(content.flow)
+        missing = {key for step in steps.values() for key in (step.yes_reply, step.no_reply)
+                   if key not in content.messages}
+        missing.update({'default'} - set(content.messages))
+        if missing:
+            raise ValueError("content has no message for %s" % ', '.join(sorted(missing)))
+        faq, faq_replies = self._build_faq(content, steps)
+        reply_ids, replies_by_id = self._number_replies(content, faq_replies)
+        # One reference, so a turn sees either the old tables or the new ones
+        self._tables = _ContentTables(content, steps, faq, faq_replies, reply_ids, replies_by_id)
+
+    def _new_session(self, user_id: str) -> UserSession:
+        return new_session(user_id)
+
+    @staticmethod
+    def _build_faq(content: Content, steps: Mapping[ConversationState, Transition]
+                   ) -> Tuple[FaqIndex, Dict[Tuple[str, Optional[str], str], str]]:
+        """Index the topic replies and prepare every FAQ answer.
+
+        An answer is the topic reply without its closing question, followed
+        by the question of the step the user is on, so the conversation
+        carries on from where it was.
+        """
+        bodies = {
+            (topic, lang): answer_body(content.messages[topic].get(lang) or content.messages[topic]['en'])
+            for topic in TOPIC_KEYWORDS if topic in content.messages
+            for lang in LANGUAGES
+        }
+        faq = FaqIndex({topic: [bodies[topic, lang] for lang in LANGUAGES] for topic, _ in bodies})
+        faq_replies: Dict[Tuple[str, Optional[str], str], str] = {}
+        for (topic, lang), body in bodies.items():
+            for clarify in {step.clarify for step in steps.values()}:
+                follow_up = '' if clarify is None else '\n\n' + content.clarifications.get(clarify, {}).get(
+                    lang, DEFAULT_CLARIFICATION)
+                # Colleges that differ elsewhere share these strings
+                faq_replies[topic, clarify, lang] = sys.intern(body + follow_up)
+        return faq, faq_replies
+
+    @staticmethod
+    def _number_replies(content: Content, faq_replies: Dict[Tuple[str, Optional[str], str], str]
+                        ) -> Tuple[Dict[str, int], Dict[int, str]]:
+        """Every reply's slot id, by its text, and the text of each slot.
+
+        Replies with the same text (a missing translation falling back to
+        English, say) share the id of the first slot that has it.
+        """
+        slots = [('%s/%s' % (key, lang), texts.get(lang) or texts['en'])
+                 for key, texts in content.messages.items() for lang in LANGUAGES]
+        slots += [('clarify:%s/%s' % (context, lang), texts.get(lang, DEFAULT_CLARIFICATION))
+                  for context, texts in content.clarifications.items() for lang in LANGUAGES]
+        slots.append(('clarify:', DEFAULT_CLARIFICATION))
+        slots += [('faq:%s:%s/%s' % (topic, clarify or '', lang), reply)
+                  for (topic, clarify, lang), reply in faq_replies.items()]
+        reply_ids: Dict[str, int] = {}
+        replies_by_id: Dict[int, str] = {}
+        for slot, text in slots:
+            slot_id = reply_slot_id(slot)
+            replies_by_id[slot_id] = text
+            reply_ids.setdefault(text, slot_id)
+        return reply_ids, replies_by_id
+
+    def reply_texts(self) -> Iterator[str]:
+        """Every reply the chatbot can send, in each language."""
+        for key in self.content.messages:
+            for lang in LANGUAGES:
+                yield self.get_message(key, lang)
+        for context in self.content.clarifications:
+            for lang in LANGUAGES:
+                yield self.get_clarification_message(context, lang)
+        yield DEFAULT_CLARIFICATION
+        yield from self._tables.faq_replies.values()
+
     def get_session(self, user_id: str) -> UserSession:
+        return self.sessions.get_or_create(user_id)
+
+    def get_history(self, user_id: str) -> List[Dict[str, Optional[str]]]:
+        """The user's last turns, oldest first, each as the message and the reply it got.
+
+        Empty for a user with no session. A reply reads as it does in the
+        current content, and as ``None`` if the content no longer has it.
+        """
         if user_id not in self.sessions:
-            self.sessions[user_id] = UserSession(
-                user_id=user_id,
-                state=ConversationState.INITIAL,
-                responses={}
-            )
-        return self.sessions[user_id]
+            return []
+        with self.session_locks.for_key(user_id):
+            transcript = self.get_session(user_id).transcript
+            turns = list(transcript) if transcript is not None else []
+        replies = self._tables.replies_by_id
+        return [{'message': text, 'response': replies.get(reply_id)} for text, reply_id in turns]
     
     def detect_language(self, text: str) -> str:
-        """Detect if the text is in Hindi (Devanagari script) or English."""
-        # Check for any Devanagari character
-        if any('\u0900' <= c <= '\u097F' for c in text):
-            return 'hi'
-        return 'en'
+        """Detect if the text is in Hindi (Devanagari or romanized) or English."""
+        return self.classification_cache.read(text).lang
     
+    def classify_intent(self, text: str) -> Intent:
+        """Classify a reply as YES, NO or UNKNOWN in a single pass."""
+        return self.classification_cache.read(text).intent
+
     def is_positive_response(self, text: str) -> bool:
         """Check if user response is positive"""
-        positive_patterns = [
-            r'\b(haan|yes|batao|tell me|kya hai|what|more|ok|okay|sure|bilkul|zaroor)\b',
-            r'\b(interested|want|like|good|great|fine|alright)\b'
-        ]
-        text_lower = text.lower().strip()
-        
-        for pattern in positive_patterns:
-            if re.search(pattern, text_lower):
-                return True
-        return False
-    
+        return Intent.YES in self.classification_cache.read(text).intents
+
     def is_negative_response(self, text: str) -> bool:
         """Check if user response is negative"""
-        negative_patterns = [
-            r'\b(nahi|no|not|dont|don\'t|na|nope)\b',
-            r'\b(not interested|no thanks|no thank you)\b'
-        ]
-        text_lower = text.lower().strip()
-        
-        for pattern in negative_patterns:
-            if re.search(pattern, text_lower):
-                return True
-        return False
-    
+        return Intent.NO in self.classification_cache.read(text).intents
+
     def get_response(self, user_id: str, user_message: str) -> str:
-        session = self.get_session(user_id)
-        lang = self.detect_language(user_message)
+        return self._turn(user_id, user_message, self.classification_cache.read(user_message))
+
+    def get_responses_batch(self, messages: Iterable[Tuple[str, str]]) -> List[str]:
+        """Answer a burst of ``(user_id, message)`` pairs, replies in the same order.
+
+        Language and intent are worked out once per distinct message text
+        for the whole batch; turns are then applied in arrival order, so a
+        user with several messages in the batch advances one step per message.
+        """
+        messages = list(messages)
+        read = self.classification_cache.read
+        readings = {text: read(text) for text in {text for _, text in messages}}
+        return [self._turn(user_id, text, readings[text]) for user_id, text in messages]
+
+    def _turn(self, user_id: str, user_message: str, reading: Reading) -> str:
+        metrics = self.metrics
+        start = time.perf_counter() if metrics is not None else 0.0
+        events = self.event_log
+        with self.session_locks.for_key(user_id):
+            session = self.get_session(user_id)
+            from_state = session._state
+            lang = reading.lang
+            intent = kind = None
+            tables = self._tables
+            try:
+                reply, intent, kind = self._advance(session, user_message, reading, tables)
+                size = self.transcript_size
+                if size:
+                    transcript = session._transcript
+                    if transcript is None:
+                        transcript = session._transcript = Transcript()
+                    transcript.append(self.classification_cache.shared(user_message),
+                                      tables.reply_ids.get(reply, NO_REPLY), size)
+                return reply
+            finally:
+                self.sessions.save(user_id, session)
+                if events is not None:
+                    events.record(time.time(), user_id, _STATE_VALUES[from_state], _STATE_VALUES[session._state],
+                                  lang, intent, kind)
+                if metrics is not None:
+                    # State codes index a tuple of label strings; Enum.value is a slow descriptor
+                    from_label = _STATE_VALUES[from_state]
+                    metrics.transitions.inc(from_label, _STATE_VALUES[session._state], lang)
+                    metrics.turn_seconds.observe(time.perf_counter() - start, from_label)
+
+    def _advance(self, session: UserSession, user_message: str, reading: Reading,
+                 tables: _ContentTables) -> Tuple[str, Optional[Intent], ReplyKind]:
+        """Move ``session`` on by one reply; returns the answer, the intent it was read as and the kind of answer."""
+        lang = reading.lang
         session.language = lang
-        
-        # Handle initial greeting
-        if session.state == ConversationState.INITIAL:
-            session.state = ConversationState.ADMISSION_INTEREST
-            return self.get_admission_interest_message(lang)
-        
-        # Handle admission interest
-        elif session.state == ConversationState.ADMISSION_INTEREST:
-            if self.is_positive_response(user_message):
-                session.admission_interested = True
-                session.state = ConversationState.BIOLOGY_CHECK
-                return self.get_biology_check_message(lang)
-            elif self.is_negative_response(user_message):
-                session.admission_interested = False
-                session.state = ConversationState.END
-                return self.get_end_message(lang)
-            else:
-                return self.get_clarification_message('admission_interest', lang)
-        
-        # Handle biology check
-        elif session.state == ConversationState.BIOLOGY_CHECK:
-            if self.is_positive_response(user_message):
-                session.biology_studied = True
-                session.state = ConversationState.PROGRAM_DETAILS
-                return self.get_program_details_message(lang)
-            elif self.is_negative_response(user_message):
-                session.biology_studied = False
-                return self.get_biology_required_message(lang)
-            else:
-                return self.get_clarification_message('biology_check', lang)
-        
-        # Handle program details
-        elif session.state == ConversationState.PROGRAM_DETAILS:
-            if self.is_positive_response(user_message):
-                session.state = ConversationState.FEE_STRUCTURE
-                return self.get_fee_structure_message(lang)
-            elif self.is_negative_response(user_message):
-                session.state = ConversationState.END
-                return self.get_end_message(lang)
-            else:
-                return self.get_clarification_message('program_details', lang)
-        
-        # Handle fee structure
-        elif session.state == ConversationState.FEE_STRUCTURE:
-            if self.is_positive_response(user_message):
-                session.state = ConversationState.HOSTEL_FACILITIES
-                return self.get_hostel_facilities_message(lang)
-            elif self.is_negative_response(user_message):
-                session.state = ConversationState.END
-                return self.get_end_message(lang)
-            else:
-                return self.get_clarification_message('fee_structure', lang)
-        
-        # Handle hostel facilities
-        elif session.state == ConversationState.HOSTEL_FACILITIES:
-            if self.is_positive_response(user_message):
-                session.state = ConversationState.COLLEGE_LOCATION
-                return self.get_college_location_message(lang)
-            elif self.is_negative_response(user_message):
-                session.state = ConversationState.END
-                return self.get_end_message(lang)
-            else:
-                return self.get_clarification_message('hostel_facilities', lang)
-        
-        # Handle college location
-        elif session.state == ConversationState.COLLEGE_LOCATION:
-            if self.is_positive_response(user_message):
-                session.state = ConversationState.RECOGNITION
-                return self.get_recognition_message(lang)
-            elif self.is_negative_response(user_message):
-                session.state = ConversationState.END
-                return self.get_end_message(lang)
-            else:
-                return self.get_clarification_message('college_location', lang)
-        
-        # Handle recognition
-        elif session.state == ConversationState.RECOGNITION:
-            if self.is_positive_response(user_message):
-                session.state = ConversationState.CLINICAL_TRAINING
-                return self.get_clinical_training_message(lang)
-            elif self.is_negative_response(user_message):
-                session.state = ConversationState.END
-                return self.get_end_message(lang)
-            else:
-                return self.get_clarification_message('recognition', lang)
-        
-        # Handle clinical training
-        elif session.state == ConversationState.CLINICAL_TRAINING:
-            if self.is_positive_response(user_message):
-                session.state = ConversationState.SCHOLARSHIP
-                return self.get_scholarship_message(lang)
-            elif self.is_negative_response(user_message):
-                session.state = ConversationState.END
-                return self.get_end_message(lang)
-            else:
-                return self.get_clarification_message('clinical_training', lang)
-        
-        # Handle scholarship
-        elif session.state == ConversationState.SCHOLARSHIP:
-            if self.is_positive_response(user_message):
-                session.state = ConversationState.TOTAL_SEATS
-                return self.get_total_seats_message(lang)
-            elif self.is_negative_response(user_message):
-                session.state = ConversationState.END
-                return self.get_end_message(lang)
-            else:
-                return self.get_clarification_message('scholarship', lang)
-        
-        # Handle total seats
-        elif session.state == ConversationState.TOTAL_SEATS:
-            if self.is_positive_response(user_message):
-                session.state = ConversationState.ELIGIBILITY
-                return self.get_eligibility_message(lang)
-            elif self.is_negative_response(user_message):
-                session.state = ConversationState.END
-                return self.get_end_message(lang)
-            else:
-                return self.get_clarification_message('total_seats', lang)
-        
-        # Handle eligibility
-        elif session.state == ConversationState.ELIGIBILITY:
-            session.state = ConversationState.END
-            return self.get_final_message(lang)
-        
-        # Handle end state
-        elif session.state == ConversationState.END:
-            return self.get_end_message(lang)
-        
-        return self.get_default_message(lang)
-
-    # Message methods now accept lang ('hi' or 'en') and return the appropriate version
-    def get_admission_interest_message(self, lang: str) -> str:
-        if lang == 'hi':
-            return "नमस्ते! 👋\n\nक्या आप Nursing College में admission लेना चाहते हैं?\n\n('Haan' या 'Nahi' में उत्तर दें)"
+        messages = tables.content.messages
+
+        step = tables.steps.get(session.state)
+        if step is None:
+            texts = messages['default']
+            return texts.get(lang) or texts['en'], None, ReplyKind.DEFAULT
+
+        # Steps without a clarification key accept any reply
+        intent = Intent.YES if step.clarify is None else reading.intent
+
+        # A question about a topic is answered in place, unless it is a 'yes'
+        # to the very topic this step offers next. Bare yes/no words, replies
+        # with a 'no' in them ("no, I don't want the fees") and a 'yes' that
+        # asks nothing ("yes, in 12th") skip the lookup.
+        if (reading.vocabulary or Intent.NO in reading.intents
+                or reading.intent is Intent.YES and not asks(user_message)):
+            topic = None
         else:
-            return "Hello! 👋\n\nAre you interested in admission to the Nursing College?\n\n(Please respond with 'Yes' or 'No')"
+            topic = tables.faq.best(user_message)
+        if topic is not None and not (intent is Intent.YES and topic == step.yes_reply):
+            return tables.faq_replies[topic, step.clarify, lang], intent, ReplyKind.FAQ
 
-    def get_biology_check_message(self, lang: str) -> str:
-        if lang == 'hi':
-            return "बहुत अच्छा! \n\nक्या आपने 12th में Biology पढ़ी है?\n\n('Haan' या 'Nahi' में उत्तर दें)"
+        if intent is Intent.YES:
+            answer, next_state, key = True, step.on_yes, step.yes_reply
+        elif intent is Intent.NO:
+            answer, next_state, key = False, step.on_no, step.no_reply
         else:
-            return "Great!\n\nDid you study Biology in 12th grade?\n\n(Please respond with 'Yes' or 'No')"
+            if self.metrics is not None:
+                self.metrics.clarifications.inc(session.state.value)
+            return (tables.content.clarifications.get(step.clarify, {}).get(lang, DEFAULT_CLARIFICATION), intent,
+                    ReplyKind.CLARIFY)
+
+        if step.flag is not None:
+            setattr(session, step.flag, answer)
+        session.state = next_state
+        texts = messages[key]
+        return texts.get(lang) or texts['en'], intent, ReplyKind.STEP
+
+    def get_message(self, key: str, lang: str) -> str:
+        """The ``key`` message of the current content in ``lang``, English if it has no such translation."""
+        texts = self._tables.content.messages[key]
+        return texts.get(lang) or texts['en']
+
+    def get_admission_interest_message(self, lang: str) -> str:
+        return self.get_message('admission_interest', lang)
+
+    def get_biology_check_message(self, lang: str) -> str:
+        return self.get_message('biology_check', lang)
 
     def get_biology_required_message(self, lang: str) -> str:
-        if lang == 'hi':
-            return "B.Sc Nursing में admission के लिए Biology आवश्यक है।"
-        else:
-            return "Biology is mandatory for admission to B.Sc Nursing."
+        return self.get_message('biology_required', lang)
 
     def get_program_details_message(self, lang: str) -> str:
-        if lang == 'hi':
-            return "B.Sc Nursing Program के बारे में जानकारी:\n\n🎓 **B.Sc Nursing Program**\n- यह एक full-time program है\n- 4 साल का undergraduate course\n- Practical training के साथ theoretical knowledge\n- Real patients के साथ hands-on experience\n\nक्या आप program के बारे में और जानकारी चाहते हैं?\n\n('Haan' या 'Nahi' में उत्तर दें)"
-        else:
-            return "About the B.Sc Nursing Program:\n\n🎓 **B.Sc Nursing Program**\n- This is a full-time program\n- 4-year undergraduate course\n- Theoretical knowledge with practical training\n- Hands-on experience with real patients\n\nWould you like more information about the program?\n\n(Please respond with 'Yes' or 'No')"
+        return self.get_message('program_details', lang)
 
     def get_fee_structure_message(self, lang: str) -> str:
-        if lang == 'hi':
-            return "💰 **Fee Structure:**\n\n**Annual Fees Breakdown:**\n- Tuition Fee: ₹60,000 INR\n- Bus Fee: ₹10,000 INR\n- **Total Annual Fees: ₹70,000 INR**\n\n**Installment Plan:**\n- 1st Installment: ₹30,000 (admission के समय)\n- 2nd Installment: ₹20,000 (first semester के बाद)\n- 3rd Installment: ₹20,000 (second semester के बाद)\n\nक्या आप hostel facilities के बारे में जानना चाहते हैं?\n\n('Haan' या 'Nahi' में उत्तर दें)"
-        else:
-            return "💰 **Fee Structure:**\n\n**Annual Fees Breakdown:**\n- Tuition Fee: ₹60,000 INR\n- Bus Fee: ₹10,000 INR\n- **Total Annual Fees: ₹70,000 INR**\n\n**Installment Plan:**\n- 1st Installment: ₹30,000 (at the time of admission)\n- 2nd Installment: ₹20,000 (after the first semester)\n- 3rd Installment: ₹20,000 (after the second semester)\n\nWould you like to know about hostel facilities?\n\n(Please respond with 'Yes' or 'No')"
+        return self.get_message('fee_structure', lang)
 
     def get_hostel_facilities_message(self, lang: str) -> str:
-        if lang == 'hi':
-            return "🏠 **Hostel Facilities:**\n\n**Accommodation:**\n- 4x7 water and electricity supply\n- CCTV surveillance for security\n- On-site warden available\n\n**Training Facilities:**\n- Hospital training included\n- Real patients के साथ practical training\n- Professional medical environment\n\nक्या आप college location के बारे में जानना चाहते हैं?\n\n('Haan' या 'Nahi' में उत्तर दें)"
-        else:
-            return "🏠 **Hostel Facilities:**\n\n**Accommodation:**\n- 4x7 water and electricity supply\n- CCTV surveillance for security\n- On-site warden available\n\n**Training Facilities:**\n- Hospital training included\n- Practical training with real patients\n- Professional medical environment\n\nWould you like to know about the college location?\n\n(Please respond with 'Yes' or 'No')"
+        return self.get_message('hostel_facilities', lang)
 
     def get_college_location_message(self, lang: str) -> str:
-        if lang == 'hi':
-            return "📍 **College Location:**\n\nहमारा college Delhi में स्थित है।\n\nक्या आप location या surrounding area के बारे में और जानकारी चाहते हैं?\n\n('Haan' या 'Nahi' में उत्तर दें)"
-        else:
-            return "📍 **College Location:**\n\nOur college is located in Delhi.\n\nWould you like to know more about the location or surrounding area?\n\n(Please respond with 'Yes' or 'No')"
+        return self.get_message('college_location', lang)
 
     def get_recognition_message(self, lang: str) -> str:
-        if lang == 'hi':
-            return "🏛️ **Recognition & Accreditation:**\n\nहमारा college officially recognized है:\n- **Indian Nursing Council (INC)** (Delhi) द्वारा\n\nक्या आप clinical training locations के बारे में जानना चाहते हैं?\n\n('Haan' या 'Nahi' में उत्तर दें)"
-        else:
-            return "🏛️ **Recognition & Accreditation:**\n\nOur college is officially recognized by:\n- **Indian Nursing Council (INC)** (Delhi)\n\nWould you like to know about clinical training locations?\n\n(Please respond with 'Yes' or 'No')"
+        return self.get_message('recognition', lang)
 
     def get_clinical_training_message(self, lang: str) -> str:
-        if lang == 'hi':
-            return "🏥 **Clinical Training Locations:**\n\nहमारे students इन locations पर training करते हैं:\n\n- District Hospital (Backundpur)\n- Community Health Centers\n- Regional Hospital (Chartha)\n- Ranchi Neurosurgery and Allied Science Hospital (Ranchi, Jharkhand)\n\nक्या आप scholarship options के बारे में जानना चाहते हैं?\n\n('Haan' या 'Nahi' में उत्तर दें)"
-        else:
-            return "🏥 **Clinical Training Locations:**\n\nOur students receive training at the following locations:\n\n- District Hospital (Backundpur)\n- Community Health Centers\n- Regional Hospital (Chartha)\n- Ranchi Neurosurgery and Allied Science Hospital (Ranchi, Jharkhand)\n\nWould you like to know about scholarship options?\n\n(Please respond with 'Yes' or 'No')"
+        return self.get_message('clinical_training', lang)
 
     def get_scholarship_message(self, lang: str) -> str:
-        if lang == 'hi':
-            return "🎓 **Scholarship Options:**\n\nAvailable scholarships:\n- **Government Post-Matric Scholarship:** ₹18k-₹23k\n- **Labour Ministry Scholarships:** ₹40k-₹48k (Labour Registration वालों के लिए)\n\nक्या आप total seats के बारे में जानना चाहते हैं?\n\n('Haan' या 'Nahi' में उत्तर दें)"
-        else:
-            return "🎓 **Scholarship Options:**\n\nAvailable scholarships:\n- **Government Post-Matric Scholarship:** ₹18k-₹23k\n- **Labour Ministry Scholarships:** ₹40k-₹48k (for those with Labour Registration)\n\nWould you like to know about total seats available?\n\n(Please respond with 'Yes' or 'No')"
+        return self.get_message('scholarship', lang)
 
     def get_total_seats_message(self, lang: str) -> str:
-        if lang == 'hi':
-            return "👥 **Total Seats Available:**\n\nNursing program में कुल **60 seats** available हैं।\n\nक्या आप eligibility criteria के बारे में जानना चाहते हैं?\n\n('Haan' या 'Nahi' में उत्तर दें)"
-        else:
-            return "👥 **Total Seats Available:**\n\nThere are a total of **60 seats** available in the Nursing program.\n\nWould you like to know about the eligibility criteria?\n\n(Please respond with 'Yes' or 'No')"
+        return self.get_message('total_seats', lang)
 
     def get_eligibility_message(self, lang: str) -> str:
-        if lang == 'hi':
-            return "✅ **Eligibility Criteria for Admission:**\n\n**Required Qualifications:**\n- Biology in 12th grade (mandatory)\n- PNT Exam (must be passed)\n- Age: 17 to 35 years\n\n**Additional Requirements:**\n- Good health and fitness\n- English language proficiency\n- Commitment to nursing profession\n\nधन्यवाद! 🙏"
-        else:
-            return "✅ **Eligibility Criteria for Admission:**\n\n**Required Qualifications:**\n- Biology in 12th grade (mandatory)\n- PNT Exam (must be passed)\n- Age: 17 to 35 years\n\n**Additional Requirements:**\n- Good health and fitness\n- English language proficiency\n- Commitment to the nursing profession\n\nThank you! 🙏"
+        return self.get_message('eligibility', lang)
 
     def get_final_message(self, lang: str) -> str:
-        if lang == 'hi':
-            return "🎉 **Thank you for your interest!**\n\nआपको हमारे B.Sc Nursing program के बारे में सभी जानकारी मिल गई है।\n\n**Next Steps:**\n- Application form भरें\n- Required documents तैयार करें\n- PNT Exam की तैयारी करें\n\nकोई और सवाल हो तो हमसे संपर्क करें!\n\nधन्यवाद! 🙏"
-        else:
-            return "🎉 **Thank you for your interest!**\n\nYou have received all the information about our B.Sc Nursing program.\n\n**Next Steps:**\n- Fill out the application form\n- Prepare the required documents\n- Prepare for the PNT Exam\n\nIf you have any more questions, feel free to contact us!\n\nThank you! 🙏"
+        return self.get_message('final', lang)
 
     def get_end_message(self, lang: str) -> str:
-        if lang == 'hi':
-            return "धन्यवाद! 🙏\n\nआपका समय देने के लिए धन्यवाद। भविष्य में कोई सहायता चाहिए तो हमसे संपर्क करें।\n\nTake care! 👋"
-        else:
-            return "Thank you! 🙏\n\nThank you for your time. If you need any assistance in the future, feel free to contact us.\n\nTake care! 👋"
+        return self.get_message('end', lang)
 
     def get_clarification_message(self, context: str, lang: str) -> str:
-        clarifications = {
-            'admission_interest': {
-                'hi': "Kripya 'Haan' ya 'Nahi' mein jawab dein. क्या आप Nursing College में admission लेना चाहते हैं?",
-                'en': "Please reply with 'Yes' or 'No'. Are you interested in admission to the Nursing College?"
-            },
-            'biology_check': {
-                'hi': "Kripya 'Haan' ya 'Nahi' mein jawab dein. क्या आपने 12th में Biology पढ़ी है?",
-                'en': "Please reply with 'Yes' or 'No'. Did you study Biology in 12th grade?"
-            },
-            'program_details': {
-                'hi': "Kripya 'Haan' ya 'Nahi' mein jawab dein. क्या आप program के बारे में और जानकारी चाहते हैं?",
-                'en': "Please reply with 'Yes' or 'No'. Would you like more information about the program?"
-            },
-            'fee_structure': {
-                'hi': "Kripya 'Haan' ya 'Nahi' mein jawab dein. क्या आप hostel facilities के बारे में जानना चाहते हैं?",
-                'en': "Please reply with 'Yes' or 'No'. Would you like to know about hostel facilities?"
-            },
-            'hostel_facilities': {
-                'hi': "Kripya 'Haan' ya 'Nahi' mein jawab dein. क्या आप college location के बारे में जानना चाहते हैं?",
-                'en': "Please reply with 'Yes' or 'No'. Would you like to know about the college location?"
-            },
-            'college_location': {
-                'hi': "Kripya 'Haan' ya 'Nahi' mein jawab dein. क्या आप college की recognition के बारे में जानना चाहते हैं?",
-                'en': "Please reply with 'Yes' or 'No'. Would you like to know about the college's recognition?"
-            },
-            'recognition': {
-                'hi': "Kripya 'Haan' ya 'Nahi' mein jawab dein. क्या आप clinical training locations के बारे में जानना चाहते हैं?",
-                'en': "Please reply with 'Yes' or 'No'. Would you like to know about clinical training locations?"
-            },
-            'clinical_training': {
-                'hi': "Kripya 'Haan' ya 'Nahi' mein jawab dein. क्या आप scholarship options के बारे में जानना चाहते हैं?",
-                'en': "Please reply with 'Yes' or 'No'. Would you like to know about scholarship options?"
-            },
-            'scholarship': {
-                'hi': "Kripya 'Haan' ya 'Nahi' mein jawab dein. क्या आप total seats के बारे में जानना चाहते हैं?",
-                'en': "Please reply with 'Yes' or 'No'. Would you like to know about total seats available?"
-            },
-            'total_seats': {
-                'hi': "Kripya 'Haan' ya 'Nahi' mein jawab dein. क्या आप eligibility criteria के बारे में जानना चाहते हैं?",
-                'en': "Please reply with 'Yes' or 'No'. Would you like to know about the eligibility criteria?"
-            },
-        }
-        return clarifications.get(context, {}).get(lang, "Please reply with 'Yes' or 'No'.")
+        return self._tables.content.clarifications.get(context, {}).get(lang, DEFAULT_CLARIFICATION)
 
     def get_default_message(self, lang: str) -> str:
-        if lang == 'hi':
-            return "माफ़ कीजिए, मैं समझ नहीं पाया। कृपया फिर से प्रयास करें।"
-        else:
-            return "I'm sorry, I didn't understand. Please try again."
+        return self.get_message('default', lang)
 
 if __name__ == "__main__":
     # Test the chatbot
@@ -0,0 +1,183 @@
+"""Append-only log of conversation turns in size-rotated JSONL segments.
+
+Recording a turn appends one tuple to an in-memory buffer; a background
+thread drains the buffer every ``flush_interval`` seconds (sooner once it
+is a quarter full), encodes the batch and writes it with a single
+``write``. A request never waits for the disk. If the disk falls so far
+behind that the buffer reaches ``capacity``, events are dropped, newest
+or oldest per ``overflow``, and counted in ``dropped``.
+
+Segments are named ``<prefix>-<writer>-<sequence>.jsonl`` and never
+rewritten. The writer is the worker's id, the process id by default, so
+several processes can log to one directory: each numbers, rotates and
+prunes only its own segments, and a restarted worker with the same id
+starts a new one after its highest sequence on disk. ``analytics.py``
+merges the writers' segments back into one stream by time.
+"""
+
+import json
+import os
+import re
+import threading
+from collections import deque
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# (timestamp, user_id, from_state, to_state, lang, intent[, reply]); intent is
+# None for a turn that read no answer, such as one after the conversation
+# ended. reply is the kind of answer sent (step, clarify, faq, default).
+Event = Tuple[object, ...]
+
+OVERFLOW_POLICIES = ('drop_newest', 'drop_oldest')
+
+
+def _segment_re(prefix: str):
+    return re.compile(r'%s-(\d+)\.jsonl\Z' % re.escape(prefix))
+
+
+def _label(value: object) -> str:
+    value = getattr(value, 'value', value)
+    return 'null' if value is None else '"%s"' % value
+
+
+def _encode(event: Event) -> str:
+    ts, user_id, from_state, to_state, lang, intent = event[:6]
+    # Everything but the user id is a fixed ASCII label
+    line = '{"ts": %.6f, "user_id": %s, "from_state": "%s", "to_state": "%s", "lang": "%s", "intent": %s' % (
+        ts, json.dumps(user_id, ensure_ascii=False), from_state, to_state, lang, _label(intent))
+    if len(event) > 6:
+        line += ', "reply": %s' % _label(event[6])
+    return line + '}\n'
+
+
+class EventLog:
+    def __init__(self, directory: str, prefix: str = 'events', max_bytes: int = 64 * 2 ** 20,
+                 max_segments: Optional[int] = None, capacity: int = 65536, flush_interval: float = 0.2,
+                 overflow: str = 'drop_newest', writer: Optional[str] = None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError('overflow must be one of %s, not %r' % (', '.join(OVERFLOW_POLICIES), overflow))
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.writer = writer or str(os.getpid())
+        if not re.fullmatch(r'[\w.-]+', self.writer):
+            raise ValueError('writer must be letters, digits, _, . and -, not %r' % self.writer)
+        # Everything below works on this writer's segments only
+        self.prefix = '%s-%s' % (prefix, self.writer)
+        self.max_bytes = max_bytes
+        self.max_segments = max_segments
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self._drop_newest = overflow == 'drop_newest'
+        # deque appends and pops are atomic, so recording takes no lock
+        self._buffer: Deque[Event] = deque(maxlen=None if self._drop_newest else capacity)
+        self._wake_at = max(1, capacity // 4)
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self._sequence = max(self._sequences(), default=0)
+        self._file = None
+        self._size = 0
+        self.recorded = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.events_written = 0
+        self.rotations = 0
+
+    def _sequences(self) -> List[int]:
+        pattern = _segment_re(self.prefix)
+        return sorted(int(m.group(1)) for m in map(pattern.match, os.listdir(self.directory)) if m)
+
+    def _segment_path(self, sequence: int) -> str:
+        return os.path.join(self.directory, '%s-%08d.jsonl' % (self.prefix, sequence))
+
+    def segments(self) -> List[str]:
+        """Paths of the segments on disk, oldest first."""
+        return [self._segment_path(sequence) for sequence in self._sequences()]
+
+    def record(self, *event: object) -> None:
+        """Buffer one event; never blocks on the disk."""
+        buffer = self._buffer
+        if len(buffer) >= self.capacity:
+            self.dropped += 1
+            if self._drop_newest:
+                return
+        buffer.append(event)  # type: ignore[arg-type]
+        self.recorded += 1
+        if self._flusher is None:
+            self._start_flusher()
+        elif len(buffer) >= self._wake_at:
+            self._wake.set()
+
+    def _start_flusher(self) -> None:
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name='event-log-flush', daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while not self._closed.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """Write every buffered event to the current segment."""
+        buffer = self._buffer
+        with self._lock:
+            events = [buffer.popleft() for _ in range(len(buffer))]
+            if not events:
+                return
+            data = ''.join(map(_encode, events)).encode('utf-8')
+            if self._file is None or (self._size and self._size + len(data) > self.max_bytes):
+                self._rotate()
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data)
+            self.flushes += 1
+            self.events_written += len(events)
+
+    def _rotate(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self.rotations += 1
+        self._sequence += 1
+        self._file = open(self._segment_path(self._sequence), 'ab')
+        self._size = 0
+        if self.max_segments is not None:
+            for path in self.segments()[:-self.max_segments]:
+                os.remove(path)
+
+    def close(self) -> None:
+        self._closed.set()
+        self._wake.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'buffered': len(self._buffer),
+            'recorded': self.recorded,
+            'dropped': self.dropped,
+            'flushes': self.flushes,
+            'events_written': self.events_written,
+            'rotations': self.rotations,
+        }
+
+
+def read_events(paths: Iterable[str]) -> Iterator[Dict[str, object]]:
+    """Stream the events of ``paths`` in order, one dict per turn."""
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                # A crash mid-write can leave the last line cut short
+                if not line.endswith('\n'):
+                    break
+                if line.strip():
+                    yield json.loads(line)
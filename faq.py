@@ -0,0 +1,124 @@
+"""Free-form questions ("what is the fee?") answered from the chatbot's own replies.
+
+An inverted index maps English, Hindi and romanized-Hindi words to the
+flow topics (fee structure, hostel, seats, ...) whose replies they point
+at. It is built once from the text of the topic replies plus a table of
+keywords and synonyms. Answering a question is one tokenization and a
+few dict lookups.
+"""
+
+import math
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Devanagari vowel signs are not \w, so include the whole block in a word
+_WORD_RE = re.compile('[\\w\u0900-\u097F]+')
+
+# Keywords and synonyms per topic; a topic is the reply key of its flow step
+TOPIC_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    'program_details': ('program', 'programme', 'course', 'duration', 'years', 'syllabus', 'degree', 'bsc',
+                        'kitne saal', 'कोर्स', 'अवधि', 'पाठ्यक्रम'),
+    'fee_structure': ('fee', 'fees', 'cost', 'price', 'tuition', 'installment', 'installments', 'instalment',
+                      'kist', 'kharcha', 'shulk', 'payment', 'bus fee', 'फीस', 'शुल्क', 'खर्च', 'किस्त'),
+    'hostel_facilities': ('hostel', 'accommodation', 'room', 'rooms', 'stay', 'rehna', 'rahna', 'warden', 'cctv',
+                          'chhatravas', 'हॉस्टल', 'छात्रावास', 'कमरा'),
+    'college_location': ('location', 'address', 'kahan', 'kaha', 'city', 'situated', 'located', 'कहाँ',
+                         'कहां', 'स्थान'),
+    'recognition': ('recognition', 'recognized', 'recognised', 'accreditation', 'accredited', 'approved', 'inc',
+                    'council', 'manyata', 'मान्यता', 'मान्य'),
+    'clinical_training': ('clinical', 'training', 'hospital', 'hospitals', 'practical', 'internship',
+                          'prashikshan', 'अस्पताल', 'प्रशिक्षण', 'ट्रेनिंग'),
+    'scholarship': ('scholarship', 'scholarships', 'financial aid', 'concession', 'chhatravritti', 'vazifa',
+                    'छात्रवृत्ति', 'स्कॉलरशिप'),
+    'total_seats': ('seats', 'seat', 'intake', 'capacity', 'vacancy', 'vacancies', 'सीट', 'सीटें', 'सीटों'),
+    'eligibility': ('eligibility', 'eligible', 'criteria', 'qualification', 'requirements', 'requirement', 'age',
+                    'pnt', 'entrance', 'yogyata', 'umar', 'umr', 'योग्यता', 'उम्र', 'आयु'),
+}
+
+# Words that say nothing about the topic: prompts shared by every reply,
+# and the yes/no replies that drive the flow
+STOPWORDS = frozenset('''
+    a an and are about any at be by for from have how i in is it know like me more my of on or our please
+    respond the there this to us what when which with would you your yes no haan nahi ok okay tell want
+    hai hain kya ke ki ko ka se mein में है हैं के की को का से और क्या आप हमारे
+'''.split())
+
+# Words that make a reply a question or a request for details. A 'yes'
+# without one answers the step ("yes, I studied biology in 12th") even
+# when it names a topic.
+QUESTION_WORDS = frozenset('''
+    what whats how when where which who why tell explain details detail information info
+    kitna kitni kitne kaisa kaisi kaise kahan kaha kab kaun kyun kya batao bataiye bataye jankari
+    क्या कितनी कितना कितने कैसा कैसी कैसे कहाँ कहां कब कौन क्यों बताओ बताइए जानकारी
+'''.split())
+
+SYNONYM_WEIGHT = 3.0
+CONTENT_WEIGHT = 1.0
+
+
+def words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+class FaqIndex:
+    """Ranks topics for a free-form question.
+
+    Each (word, topic) posting carries a precomputed weight: keywords and
+    synonyms count ``SYNONYM_WEIGHT``, words of the topic's reply text
+    ``CONTENT_WEIGHT``, both scaled by how few topics share the word.
+    Multi-word keywords are matched as word pairs.
+    """
+
+    def __init__(self, documents: Dict[str, Iterable[str]],
+                 keywords: Dict[str, Sequence[str]] = TOPIC_KEYWORDS, min_score: float = 2.0):
+        self.min_score = min_score
+        raw: Dict[str, Dict[str, float]] = defaultdict(dict)
+        for topic, texts in documents.items():
+            for text in texts:
+                for word in set(words(text)):
+                    if word not in STOPWORDS and len(word) > 2 and not word.isdigit():
+                        raw[word][topic] = CONTENT_WEIGHT
+            for keyword in keywords.get(topic, ()):
+                raw[' '.join(words(keyword))][topic] = SYNONYM_WEIGHT
+
+        topics = len(documents)
+        self.postings: Dict[str, Tuple[Tuple[str, float], ...]] = {}
+        for word, by_topic in raw.items():
+            idf = math.log((topics + 1) / len(by_topic))
+            self.postings[word] = tuple((topic, weight * idf) for topic, weight in by_topic.items())
+        self.topics = tuple(documents)
+
+    def search(self, text: str) -> List[Tuple[str, float]]:
+        """Topics matching ``text``, best first, with their scores."""
+        tokens = words(text)
+        postings = self.postings
+        scores: Dict[str, float] = {}
+        previous = None
+        for token in tokens:
+            candidates = (token,) if previous is None else (token, previous + ' ' + token)
+            previous = token
+            for key in candidates:
+                for topic, weight in postings.get(key, ()):
+                    scores[topic] = scores.get(topic, 0.0) + weight
+        return sorted(scores.items(), key=lambda item: -item[1])
+
+    def best(self, text: str) -> Optional[str]:
+        """The best topic for ``text``, or None if nothing scores ``min_score``."""
+        ranked = self.search(text)
+        if ranked and ranked[0][1] >= self.min_score:
+            return ranked[0][0]
+        return None
+
+
+def asks(text: str) -> bool:
+    """Whether ``text`` asks something: a question mark or a question word."""
+    return '?' in text or not QUESTION_WORDS.isdisjoint(words(text))
+
+
+def answer_body(reply: str) -> str:
+    """``reply`` without its closing question and yes/no prompt."""
+    paragraphs = reply.split('\n\n')
+    while len(paragraphs) > 1 and (paragraphs[-1].startswith('(') or paragraphs[-1].rstrip().endswith('?')):
+        paragraphs.pop()
+    return '\n\n'.join(paragraphs)
@@ -0,0 +1,150 @@
+"""Typo-tolerant lookup of a small vocabulary ("yess", "nhi", "bilkull").
+
+Words are first compared with repeated letters collapsed, which absorbs
+the most common typo, holding a key down ("okk", "haaan"). Every string
+one edit (a letter inserted, deleted, replaced, or two letters swapped)
+away from a vocabulary word is precomputed, so the usual typo is one
+dict lookup. Short words are close to too much ordinary English for
+that: "hope" is one letter from "nope", "move" from "more", "donut" from
+"dont". Below ``anchored`` letters a typo must keep the first letter and
+have no letter replaced or added ("nop", "fien"), and words below
+``min_length`` letters match only with repeats collapsed or as one of
+the known ``typos`` ("yse", "hn"). Long words also tolerate a second
+edit that adds no letters and keeps both ends ("interstd", but not
+"uninterested" or "bright" for "alright"). Those are found through a
+deletion-neighbourhood index: every string reachable from a long word by
+deleting up to two letters points back at the word, and the typed
+word's own deletions are the keys to look up, so a query never scans
+the vocabulary. Candidates are confirmed with an edit distance
+that counts transpositions.
+"""
+
+import re
+import string
+from typing import Dict, Generic, Iterable, List, Optional, Set, Tuple, TypeVar
+
+V = TypeVar('V')
+
+_REPEATS_RE = re.compile(r'(.)\1+')
+# Typos are made on a Latin keyboard; Devanagari is matched exactly
+ALPHABET = string.ascii_lowercase
+
+_AMBIGUOUS = object()
+
+
+def collapse_repeats(word: str) -> str:
+    """``word`` with runs of one letter reduced to a single letter."""
+    return _REPEATS_RE.sub(r'\1', word)
+
+
+def neighbours(word: str, alphabet: str = ALPHABET, short: bool = False) -> Set[str]:
+    """Every string one insertion, deletion, substitution or transposition from ``word``.
+
+    With ``short``, only deletions and transpositions that keep the first
+    letter: a short word with a letter replaced or added is more often
+    another word ("more" and "move", "dont" and "donut") than a typo.
+    """
+    splits = [(word[:i], word[i:]) for i in range(1 if short else 0, len(word) + 1)]
+    found = {a + b[1:] for a, b in splits if b}
+    found.update(a + b[1] + b[0] + b[2:] for a, b in splits if len(b) > 1)
+    if not short:
+        found.update(a + c + b[1:] for a, b in splits if b for c in alphabet)
+        found.update(a + c + b for a, b in splits for c in alphabet)
+    found.discard(word)
+    return found
+
+
+def deletions(word: str, distance: int) -> Set[str]:
+    """Every string made by deleting up to ``distance`` letters of ``word``, keeping one."""
+    keys = {word}
+    level = keys
+    for _ in range(distance):
+        level = {w[:i] + w[i + 1:] for w in level if len(w) > 1 for i in range(len(w))}
+        keys |= level
+    return keys
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Optimal string alignment distance: edits plus adjacent transpositions."""
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class FuzzyIndex(Generic[V]):
+    """Maps misspelt words to the value of the vocabulary word they meant.
+
+    Words of ``min_length`` letters or more (after collapsing repeats)
+    match one edit away (a deletion or transposition that keeps the first
+    letter, if shorter than ``anchored``), and words of ``long_word``
+    letters or more two edits away, as long as the typo is no longer than
+    the word and has the same first and last letters. Shorter words only
+    match with repeats collapsed, since a three-letter word is one edit
+    away from too much ordinary text, or through ``typos``, which maps
+    known misspellings to the word meant.
+    Words in ``ignore`` never match, and a typo equally close to words
+    with different values is ambiguous and matches nothing.
+    """
+
+    def __init__(self, vocabulary: Dict[str, V], long_word: int = 6, min_length: int = 4, anchored: int = 5,
+                 ignore: Iterable[str] = (), typos: Optional[Dict[str, str]] = None):
+        self.long_word = long_word
+        self.min_length = min_length
+        self.anchored = anchored
+        self.ignore = frozenset(ignore)
+        self.collapsed: Dict[str, V] = {}
+        for word, value in vocabulary.items():
+            self.collapsed.setdefault(collapse_repeats(word), value)
+        # Matched as they are, with no neighbourhood of their own
+        self.typos: Dict[str, V] = {collapse_repeats(typo): vocabulary[word]
+                                    for typo, word in (typos or {}).items() if word in vocabulary}
+
+        # one edit away -> value, or _AMBIGUOUS
+        self.near: Dict[str, object] = {}
+        # deletion key of a long word -> (collapsed long word, value)
+        self.index: Dict[str, List[Tuple[str, V]]] = {}
+        for short, value in self.collapsed.items():
+            if len(short) < self.min_length:
+                continue
+            for typo in neighbours(short, short=len(short) < self.anchored):
+                if typo not in self.collapsed:
+                    if self.near.setdefault(typo, value) != value:
+                        self.near[typo] = _AMBIGUOUS
+            if len(short) >= self.long_word:
+                for key in deletions(short, 2):
+                    self.index.setdefault(key, []).append((short, value))
+        # Queries this short cannot be two edits from a long word
+        self._min_far_length = self.long_word - 2
+
+    def lookup(self, word: str) -> Optional[V]:
+        if word in self.ignore:
+            return None
+        short = collapse_repeats(word)
+        value = self.collapsed.get(short)
+        if value is None:
+            value = self.typos.get(short)
+        if value is not None or len(short) < 2:
+            return value
+        near = self.near.get(short)
+        if near is not None:
+            return None if near is _AMBIGUOUS else near  # type: ignore[return-value]
+        if len(short) < self._min_far_length or not self.index:
+            return None
+
+        candidates: Set[Tuple[str, V]] = set()
+        for key in deletions(short, 2):
+            candidates.update(self.index.get(key, ()))
+        # A second edit may not add letters or change the ends: "uninterested"
+        # and "bright" are words of their own, not typos of "interested" and "alright"
+        found = {value for candidate, value in candidates
+                 if len(short) <= len(candidate) and short[0] == candidate[0] and short[-1] == candidate[-1]
+                 and edit_distance(short, candidate) <= 2}
+        return found.pop() if len(found) == 1 else None
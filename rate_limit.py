@@ -0,0 +1,257 @@
+"""Per-user and per-IP rate limits, and one reply for a message sent twice.
+
+A token bucket of ``burst`` tokens refilled at ``rate`` per second is
+kept as one float per key: the time at which the bucket will be full
+again. Taking a token moves that time ``1 / rate`` later, and a request
+is refused if it would be more than ``burst`` tokens ahead of the clock
+(the generic cell rate algorithm). A key whose bucket is full again
+holds nothing worth keeping, so the table keeps only clients that sent
+something lately. Keys are in least-recently-used order, and each call
+drops a few full buckets from the front, as ``SessionStore`` expires
+sessions.
+
+``Coalescer`` answers a repeat of a user's last message with the first
+one's reply while that is being worked out and for ``window`` seconds
+after. A double submit or a client retry then gets the reply the first
+request got instead of moving the conversation on a second time.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, NamedTuple, Optional, Tuple
+
+from metrics import ChatMetrics
+
+# A refused request costs one of these, not a JSON encode
+TOO_MANY_REQUESTS_BODY = json.dumps({'error': 'too many requests'}).encode()
+LOOPBACK = frozenset(('127.0.0.1', '::1', 'localhost'))
+
+
+class TokenBuckets:
+    """A token bucket per key, ``burst`` deep and refilled at ``rate`` tokens a second."""
+
+    # Full buckets dropped per call; above 1 so the table shrinks while clients come and go
+    EXPIRE_BATCH = 2
+
+    def __init__(self, rate: float, burst: int, max_keys: int = 100000, clock: Callable[[], float] = time.monotonic):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+        if max_keys < 1:
+            raise ValueError("max_keys must be at least 1")
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.clock = clock
+        self.interval = 1.0 / rate
+        # How far the full-again time may run ahead of the clock before a request is refused
+        self.tolerance = (burst - 1) * self.interval
+        # key -> when its bucket is full again
+        self._full_at: 'OrderedDict[Hashable, float]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.refused = 0
+
+    def take(self, key: Hashable) -> float:
+        """Take a token for ``key``: 0.0 if there was one, else the seconds until there is."""
+        now = self.clock()
+        with self._lock:
+            self._expire(now, self.EXPIRE_BATCH)
+            full_at = self._full_at.pop(key, now)
+            if full_at < now:
+                full_at = now
+            wait = full_at - now - self.tolerance
+            if wait > 0:
+                self._full_at[key] = full_at
+                self.refused += 1
+                return wait
+            if len(self._full_at) >= self.max_keys:
+                self._full_at.popitem(last=False)
+            self._full_at[key] = full_at + self.interval
+            return 0.0
+
+    def _expire(self, now: float, limit: Optional[int] = None) -> int:
+        entries = self._full_at
+        removed = 0
+        while entries and (limit is None or removed < limit):
+            key, full_at = next(iter(entries.items()))
+            if full_at > now:
+                break
+            del entries[key]
+            removed += 1
+        return removed
+
+    def expire(self) -> int:
+        """Drop the full buckets at the front of the table; returns how many were dropped."""
+        with self._lock:
+            return self._expire(self.clock())
+
+    def __len__(self) -> int:
+        return len(self._full_at)
+
+
+class _Turn:
+    __slots__ = ('message', 'message_id', 'reply', 'finished_at')
+
+    def __init__(self, message: str, message_id: Optional[str] = None):
+        self.message = message
+        self.message_id = message_id
+        self.reply: Optional[str] = None
+        # None while the turn runs
+        self.finished_at: Optional[float] = None
+
+
+class Coalescer:
+    """One reply per message sent again by the same key while the first is still being answered.
+
+    "yes" twice in a row is two answers, so a finished turn is only shared
+    with a retry carrying the same client ``message_id``, and only for
+    ``window`` seconds after it finished.
+    """
+
+    EXPIRE_BATCH = 2
+
+    def __init__(self, window: float = 2.0, max_keys: int = 100000, clock: Callable[[], float] = time.monotonic):
+        if max_keys < 1:
+            raise ValueError("max_keys must be at least 1")
+        self.window = window
+        self.max_keys = max_keys
+        self.clock = clock
+        # key -> its last turn, oldest first
+        self._turns: 'OrderedDict[Hashable, _Turn]' = OrderedDict()
+        # Waiters for a turn still running share the table lock
+        self._changed = threading.Condition()
+        self.coalesced = 0
+
+    def run(self, key: Hashable, message: str, turn: Callable[[], str],
+            message_id: Optional[str] = None) -> Tuple[str, bool]:
+        """The reply to ``message`` from ``key`` and whether it was shared with an earlier request.
+
+        ``turn`` computes the reply when there is none to share.
+        """
+        now = self.clock()
+        with self._changed:
+            self._expire(now, self.EXPIRE_BATCH)
+            last = self._turns.get(key)
+            if last is not None and last.message == message and last.message_id == message_id and (
+                    last.finished_at is None or message_id is not None and now - last.finished_at <= self.window):
+                while last.finished_at is None:
+                    self._changed.wait()
+                if last.reply is not None:
+                    self.coalesced += 1
+                    return last.reply, True
+            current = _Turn(message, message_id)
+            self._turns.pop(key, None)
+            if len(self._turns) >= self.max_keys:
+                self._turns.popitem(last=False)
+            self._turns[key] = current
+        reply = None
+        try:
+            reply = turn()
+            return reply, False
+        finally:
+            # A turn that raised leaves no reply, and requests waiting on it run their own
+            with self._changed:
+                current.reply = reply
+                current.finished_at = self.clock()
+                # Without an id no later request can be a retry of this one
+                if message_id is None and self._turns.get(key) is current:
+                    del self._turns[key]
+                self._changed.notify_all()
+
+    def forget(self, key: Hashable) -> None:
+        """Let ``key``'s next message through whatever it is, e.g. after its conversation is reset."""
+        with self._changed:
+            self._turns.pop(key, None)
+
+    def _expire(self, now: float, limit: Optional[int] = None) -> int:
+        turns = self._turns
+        deadline = now - self.window
+        removed = 0
+        while turns and (limit is None or removed < limit):
+            key, last = next(iter(turns.items()))
+            if last.finished_at is None or last.finished_at > deadline:
+                break
+            del turns[key]
+            removed += 1
+        return removed
+
+    def __len__(self) -> int:
+        return len(self._turns)
+
+
+class Throttled(NamedTuple):
+    limit: str  # 'user' or 'ip'
+    retry_after: float
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, int(self.retry_after + 0.999)))
+
+
+def client_ip(peer: Optional[str], forwarded_for: Optional[str]) -> Optional[str]:
+    """The address to limit: ``peer``, or the hop a local proxy such as router.py added to X-Forwarded-For."""
+    if peer in LOOPBACK and forwarded_for:
+        return forwarded_for.rsplit(',', 1)[-1].strip()
+    return peer
+
+
+class RateLimiter:
+    """The limits in front of ``/chat``: buckets by user and by client address, and duplicate coalescing.
+
+    Any of the three may be None to leave it out.
+    """
+
+    def __init__(self, users: Optional[TokenBuckets] = None, ips: Optional[TokenBuckets] = None,
+                 coalescer: Optional[Coalescer] = None, metrics: Optional[ChatMetrics] = None):
+        self.users = users
+        self.ips = ips
+        self.coalescer = coalescer
+        self.metrics = metrics
+
+    @classmethod
+    def from_env(cls, metrics: Optional[ChatMetrics] = None) -> 'RateLimiter':
+        """Limits from ``CHATBOT_USER_RATE``/``_BURST``, ``CHATBOT_IP_RATE``/``_BURST`` and
+        ``CHATBOT_COALESCE_WINDOW``; a rate or window of 0 turns that part off."""
+        user_rate = float(os.environ.get('CHATBOT_USER_RATE', 1))
+        ip_rate = float(os.environ.get('CHATBOT_IP_RATE', 20))
+        window = float(os.environ.get('CHATBOT_COALESCE_WINDOW', 2))
+        return cls(
+            TokenBuckets(user_rate, int(os.environ.get('CHATBOT_USER_BURST', 10))) if user_rate > 0 else None,
+            TokenBuckets(ip_rate, int(os.environ.get('CHATBOT_IP_BURST', 100))) if ip_rate > 0 else None,
+            Coalescer(window) if window > 0 else None,
+            metrics,
+        )
+
+    def check(self, user_id: Optional[str] = None, ip: Optional[str] = None) -> Optional[Throttled]:
+        """Take a token from each bucket that applies; the limit hit, if any."""
+        for limit, buckets, key in (('ip', self.ips, ip), ('user', self.users, user_id)):
+            if buckets is not None and key is not None:
+                wait = buckets.take(key)
+                if wait:
+                    if self.metrics is not None:
+                        self.metrics.throttled.inc(limit)
+                    return Throttled(limit, wait)
+        return None
+
+    def reply(self, key: Hashable, message: str, turn: Callable[[], str], message_id: object = None) -> str:
+        """``turn()``'s reply, or the one being given to the same message from ``key``.
+
+        ``message_id`` is the client's id for the message, if it sent a
+        string one; a retry with the same id gets the reply already given.
+        """
+        if self.coalescer is None:
+            return turn()
+        if not isinstance(message_id, str):
+            message_id = None
+        reply, coalesced = self.coalescer.run(key, message, turn, message_id)
+        if coalesced and self.metrics is not None:
+            self.metrics.coalesced.inc()
+        return reply
+
+    def forget(self, key: Hashable) -> None:
+        if self.coalescer is not None:
+            self.coalescer.forget(key)
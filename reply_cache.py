@@ -0,0 +1,81 @@
+"""Chat replies encoded to JSON (and gzip) once, at startup.
+
+Every reply is one of a fixed set of strings, many of them kilobytes of
+emoji and Devanagari. Encoding a ``/chat`` body therefore only needs the
+user id spliced in after the pre-encoded reply. The gzip variant is the
+reply compressed up to a sync flush; a request appends the user id as a
+final stored deflate block and the gzip trailer, so nothing is
+compressed per request.
+"""
+
+import json
+import struct
+import zlib
+from typing import Dict, Iterable, NamedTuple, Optional
+
+GZIP_WBITS = 31  # zlib container with a gzip header
+# A stored deflate block holds at most this many bytes
+MAX_STORED_BLOCK = 0xFFFF
+
+
+def _dumps(value: object) -> bytes:
+    return json.dumps(value, ensure_ascii=False).encode('utf-8')
+
+
+def _gzip_compressor(level: int):
+    return zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+
+
+class EncodedReply(NamedTuple):
+    # b'{"response": "...", "user_id": '
+    prefix: bytes
+    # gzip header and the prefix as non-final deflate blocks, byte aligned
+    gzip_head: Optional[bytes]
+    crc: int
+
+
+class ReplyCache:
+    def __init__(self, texts: Iterable[str], gzip_level: Optional[int] = 6):
+        self.gzip_level = gzip_level
+        # Replies are looked up by the reply string itself: every (message
+        # key, language) pair is one distinct constant string
+        self._replies: Dict[str, EncodedReply] = {}
+        self.update(texts)
+
+    def update(self, texts: Iterable[str]) -> None:
+        """Pre-encode the replies of ``texts`` not held yet, such as those of a newly loaded tenant."""
+        for text in texts:
+            if text not in self._replies:
+                self._replies[text] = self._encode_reply(text)
+
+    def _encode_reply(self, text: str) -> EncodedReply:
+        prefix = b'{"response": ' + _dumps(text) + b', "user_id": '
+        if self.gzip_level is None:
+            return EncodedReply(prefix, None, 0)
+        compressor = _gzip_compressor(self.gzip_level)
+        head = compressor.compress(prefix) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        return EncodedReply(prefix, head, zlib.crc32(prefix))
+
+    def chat_body(self, response: str, user_id: str, gzip: bool = False) -> bytes:
+        """The JSON body of a ``/chat`` reply, gzip-compressed if asked."""
+        reply = self._replies.get(response)
+        if reply is None:
+            reply = self._encode_reply(response)
+        suffix = _dumps(user_id) + b'}'
+        if not gzip:
+            return reply.prefix + suffix
+        if reply.gzip_head is None or len(suffix) > MAX_STORED_BLOCK:
+            compressor = _gzip_compressor(self.gzip_level or 6)
+            return compressor.compress(reply.prefix + suffix) + compressor.flush()
+        # Final stored block (BFINAL=1, BTYPE=00), then CRC32 and size of the whole body
+        return b''.join((
+            reply.gzip_head,
+            struct.pack('<BHH', 1, len(suffix), len(suffix) ^ 0xFFFF), suffix,
+            struct.pack('<II', zlib.crc32(suffix, reply.crc), (len(reply.prefix) + len(suffix)) & 0xFFFFFFFF),
+        ))
+
+    def __len__(self) -> int:
+        return len(self._replies)
+
+    def __contains__(self, response: object) -> bool:
+        return response in self._replies
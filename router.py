@@ -0,0 +1,711 @@
+"""A local front that spreads users over several worker processes, each keeping its own sessions.
+
+Sessions live in the memory of the worker that served the conversation,
+so every request of a user has to reach the same worker. The router
+picks it by consistent hashing of ``user_id``: each worker owns many
+points on a hash ring and a user belongs to the first point after the
+hash of their id. Adding or removing a worker only moves the users
+between its points and their neighbours, about one in ``workers + 1``,
+and the router hands their sessions over before serving them again.
+
+    python router.py --workers 4 --port 5000
+
+starts four ``uvicorn asgi_app:app`` workers on free local ports (see
+``--worker-command``) and serves the usual endpoints on port 5000:
+
+- ``POST /chat``, ``POST /reset`` and ``POST /history`` go to the owner
+  of the body's ``user_id``. A first message without one is given an id
+  here, so the worker that answers it is the one that owns it.
+- ``POST /chat/batch`` is split by owner, sent to the workers at once and
+  put back together in the order of the request.
+- ``/ws`` sockets are tunnelled to the owner of the ``user_id`` in the
+  query string.
+- Everything else (the chat page, ``/metrics``) goes to the workers in
+  turn. Metrics are per process, so scrape each worker's own port.
+
+Requests are forwarded with the client's address added to
+``X-Forwarded-For``, which the workers' per-address limits go by. Each
+worker limits only the requests it serves, so an address's share is that
+many times the configured rate.
+
+``SIGUSR1`` starts one more worker and ``SIGUSR2`` retires the newest.
+During the handover new requests wait and open sockets of moving users
+are closed; the page carries on over ``POST /chat``. A worker that exits
+is restarted under the same name, so it keeps its share of users, but
+their sessions are lost unless snapshots are on.
+
+Each worker gets its name in ``CHATBOT_WORKER_ID``. Files a worker writes
+on its own are kept apart: ``CHATBOT_SNAPSHOT`` gets the name added
+(``sessions.snap`` becomes ``sessions-worker-0.snap``), so a restarted
+worker restores its own users, and event log segments carry the name.
+
+Workers take part through ``POST /sessions/export`` and
+``POST /sessions/import``, which only answer requests carrying the
+``CHATBOT_ROUTER_TOKEN`` the router started them with.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import shlex
+import signal
+import socket
+import subprocess
+import sys
+import uuid
+from bisect import bisect
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, quote
+
+from chatbot import UserSession
+from session_store import SessionStore
+from tenants import TenantRegistry
+
+log = logging.getLogger(__name__)
+
+# Points per worker; enough that each worker's share is within a few percent of even
+REPLICAS = 160
+STICKY_PATHS = frozenset(('/chat', '/reset', '/history'))
+BATCH_PATH = '/chat/batch'
+EXPORT_PATH = '/sessions/export'
+IMPORT_PATH = '/sessions/import'
+TOKEN_HEADER = b'x-router-token'
+TOKEN_ENV = 'CHATBOT_ROUTER_TOKEN'
+WORKER_ID_ENV = 'CHATBOT_WORKER_ID'
+DEFAULT_WORKER_COMMAND = '%s -m uvicorn asgi_app:app --log-level warning --backlog 4096 --port {port}' % (
+    shlex.quote(sys.executable))
+MAX_BODY = 2 ** 20
+MAX_HEADERS = 100
+# Hop-by-hop headers; the router frames every message itself
+_DROPPED_HEADERS = frozenset((b'connection', b'keep-alive', b'transfer-encoding', b'content-length'))
+
+
+def ring_hash(key: str) -> int:
+    """A 64-bit hash of ``key`` that is the same in every process (``hash()`` is salted per process)."""
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8', 'surrogatepass'), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Consistent hashing of keys onto named nodes, ``replicas`` points per node."""
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = REPLICAS):
+        if replicas < 1:
+            raise ValueError("replicas must be at least 1")
+        self.replicas = replicas
+        self._nodes: List[str] = []
+        # Sorted hashes of every point and the node owning each
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self) -> List[str]:
+        return list(self._nodes)
+
+    def add(self, node: str) -> None:
+        if node in self._nodes:
+            raise ValueError("%r is already on the ring" % node)
+        self._nodes.append(node)
+        self._place()
+
+    def remove(self, node: str) -> None:
+        self._nodes.remove(node)
+        self._place()
+
+    def _place(self) -> None:
+        points = sorted((ring_hash('%s#%d' % (node, i)), node) for node in self._nodes for i in range(self.replicas))
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, key: str) -> str:
+        """The node owning ``key``: the one with the first point after its hash, round the ring."""
+        if not self._points:
+            raise LookupError("the ring has no nodes")
+        return self._owners[bisect(self._points, ring_hash(key)) % len(self._points)]
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __contains__(self, node: object) -> bool:
+        return node in self._nodes
+
+
+def export_sessions(tenants: TenantRegistry, data: Dict) -> Dict:
+    """Remove and return the sessions this worker no longer owns once the ring is ``data['nodes']``.
+
+    ``data['keep']`` names this worker on that ring; without it every
+    session goes. Sessions are returned encoded, by tenant and user id.
+    Shared backends (SQLite) have nothing to hand over.
+    """
+    ring = HashRing(data.get('nodes', ()), data.get('replicas', REPLICAS))
+    keep = data.get('keep')
+    exported = {}
+    for tenant_id in tenants:
+        sessions = tenants.get(tenant_id).sessions
+        if not isinstance(sessions, SessionStore):
+            continue
+        sessions.expire()
+        moving = {}
+        for user_id in sessions:
+            if keep is None or ring.node_for(str(user_id)) != keep:
+                session = sessions.pop(user_id)
+                if session is not None:
+                    moving[user_id] = session.dumps()
+        if moving:
+            exported[tenant_id] = moving
+    return {'sessions': exported}
+
+
+def import_sessions(tenants: TenantRegistry, data: Dict) -> Dict:
+    """Take over sessions exported by another worker; returns how many were taken."""
+    imported = 0
+    for tenant_id, sessions in data.get('sessions', {}).items():
+        chatbot = tenants.get(tenant_id)
+        if chatbot is None:
+            log.warning("dropping %d handed over sessions of unknown tenant %s", len(sessions), tenant_id)
+            continue
+        for user_id, encoded in sessions.items():
+            chatbot.sessions.put(user_id, UserSession.loads(user_id, encoded))
+            imported += 1
+    return {'imported': imported}
+
+
+def is_router_request(token: Optional[str], headers: Iterable[Tuple[bytes, bytes]]) -> bool:
+    """Whether ``headers`` carry the router's ``token``; never true when no token is configured."""
+    if not token:
+        return False
+    sent = next((value for name, value in headers if name.lower() == TOKEN_HEADER), b'')
+    return hmac.compare_digest(sent, token.encode())
+
+
+class Response(NamedTuple):
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+
+class BadRequest(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def json_response(status: int, payload: Dict) -> Response:
+    return Response(status, [(b'content-type', b'application/json')], json.dumps(payload).encode())
+
+
+async def _read_head(reader: asyncio.StreamReader) -> Tuple[bytes, List[Tuple[bytes, bytes]]]:
+    """The start line and the headers of a request or response; an empty start line at EOF."""
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return b'', []
+        raise
+    except asyncio.LimitOverrunError:
+        raise BadRequest(431, 'headers too large') from None
+    start, *lines = head[:-4].split(b'\r\n')
+    if len(lines) > MAX_HEADERS:
+        raise BadRequest(431, 'too many headers')
+    headers = []
+    for line in lines:
+        name, _, value = line.partition(b':')
+        headers.append((name.strip().lower(), value.strip()))
+    return start, headers
+
+
+async def _read_body(reader: asyncio.StreamReader, headers: List[Tuple[bytes, bytes]]) -> bytes:
+    length = 0
+    for name, value in headers:
+        if name == b'content-length':
+            length = int(value)
+        elif name == b'transfer-encoding' and b'chunked' in value.lower():
+            body = b''
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                chunk = await reader.readexactly(size + 2)
+                if size == 0:
+                    # Trailers, if any, end with an empty line like the headers
+                    while chunk not in (b'\r\n', b'\n', b''):
+                        chunk = await reader.readline()
+                    return body
+                body += chunk[:-2]
+    return await reader.readexactly(length) if length else b''
+
+
+def _header(headers: List[Tuple[bytes, bytes]], name: bytes) -> bytes:
+    return next((value for key, value in headers if key == name), b'')
+
+
+def _encode(start: bytes, headers: List[Tuple[bytes, bytes]], body: bytes) -> bytes:
+    lines = [start]
+    lines.extend(name + b': ' + value for name, value in headers if name not in _DROPPED_HEADERS)
+    lines.append(b'content-length: %d' % len(body))
+    return b'\r\n'.join(lines) + b'\r\n\r\n' + body
+
+
+class HTTPWorker:
+    """A worker process listening on ``host:port``, reached over pooled keep-alive connections."""
+
+    def __init__(self, name: str, host: str, port: int, pool_size: int = 256):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.pool_size = pool_size
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    async def connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        return await asyncio.open_connection(self.host, self.port)
+
+    async def request(self, method: str, target: str, headers: List[Tuple[bytes, bytes]], body: bytes) -> Response:
+        request = _encode(b'%s %s HTTP/1.1' % (method.encode(), target.encode()), headers, body)
+        while True:
+            reused = bool(self._idle)
+            reader, writer = self._idle.pop() if reused else await self.connect()
+            try:
+                writer.write(request)
+                start, response_headers = await _read_head(reader)
+                if not start:
+                    raise ConnectionError('worker %s closed the connection' % self.name)
+                response_body = await _read_body(reader, response_headers)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                # A pooled connection the worker closed while idle; nothing was answered, so try afresh
+                if reused:
+                    continue
+                raise
+            if len(self._idle) < self.pool_size and _header(response_headers, b'connection').lower() != b'close':
+                self._idle.append((reader, writer))
+            else:
+                writer.close()
+            return Response(int(start.split()[1]), response_headers, response_body)
+
+    def close(self) -> None:
+        while self._idle:
+            self._idle.pop()[1].close()
+
+
+class ASGIWorker:
+    """A worker that is an ASGI app in this process, for routing without sockets in tests and benchmarks."""
+
+    def __init__(self, name: str, app):
+        self.name = name
+        self.app = app
+
+    async def connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        raise OSError("worker %s takes no sockets" % self.name)
+
+    async def request(self, method: str, target: str, headers: List[Tuple[bytes, bytes]], body: bytes) -> Response:
+        path, _, query = target.partition('?')
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        sent = []
+
+        async def receive():
+            return messages.pop() if messages else {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+        await self.app({'type': 'http', 'method': method, 'path': path, 'query_string': query.encode(),
+                        'headers': headers}, receive, send)
+        return Response(sent[0]['status'], list(sent[0].get('headers', ())),
+                        b''.join(message.get('body', b'') for message in sent[1:]))
+
+
+class Router:
+    """Sends each request to the worker owning its user on a ``HashRing`` of ``workers``.
+
+    Workers need ``name`` and ``request(method, target, headers, body)``
+    returning a ``Response``, plus ``connect()`` for WebSocket tunnels;
+    ``token`` is sent with the session handover requests.
+    """
+
+    def __init__(self, workers: Iterable, token: Optional[str] = None, replicas: int = REPLICAS):
+        self.workers: Dict[str, object] = {worker.name: worker for worker in workers}
+        if not self.workers:
+            raise ValueError("a router needs at least one worker")
+        self.ring = HashRing(self.workers, replicas)
+        self.token = token
+        self.moved = 0
+        self._turn = 0
+        self._inflight = 0
+        self._drained = asyncio.Event()
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+        self._changing = asyncio.Lock()
+        # user id -> upstream writers of the sockets tunnelled for that user
+        self._tunnels: Dict[str, List[asyncio.StreamWriter]] = {}
+
+    def owner(self, user_id: str):
+        return self.workers[self.ring.node_for(user_id)]
+
+    def _any(self):
+        self._turn += 1
+        workers = list(self.workers.values())
+        return workers[self._turn % len(workers)]
+
+    async def _enter(self) -> None:
+        while not self._resumed.is_set():
+            await self._resumed.wait()
+        self._inflight += 1
+
+    def _leave(self) -> None:
+        self._inflight -= 1
+        if not self._inflight:
+            self._drained.set()
+
+    @contextlib.asynccontextmanager
+    async def _paused(self):
+        """Hold new requests back and wait out the ones in flight."""
+        async with self._changing:
+            self._resumed.clear()
+            try:
+                while self._inflight:
+                    self._drained.clear()
+                    await self._drained.wait()
+                yield
+            finally:
+                self._resumed.set()
+
+    async def dispatch(self, method: str, target: str, headers: List[Tuple[bytes, bytes]], body: bytes) -> Response:
+        path = target.partition('?')[0]
+        if path in (EXPORT_PATH, IMPORT_PATH):
+            return json_response(404, {'error': 'not found'})
+        await self._enter()
+        try:
+            if method == 'POST' and path in STICKY_PATHS:
+                return await self._sticky(path, target, headers, body)
+            if method == 'POST' and path == BATCH_PATH:
+                return await self._batch(target, headers, body)
+            return await self._any().request(method, target, headers, body)
+        except (OSError, asyncio.IncompleteReadError) as e:
+            log.warning("forwarding %s %s failed: %s", method, path, e)
+            return json_response(502, {'error': 'worker unavailable'})
+        finally:
+            self._leave()
+
+    async def _sticky(self, path: str, target: str, headers: List[Tuple[bytes, bytes]], body: bytes) -> Response:
+        data = _json_object(body)
+        if data is None:
+            # The worker answers it as it would any bad request
+            return await self._any().request('POST', target, headers, body)
+        user_id = data.get('user_id')
+        if user_id is None and path == '/chat':
+            data['user_id'] = user_id = str(uuid.uuid4())
+            body = json.dumps(data).encode()
+        return await self.owner(str('' if user_id is None else user_id)).request('POST', target, headers, body)
+
+    async def _batch(self, target: str, headers: List[Tuple[bytes, bytes]], body: bytes) -> Response:
+        data = _json_object(body)
+        items = data.get('messages') if data is not None else None
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return await self._any().request('POST', target, headers, body)
+        # node -> positions of its messages in the batch
+        groups: Dict[str, List[int]] = {}
+        for i, item in enumerate(items):
+            if 'user_id' not in item:
+                item['user_id'] = str(uuid.uuid4())
+            groups.setdefault(self.ring.node_for(str(item['user_id'])), []).append(i)
+        if len(groups) <= 1:
+            worker = self.workers[next(iter(groups))] if groups else self._any()
+            return await worker.request('POST', target, headers, json.dumps(data).encode())
+
+        parts = await asyncio.gather(*(
+            self.workers[node].request('POST', target, headers, json.dumps(
+                dict(data, messages=[items[i] for i in positions])).encode())
+            for node, positions in groups.items()))
+        responses: List[Optional[Dict]] = [None] * len(items)
+        for positions, part in zip(groups.values(), parts):
+            if part.status != 200:
+                return part
+            for i, response in zip(positions, json.loads(part.body)['responses']):
+                responses[i] = response
+        return json_response(200, {'responses': responses})
+
+    async def add_worker(self, worker) -> int:
+        """Put ``worker`` on the ring and hand it the sessions of its users; returns how many moved."""
+        async with self._paused():
+            ring = HashRing(self.ring.nodes + [worker.name], self.ring.replicas)
+            moved = await self._rebalance(ring, dict(self.workers, **{worker.name: worker}))
+            self.workers[worker.name] = worker
+            self.ring = ring
+        return moved
+
+    async def remove_worker(self, name: str):
+        """Take ``name`` off the ring, handing its sessions to the other workers; returns the worker."""
+        async with self._paused():
+            if len(self.ring) == 1:
+                raise ValueError("cannot remove the last worker")
+            ring = HashRing([node for node in self.ring.nodes if node != name], self.ring.replicas)
+            await self._rebalance(ring, self.workers)
+            self.ring = ring
+            return self.workers.pop(name)
+
+    def replace_worker(self, worker) -> None:
+        """Serve ``worker.name``'s users from ``worker`` from now on, e.g. a restarted process."""
+        self.workers[worker.name] = worker
+
+    async def _rebalance(self, ring: HashRing, workers: Dict) -> int:
+        moving = [user_id for user_id in self._tunnels if ring.node_for(user_id) != self.ring.node_for(user_id)]
+        for user_id in moving:
+            for upstream in self._tunnels.pop(user_id):
+                upstream.close()
+
+        headers = self._internal_headers()
+        spec = {'nodes': ring.nodes, 'replicas': ring.replicas}
+        sources = self.ring.nodes
+        exports = await asyncio.gather(*(
+            workers[node].request('POST', EXPORT_PATH, headers, json.dumps(
+                dict(spec, keep=node if node in ring else None)).encode())
+            for node in sources), return_exceptions=True)
+        # new owner -> tenant id -> user id -> encoded session
+        handover: Dict[str, Dict[str, Dict[str, str]]] = {}
+        for node, export in zip(sources, exports):
+            if isinstance(export, BaseException) or export.status != 200:
+                log.warning("could not take sessions from worker %s: %s", node,
+                            export if isinstance(export, BaseException) else export.status)
+                continue
+            for tenant_id, sessions in json.loads(export.body)['sessions'].items():
+                for user_id, encoded in sessions.items():
+                    handover.setdefault(ring.node_for(user_id), {}).setdefault(tenant_id, {})[user_id] = encoded
+
+        moved = 0
+        imports = await asyncio.gather(*(
+            workers[node].request('POST', IMPORT_PATH, headers, json.dumps({'sessions': sessions}).encode())
+            for node, sessions in handover.items()), return_exceptions=True)
+        for node, result in zip(handover, imports):
+            if isinstance(result, BaseException) or result.status != 200:
+                log.warning("worker %s did not take its sessions: %s", node,
+                            result if isinstance(result, BaseException) else result.status)
+                continue
+            moved += json.loads(result.body)['imported']
+        self.moved += moved
+        return moved
+
+    def _internal_headers(self) -> List[Tuple[bytes, bytes]]:
+        headers = [(b'content-type', b'application/json')]
+        if self.token:
+            headers.append((TOKEN_HEADER, self.token.encode()))
+        return headers
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 5000) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self._connection, host, port, backlog=4096)
+
+    async def _connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        peer = writer.get_extra_info('peername')
+        peer = peer[0].encode() if peer else None
+        try:
+            while True:
+                try:
+                    start, headers = await _read_head(reader)
+                    if not start:
+                        return
+                    # Only the router itself may present the handover token
+                    headers = [header for header in headers if header[0] != TOKEN_HEADER]
+                    if peer is not None:
+                        # Workers see the router's address; their per-address limits go by this
+                        headers = _forwarded_for(headers, peer)
+                    method, target, version = start.decode('latin-1').split(' ', 2)
+                    if _header(headers, b'upgrade').lower() == b'websocket':
+                        await self._tunnel(target, headers, reader, writer)
+                        return
+                    if int(_header(headers, b'content-length') or 0) > MAX_BODY:
+                        raise BadRequest(413, 'request too large')
+                    body = await _read_body(reader, headers)
+                except (ValueError, UnicodeDecodeError):
+                    response, keep_alive = json_response(400, {'error': 'bad request'}), False
+                except BadRequest as e:
+                    response, keep_alive = json_response(e.status, {'error': str(e)}), False
+                else:
+                    keep_alive = version == 'HTTP/1.1' and _header(headers, b'connection').lower() != b'close'
+                    response = await self.dispatch(method, target, headers, body)
+                writer.write(_encode(b'HTTP/1.1 %d %s' % (response.status, _reason(response.status)),
+                                     response.headers + ([] if keep_alive else [(b'connection', b'close')]),
+                                     response.body))
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _tunnel(self, target: str, headers: List[Tuple[bytes, bytes]],
+                      reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Join the client's socket to the owner of its user, then copy bytes both ways until either closes."""
+        path, _, query = target.partition('?')
+        user_id = parse_qs(query).get('user_id', [''])[0]
+        if not user_id:
+            # Named here, so a reconnect with the id it is given finds the same worker
+            user_id = str(uuid.uuid4())
+            target = '%s?%s' % (path, '&'.join(filter(None, (query, 'user_id=' + quote(user_id)))))
+        await self._enter()
+        try:
+            upstream_reader, upstream = await self.owner(user_id).connect()
+        except OSError:
+            writer.write(b'HTTP/1.1 502 Bad Gateway\r\ncontent-length: 0\r\nconnection: close\r\n\r\n')
+            return
+        finally:
+            self._leave()
+        head = [b'GET %s HTTP/1.1' % target.encode()]
+        head.extend(name + b': ' + value for name, value in headers)
+        upstream.write(b'\r\n'.join(head) + b'\r\n\r\n')
+        self._tunnels.setdefault(user_id, []).append(upstream)
+        pipes = [asyncio.ensure_future(_pipe(reader, upstream)), asyncio.ensure_future(_pipe(upstream_reader, writer))]
+        try:
+            await asyncio.wait(pipes, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for pipe in pipes:
+                pipe.cancel()
+            upstream.close()
+            tunnels = self._tunnels.get(user_id)
+            if tunnels is not None and upstream in tunnels:
+                tunnels.remove(upstream)
+                if not tunnels:
+                    del self._tunnels[user_id]
+
+
+async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                return
+            writer.write(data)
+            await writer.drain()
+    except ConnectionError:
+        pass
+
+
+def _forwarded_for(headers: List[Tuple[bytes, bytes]], peer: bytes) -> List[Tuple[bytes, bytes]]:
+    forwarded = _header(headers, b'x-forwarded-for')
+    return [header for header in headers if header[0] != b'x-forwarded-for'] + [
+        (b'x-forwarded-for', forwarded + b', ' + peer if forwarded else peer)]
+
+
+def _json_object(body: bytes) -> Optional[Dict]:
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+_REASONS = {200: b'OK', 400: b'Bad Request', 404: b'Not Found', 405: b'Method Not Allowed',
+            413: b'Payload Too Large', 431: b'Request Header Fields Too Large', 502: b'Bad Gateway'}
+
+
+def _reason(status: int) -> bytes:
+    return _REASONS.get(status, b'Unknown')
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def worker_env(name: str, token: str, environ: Mapping[str, str] = os.environ) -> Dict[str, str]:
+    """The environment of worker ``name``: the router's, with the token, the worker's id and a snapshot of its own."""
+    env = dict(environ, **{TOKEN_ENV: token, WORKER_ID_ENV: name})
+    if env.get('CHATBOT_SNAPSHOT'):
+        root, ext = os.path.splitext(env['CHATBOT_SNAPSHOT'])
+        env['CHATBOT_SNAPSHOT'] = '%s-%s%s' % (root, name, ext)
+    return env
+
+
+class WorkerProcess:
+    """A worker started from ``command``, with ``{port}`` replaced by a free local port."""
+
+    def __init__(self, name: str, command: str, token: str):
+        self.name = name
+        self.port = free_port()
+        env = worker_env(name, token)
+        self.process = subprocess.Popen(shlex.split(command.format(port=self.port)), env=env)
+        self.worker = HTTPWorker(name, '127.0.0.1', self.port)
+
+    async def ready(self, timeout: float = 30.0) -> HTTPWorker:
+        """The worker once it accepts connections."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            if self.process.poll() is not None:
+                raise RuntimeError("worker %s exited with %d" % (self.name, self.process.returncode))
+            try:
+                _, writer = await asyncio.open_connection('127.0.0.1', self.port)
+                writer.close()
+                return self.worker
+            except OSError:
+                if loop.time() > deadline:
+                    raise RuntimeError("worker %s did not start listening" % self.name) from None
+                await asyncio.sleep(0.1)
+
+    def stop(self) -> None:
+        self.worker.close()
+        self.process.terminate()
+        self.process.wait()
+
+
+async def run(port: int, workers: int, command: str, host: str = '127.0.0.1') -> None:
+    token = secrets.token_hex(16)
+    names = iter('worker-%d' % i for i in range(1 << 30))
+    processes = [WorkerProcess(next(names), command, token) for _ in range(workers)]
+    try:
+        router = Router([await process.ready() for process in processes], token)
+        server = await router.serve(host, port)
+        log.info("routing %s:%d to %d workers", host, port, len(processes))
+
+        async def add() -> None:
+            process = WorkerProcess(next(names), command, token)
+            processes.append(process)
+            moved = await router.add_worker(await process.ready())
+            log.info("added %s, %d sessions moved to it", process.name, moved)
+
+        async def remove() -> None:
+            if len(processes) > 1:
+                process = processes.pop()
+                await router.remove_worker(process.name)
+                process.stop()
+                log.info("removed %s, %d sessions moved in all", process.name, router.moved)
+
+        loop = asyncio.get_running_loop()
+        stopping = loop.create_future()
+        loop.add_signal_handler(signal.SIGUSR1, lambda: asyncio.ensure_future(add()))
+        loop.add_signal_handler(signal.SIGUSR2, lambda: asyncio.ensure_future(remove()))
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, lambda: stopping.done() or stopping.set_result(None))
+        while not stopping.done():
+            await asyncio.wait([stopping], timeout=1.0)
+            for i, process in enumerate(processes):
+                if process.process.poll() is not None:
+                    log.warning("worker %s exited with %d; restarting it", process.name, process.process.returncode)
+                    process.worker.close()
+                    processes[i] = WorkerProcess(process.name, command, token)
+                    router.replace_worker(await processes[i].ready())
+        server.close()
+        await server.wait_closed()
+    finally:
+        for process in processes:
+            process.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--worker-command', default=os.environ.get('CHATBOT_WORKER_COMMAND', DEFAULT_WORKER_COMMAND),
+                        help='command starting one worker; {port} is replaced by its port')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    asyncio.run(run(args.port, args.workers, args.worker_command, args.host))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,433 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Generic, Iterator, List, Optional, Tuple, TypeVar
+
+log = logging.getLogger(__name__)
+
+S = TypeVar('S')
+
+class LockStripes:
+    """A fixed table of locks shared out by hashed key.
+
+    Turns for the same user always take the same lock, so they run one at
+    a time, while other users almost always land on a different stripe and
+    proceed in parallel. There is no global lock and no per-user lock to
+    create or clean up.
+    """
+
+    def __init__(self, stripes: int = 256):
+        if stripes < 1:
+            raise ValueError("stripes must be at least 1")
+        self._locks = tuple(threading.Lock() for _ in range(stripes))
+
+    def for_key(self, key: str) -> threading.Lock:
+        return self._locks[hash(key) % len(self._locks)]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+class SessionBackend(Generic[S]):
+    """Where the chatbot keeps its sessions.
+
+    ``get_or_create`` hands out a session and ``save`` is called once the
+    turn has changed it. Backends that hand out live objects (the in-memory
+    store) can ignore ``save``; backends shared between processes persist
+    the session there.
+    """
+
+    def get_or_create(self, user_id: str) -> S:
+        raise NotImplementedError
+
+    def save(self, user_id: str, session: S) -> None:
+        pass
+
+    def flush(self) -> None:
+        """Push any buffered writes to the backing store."""
+
+    def close(self) -> None:
+        self.flush()
+
+    def put(self, user_id: str, session: S) -> None:
+        """Make ``session`` the session of ``user_id``, replacing any other."""
+        raise NotImplementedError
+
+    def pop(self, user_id: str, default: Optional[S] = None) -> Optional[S]:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, int]:
+        return {}
+
+    def __delitem__(self, user_id: str) -> None:
+        if self.pop(user_id) is None:
+            raise KeyError(user_id)
+
+    def __contains__(self, user_id: object) -> bool:
+        raise NotImplementedError
+
+class SessionStore(SessionBackend[S]):
+    """Bounded session table with an idle TTL and LRU eviction.
+
+    Entries are kept in least-recently-used order, which is also the order
+    in which they go idle, so expired sessions are always at the front.
+    Each access drops at most a few of them, keeping expiry amortized O(1)
+    without scanning the table. When the table is full the least recently
+    used session is evicted.
+    """
+
+    # Expired entries dropped per access; above 1 so expiry outpaces creation
+    EXPIRE_BATCH = 2
+
+    def __init__(self, factory: Callable[[str], S], max_sessions: int = 100000,
+                 ttl: Optional[float] = 1800.0, clock: Callable[[], float] = time.monotonic):
+        if max_sessions < 1:
+            raise ValueError("max_sessions must be at least 1")
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.clock = clock
+        # user_id -> [session, last_seen]
+        self._entries: 'OrderedDict[str, List]' = OrderedDict()
+        # Sessions restored from a snapshot and not used since; all older than any entry
+        self._cold = None
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_or_create(self, user_id: str) -> S:
+        """Return the live session for ``user_id``, creating it if needed."""
+        now = self.clock()
+        with self._lock:
+            self._expire(now, self.EXPIRE_BATCH)
+            entry = self._entries.get(user_id)
+            if entry is not None and self.ttl is not None and entry[1] <= now - self.ttl:
+                del self._entries[user_id]
+                self.expirations += 1
+                entry = None
+            if entry is not None:
+                entry[1] = now
+                self._entries.move_to_end(user_id)
+                return entry[0]
+
+            restored = self._cold.pop(user_id) if self._cold is not None else None
+            if len(self) >= self.max_sessions:
+                self._evict()
+            if restored is not None and (self.ttl is None or restored[1] > now - self.ttl):
+                session = restored[0]
+            else:
+                if restored is not None:
+                    self.expirations += 1
+                session = self.factory(user_id)
+                self.created += 1
+            self._entries[user_id] = [session, now]
+            return session
+
+    def _evict(self) -> None:
+        cold = self._cold
+        oldest = cold.oldest() if cold is not None else None
+        if oldest is not None:
+            cold.discard(oldest[0])
+        else:
+            self._entries.popitem(last=False)
+        self.evictions += 1
+
+    def _expire(self, now: float, limit: Optional[int] = None) -> int:
+        if self.ttl is None:
+            return 0
+        deadline = now - self.ttl
+        entries = self._entries
+        removed = 0
+        cold = self._cold
+        while cold is not None and (limit is None or removed < limit):
+            oldest = cold.oldest()
+            if oldest is None or oldest[1] > deadline:
+                break
+            cold.discard(oldest[0])
+            removed += 1
+        while entries and (limit is None or removed < limit):
+            user_id, entry = next(iter(entries.items()))
+            if entry[1] > deadline:
+                break
+            del entries[user_id]
+            removed += 1
+        self.expirations += removed
+        return removed
+
+    def expire(self) -> int:
+        """Drop every expired session; returns how many were removed."""
+        with self._lock:
+            return self._expire(self.clock())
+
+    def restore(self, cold) -> int:
+        """Hold the sessions of a restored snapshot until their users come back.
+
+        ``cold`` is a ``snapshot.ColdSessions``; sessions already in the
+        table win over restored ones. Returns how many sessions it holds.
+        """
+        with self._lock:
+            for user_id in self._entries:
+                cold.discard(user_id)
+            self._cold = cold
+            while len(self) > self.max_sessions:
+                self._evict()
+            return len(cold)
+
+    def snapshot_entries(self) -> Tuple[float, List[Tuple[str, List]], object, Optional[bytes]]:
+        """The clock reading, a copy of the live entries and the restored sessions not used since.
+
+        Everything is least recently used first and copied while the lock is
+        held, so it is one consistent table.
+        """
+        with self._lock:
+            return self._snapshot_entries()
+
+    def _snapshot_entries(self) -> Tuple[float, List[Tuple[str, List]], object, Optional[bytes]]:
+        cold = self._cold
+        return self.clock(), list(self._entries.items()), cold, cold.held() if cold is not None else None
+
+    def fork(self) -> int:
+        """``os.fork()`` while the table is unchanging, so the child gets a consistent copy-on-write image.
+
+        The child inherits the table lock held and must not take it; it can
+        read the table through ``_snapshot_entries``.
+        """
+        with self._lock:
+            return os.fork()
+
+    def put(self, user_id: str, session: S) -> None:
+        """Hold ``session`` for ``user_id`` as just used, e.g. one handed over by another process."""
+        with self._lock:
+            if self._cold is not None:
+                self._cold.discard(user_id)
+            if self._entries.pop(user_id, None) is None and len(self) >= self.max_sessions:
+                self._evict()
+            self._entries[user_id] = [session, self.clock()]
+
+    def pop(self, user_id: str, default: Optional[S] = None) -> Optional[S]:
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+            if entry is None and self._cold is not None:
+                entry = self._cold.pop(user_id)
+        return default if entry is None else entry[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._cold = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'live_sessions': len(self),
+            'restored_unused': len(self._cold) if self._cold is not None else 0,
+            'created': self.created,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+    def __getitem__(self, user_id: str) -> S:
+        entry = self._entries.get(user_id)
+        if entry is None and self._cold is not None:
+            with self._lock:
+                restored = self._cold.pop(user_id)
+                if restored is not None:
+                    # Held like any other entry from now on, still the least recently used
+                    entry = self._entries[user_id] = list(restored)
+                    self._entries.move_to_end(user_id, last=False)
+        if entry is None:
+            raise KeyError(user_id)
+        return entry[0]
+
+    def __delitem__(self, user_id: str) -> None:
+        with self._lock:
+            if self._cold is not None and user_id in self._cold and user_id not in self._entries:
+                self._cold.discard(user_id)
+            else:
+                del self._entries[user_id]
+
+    def __contains__(self, user_id: object) -> bool:
+        return user_id in self._entries or (self._cold is not None and user_id in self._cold)
+
+    def __len__(self) -> int:
+        return len(self._entries) + (len(self._cold) if self._cold is not None else 0)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            restored = list(self._cold) if self._cold is not None else []
+            return iter(restored + list(self._entries))
+
+class SQLiteSessionStore(SessionBackend[S]):
+    """Sessions in a SQLite database in WAL mode, shared by worker processes.
+
+    Sessions are encoded with ``dump`` and rebuilt with ``load(user_id,
+    data)``. Saves go to a write-behind buffer that a background thread
+    flushes every ``flush_interval`` seconds in one transaction (sooner once
+    ``batch_size`` sessions are pending), so a turn costs a dict write rather
+    than a commit. Another worker sees a turn at most ``flush_interval``
+    later, well inside the time a person takes to type the next reply.
+    The same thread deletes sessions idle past the TTL every
+    ``expire_interval`` seconds, so the table holds only live ones. A
+    flush that cannot get the write lock within ``busy_timeout`` seconds
+    keeps its sessions for the next one.
+    """
+
+    def __init__(self, path: str, factory: Callable[[str], S], dump: Callable[[S], str],
+                 load: Callable[[str, str], S], ttl: Optional[float] = 1800.0,
+                 flush_interval: float = 0.05, batch_size: int = 256, expire_interval: float = 60.0,
+                 busy_timeout: float = 5.0, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.factory = factory
+        self.dump = dump
+        self.load = load
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.expire_interval = expire_interval
+        self.clock = clock
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA busy_timeout=%d' % (busy_timeout * 1000))
+        self._conn.execute('CREATE TABLE IF NOT EXISTS sessions ('
+                           'user_id TEXT PRIMARY KEY, data TEXT NOT NULL, last_seen REAL NOT NULL)')
+        # For expiry and the live count, which look only at last_seen
+        self._conn.execute('CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions (last_seen)')
+        self._lock = threading.Lock()
+        # user_id -> (data, last_seen) waiting to be written
+        self._pending: Dict[str, Tuple[str, float]] = {}
+        self._closed = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self.created = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.expirations = 0
+
+    def get_or_create(self, user_id: str) -> S:
+        now = self.clock()
+        with self._lock:
+            entry = self._pending.get(user_id)
+            if entry is None:
+                entry = self._conn.execute(
+                    'SELECT data, last_seen FROM sessions WHERE user_id = ?', (user_id,)).fetchone()
+        if entry is not None and (self.ttl is None or entry[1] > now - self.ttl):
+            return self.load(user_id, entry[0])
+        self.created += 1
+        return self.factory(user_id)
+
+    def save(self, user_id: str, session: S) -> None:
+        data = self.dump(session)
+        with self._lock:
+            self._pending[user_id] = (data, self.clock())
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+        elif self._flusher is None:
+            self._start_flusher()
+
+    def put(self, user_id: str, session: S) -> None:
+        self.save(user_id, session)
+
+    def _start_flusher(self) -> None:
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name='session-flush', daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        next_expiry = time.monotonic() + self.expire_interval
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                log.warning("session flush failed, retrying: %s", e)
+            if time.monotonic() >= next_expiry:
+                next_expiry = time.monotonic() + self.expire_interval
+                try:
+                    self.expire()
+                except sqlite3.Error as e:
+                    # Another worker holding the write lock past the busy timeout; try next time
+                    log.warning("session expiry failed: %s", e)
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._pending:
+                return
+            rows = [(user_id, data, last_seen) for user_id, (data, last_seen) in self._pending.items()]
+            pending, self._pending = self._pending, {}
+            try:
+                self._conn.execute('BEGIN IMMEDIATE')
+                try:
+                    self._conn.executemany(
+                        'INSERT OR REPLACE INTO sessions (user_id, data, last_seen) VALUES (?, ?, ?)', rows)
+                    self._conn.execute('COMMIT')
+                except BaseException:
+                    if self._conn.in_transaction:
+                        self._conn.execute('ROLLBACK')
+                    raise
+            except BaseException:
+                # Unwritten sessions wait for the next flush; any saved since are newer
+                pending.update(self._pending)
+                self._pending = pending
+                raise
+            self.flushes += 1
+            self.rows_written += len(rows)
+
+    def expire(self) -> int:
+        """Delete sessions idle for longer than the TTL; returns how many."""
+        if self.ttl is None:
+            return 0
+        self.flush()
+        with self._lock:
+            expired = self._conn.execute(
+                'DELETE FROM sessions WHERE last_seen <= ?', (self.clock() - self.ttl,)).rowcount
+        self.expirations += expired
+        return expired
+
+    def pop(self, user_id: str, default: Optional[S] = None) -> Optional[S]:
+        with self._lock:
+            entry = self._pending.pop(user_id, None)
+            row = self._conn.execute(
+                'SELECT data FROM sessions WHERE user_id = ?', (user_id,)).fetchone()
+            if row is not None:
+                self._conn.execute('DELETE FROM sessions WHERE user_id = ?', (user_id,))
+        data = entry[0] if entry is not None else row[0] if row is not None else None
+        return default if data is None else self.load(user_id, data)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self._conn.execute('DELETE FROM sessions')
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+        self._conn.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'live_sessions': len(self),
+            'created': self.created,
+            'pending_writes': len(self._pending),
+            'flushes': self.flushes,
+            'rows_written': self.rows_written,
+            'expirations': self.expirations,
+        }
+
+    def __contains__(self, user_id: object) -> bool:
+        with self._lock:
+            if user_id in self._pending:
+                return True
+            row = self._conn.execute('SELECT last_seen FROM sessions WHERE user_id = ?', (user_id,)).fetchone()
+        return row is not None and (self.ttl is None or row[0] > self.clock() - self.ttl)
+
+    def __len__(self) -> int:
+        """Sessions seen within the TTL, as of the last flush."""
+        cutoff = float('-inf') if self.ttl is None else self.clock() - self.ttl
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM sessions WHERE last_seen > ?', (cutoff,)).fetchone()[0]
@@ -0,0 +1,399 @@
+"""Snapshots of the in-memory session table, restored through mmap at startup.
+
+A snapshot file is a fixed header followed by fixed-width columns, one
+entry per session (or per turn of the sessions' transcripts), in order
+of user id:
+
+    header   magic, format version, schema checksum, time written,
+             session count, turn count, section sizes, CRC32 of
+             everything after it
+    order    uint32   entry numbers, least recently used session first
+    idle     float32  seconds since the session was last seen
+    turns    uint32   where each entry's turns start, one more than the
+                      entries so the last ends the table
+    texts    uint32   where each turn's text starts in the text section,
+                      one more than the turns
+    replies  uint16   each turn's reply, an index into the slot names
+    state    uint8    state code
+    flags    uint8    packed yes/no answers
+    lang     uint8    language code
+    extra    uint8    1 if the session has an entry in the extras section
+    ids      the user ids, UTF-8, NUL separated
+    slots    the reply slot names the turns refer to, NUL separated
+    text     the turns' texts, UTF-8, back to back
+    extras   JSON object of entry number -> extra data (such as a
+             session's answers), for the sessions that carry any
+
+Restoring maps the file, checks it and splits the ids into a sorted
+list; nothing else is built. A user coming back is found by bisection
+and their session made from the mapped columns, turns included, so a
+million sessions restore in about the time it takes to split their ids
+however many turns they keep.
+
+Snapshots are written to a temporary file, fsynced and renamed over the
+previous one, so a crash part way through leaves the last complete
+snapshot in place. A file that is cut short or damaged fails its size or
+CRC check and is not restored.
+"""
+
+import gc
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+from operator import itemgetter
+from typing import Callable, Dict, Generic, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+S = TypeVar('S')
+
+MAGIC = b'CHATSNAP'
+VERSION = 2
+# magic, version, schema crc32, written at (wall clock), count, turns,
+# ids bytes, slots bytes, text bytes, extras bytes, body crc32
+HEADER = struct.Struct('<8sHIdQQQQQQI')
+# order (uint32) + idle (float32) + turns (uint32) + state, flags, lang, extra (uint8 each)
+RECORD_SIZE = 16
+# texts (uint32) + replies (uint16)
+TURN_SIZE = 6
+# Reply of a turn that got none
+NO_SLOT = 0xFFFF
+
+# (text, reply slot name) of one turn
+Turn = Tuple[str, Optional[str]]
+# (state, flags, lang, extra, turns) of one session
+Packed = Tuple[int, int, int, Optional[str], Optional[Sequence[Turn]]]
+# (user_id, idle seconds, state, flags, lang, extra, turns)
+Row = Tuple[str, float, int, int, int, Optional[str], Optional[Sequence[Turn]]]
+Unpack = Callable[[str, int, int, int, Optional[str], Optional[List[Turn]]], S]
+
+log = logging.getLogger(__name__)
+
+
+class SnapshotError(ValueError):
+    """A snapshot file that cannot be restored."""
+
+
+def schema_checksum(schema: str) -> int:
+    return zlib.crc32(schema.encode('utf-8'))
+
+
+def write_snapshot(path: str, rows: Sequence[Row], schema: str = '', written_at: Optional[float] = None) -> int:
+    """Atomically replace ``path`` with a snapshot of ``rows``, least recently used first.
+
+    Returns how many sessions were written; user ids containing NUL cannot
+    be stored and are skipped.
+    """
+    if '\0' in ''.join(row[0] for row in rows):
+        rows = [row for row in rows if '\0' not in row[0]]
+    count = len(rows)
+    columns = list(zip(*rows)) if rows else [()] * 7
+    # Entries go in id order; by_id[k] is the least-recently-used rank of the k-th id
+    by_id = sorted(range(count), key=columns[0].__getitem__)
+    if count:
+        take = itemgetter(*by_id)
+        columns = [take(column) if count > 1 else (column[0],) for column in columns]
+    ids, idle, state, flags, lang, extra, turns = columns
+    order = array('I', bytes(4 * count))
+    for sorted_at, rank in enumerate(by_id):
+        order[rank] = sorted_at
+    extras = {}
+    if extra.count(None) != count:
+        extras = {str(i): value for i, value in enumerate(extra) if value is not None}
+    turn_starts = array('I', [0])
+    texts: List[str] = []
+    replies = array('H')
+    slots: Dict[str, int] = {}
+    for session_turns in turns:
+        if session_turns:
+            for text, slot in session_turns:
+                texts.append(text)
+                replies.append(NO_SLOT if slot is None else slots.setdefault(slot, len(slots)))
+        turn_starts.append(len(texts))
+    # Texts are kept as the user sent them, lone surrogates included
+    encoded = [text.encode('utf-8', 'surrogatepass') for text in texts]
+    text_starts = array('I', accumulate(map(len, encoded), initial=0))
+    ids_data = '\0'.join(ids).encode('utf-8')
+    slots_data = '\0'.join(slots).encode('utf-8')
+    text_data = b''.join(encoded)
+    extras_data = json.dumps(extras, ensure_ascii=False).encode('utf-8')
+    body = [
+        order.tobytes(),
+        array('f', idle).tobytes(),
+        turn_starts.tobytes(),
+        text_starts.tobytes(),
+        replies.tobytes(),
+        bytes(state),
+        bytes(flags),
+        bytes(lang),
+        bytes(value is not None for value in extra) if extras else bytes(count),
+        ids_data,
+        slots_data,
+        text_data,
+        extras_data,
+    ]
+    crc = 0
+    for part in body:
+        crc = zlib.crc32(part, crc)
+    header = HEADER.pack(MAGIC, VERSION, schema_checksum(schema), time.time() if written_at is None else written_at,
+                         count, len(texts), len(ids_data), len(slots_data), len(text_data), len(extras_data), crc)
+
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(header)
+        for part in body:
+            f.write(part)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return count
+
+
+def read_header(path: str) -> Tuple:
+    """The header fields of the snapshot at ``path``."""
+    with open(path, 'rb') as f:
+        data = f.read(HEADER.size)
+    if len(data) < HEADER.size:
+        raise SnapshotError('%s is too short for a snapshot header' % path)
+    return HEADER.unpack(data)
+
+
+class ColdSessions(Generic[S]):
+    """Sessions of a snapshot that have not been asked for since the restore.
+
+    ``pop`` builds the session of one user from the mapped columns and
+    forgets it; the owner then holds it like any other. Ages are moved on
+    by the time between writing the snapshot and restoring it. Turns stay
+    in the mapped file until their session is popped.
+    """
+
+    def __init__(self, path: str, unpack: Unpack, schema: str = '',
+                 clock: Callable[[], float] = time.monotonic):
+        self.path = path
+        self.unpack = unpack
+        with open(path, 'rb') as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise SnapshotError('%s is empty' % path) from None
+        # On failure the map is left to the garbage collector with the views into it
+        self._load(schema, clock)
+
+    def _load(self, schema: str, clock: Callable[[], float]) -> None:
+        data = memoryview(self._map)
+        if len(data) < HEADER.size:
+            raise SnapshotError('%s is too short for a snapshot header' % self.path)
+        (magic, version, schema_crc, written_at, count, turns, ids_size, slots_size, text_size, extras_size,
+         crc) = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise SnapshotError('%s is not a session snapshot' % self.path)
+        if version != VERSION:
+            raise SnapshotError('%s has snapshot format %d, expected %d' % (self.path, version, VERSION))
+        if schema_crc != schema_checksum(schema):
+            raise SnapshotError('%s was written for a different conversation flow' % self.path)
+        body = data[HEADER.size:]
+        # The two start columns each end with one more entry
+        size = count * RECORD_SIZE + turns * TURN_SIZE + 8 + ids_size + slots_size + text_size + extras_size
+        if len(body) != size:
+            raise SnapshotError('%s is %d bytes, expected %d' % (self.path, len(data), HEADER.size + size))
+        if zlib.crc32(body) != crc:
+            raise SnapshotError('%s failed its checksum' % self.path)
+
+        self._order = body[:4 * count].cast('I')
+        self._idle = body[4 * count:8 * count].cast('f')
+        offset = 8 * count
+        self._turns = body[offset:offset + 4 * (count + 1)].cast('I')
+        offset += 4 * (count + 1)
+        self._text_starts = body[offset:offset + 4 * (turns + 1)].cast('I')
+        offset += 4 * (turns + 1)
+        self._replies = body[offset:offset + 2 * turns].cast('H')
+        offset += 2 * turns
+        self._state, self._flags, self._lang, self._extra = (
+            body[offset + i * count:offset + (i + 1) * count] for i in range(4))
+        offset += 4 * count
+        try:
+            ids = str(body[offset:offset + ids_size], 'utf-8').split('\0') if count else []
+            offset += ids_size
+            self._slots = str(body[offset:offset + slots_size], 'utf-8').split('\0') if slots_size else []
+            offset += slots_size
+            self._text = body[offset:offset + text_size]
+            self._extras: Dict[str, str] = json.loads(str(body[offset + text_size:], 'utf-8'))
+        except ValueError as e:
+            raise SnapshotError('%s has unreadable user ids or extras: %s' % (self.path, e)) from None
+        if len(ids) != count:
+            raise SnapshotError('%s holds %d user ids for %d sessions' % (self.path, len(ids), count))
+        self._ids: List[str] = ids
+        # 1 for every entry not yet popped or discarded
+        self._held = bytearray(b'\x01') * count
+        self._count = count
+        self._cursor = 0
+        # Idle times count from the restore, plus however long the process was down
+        self._base = clock() - max(0.0, time.time() - written_at)
+
+    def _find(self, user_id: str) -> Optional[int]:
+        i = bisect_left(self._ids, user_id)
+        if i < len(self._ids) and self._held[i] and self._ids[i] == user_id:
+            return i
+        return None
+
+    def _last_seen(self, i: int) -> float:
+        return self._base - self._idle[i]
+
+    def _session_turns(self, i: int) -> Optional[List[Turn]]:
+        """Entry ``i``'s turns, decoded from the mapped sections."""
+        start, end = self._turns[i], self._turns[i + 1]
+        if start == end:
+            return None
+        text, starts, replies, slots = self._text, self._text_starts, self._replies, self._slots
+        return [(str(text[starts[t]:starts[t + 1]], 'utf-8', 'surrogatepass'),
+                 None if replies[t] == NO_SLOT else slots[replies[t]]) for t in range(start, end)]
+
+    def pop(self, user_id: str) -> Optional[Tuple[S, float]]:
+        """The session of ``user_id`` and when it was last seen, or None."""
+        i = self._find(user_id)
+        if i is None:
+            return None
+        self._held[i] = 0
+        self._count -= 1
+        extra = self._extras.get(str(i)) if self._extra[i] else None
+        session = self.unpack(user_id, self._state[i], self._flags[i], self._lang[i], extra, self._session_turns(i))
+        return session, self._last_seen(i)
+
+    def discard(self, user_id: str) -> None:
+        i = self._find(user_id)
+        if i is not None:
+            self._held[i] = 0
+            self._count -= 1
+
+    def oldest(self) -> Optional[Tuple[str, float]]:
+        """The least recently used user id still held and when it was last seen."""
+        order, held = self._order, self._held
+        while self._cursor < len(order):
+            i = order[self._cursor]
+            if held[i]:
+                return self._ids[i], self._last_seen(i)
+            self._cursor += 1
+        return None
+
+    def held(self) -> bytes:
+        """Which entries are still held, for ``rows``."""
+        return bytes(self._held)
+
+    def rows(self, now: float, held: Optional[bytes] = None) -> Iterator[Row]:
+        """Rows for a new snapshot taken at clock time ``now``, straight from the columns."""
+        held = self._held if held is None else held
+        for i in self._order:
+            if held[i]:
+                extra = self._extras.get(str(i)) if self._extra[i] else None
+                yield (self._ids[i], now - self._last_seen(i), self._state[i], self._flags[i], self._lang[i],
+                       extra, self._session_turns(i))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, user_id: object) -> bool:
+        return isinstance(user_id, str) and self._find(user_id) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        held, ids = self._held, self._ids
+        return iter([ids[i] for i in self._order if held[i]])
+
+
+class SessionSnapshotter(Generic[S]):
+    """Periodically snapshots a ``SessionStore`` and restores it at startup.
+
+    Where ``os.fork`` exists a snapshot is written by a child process,
+    which sees the table as it was at the fork; the store's lock is held
+    only for the fork itself. Elsewhere the lock is held to copy the entry
+    list and the snapshot thread writes the file.
+    """
+
+    def __init__(self, store, path: str, pack: Callable[[S], Packed], unpack: Unpack, schema: str = '',
+                 interval: float = 60.0, fork: bool = hasattr(os, 'fork')):
+        self.store = store
+        self.path = path
+        self.pack = pack
+        self.unpack = unpack
+        self.schema = schema
+        self.interval = interval
+        self.fork = fork
+        self._closed = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._write_lock = threading.Lock()
+        self.snapshots = 0
+        self.last_count = 0
+        self.last_seconds = 0.0
+
+    def restore(self) -> int:
+        """Load the snapshot at ``path`` into the store; returns how many sessions it holds.
+
+        A missing file restores nothing; one that fails its checks raises
+        ``SnapshotError``.
+        """
+        if not os.path.exists(self.path):
+            return 0
+        cold: ColdSessions[S] = ColdSessions(self.path, self.unpack, self.schema, self.store.clock)
+        return self.store.restore(cold)
+
+    def save(self) -> int:
+        """Write a snapshot now; returns how many sessions it holds."""
+        with self._write_lock:
+            start = time.perf_counter()
+            if self.fork:
+                self.last_count = self._save_in_child()
+            else:
+                self.last_count = self._write(self.store.snapshot_entries())
+            self.last_seconds = time.perf_counter() - start
+            self.snapshots += 1
+            return self.last_count
+
+    def _write(self, entries) -> int:
+        now, hot, cold, cold_held = entries
+        pack = self.pack
+        rows: List[Row] = list(cold.rows(now, cold_held)) if cold is not None else []
+        rows += [(user_id, now - last_seen) + pack(session) for user_id, (session, last_seen) in hot]
+        return write_snapshot(self.path, rows, self.schema)
+
+    def _save_in_child(self) -> int:
+        # Copying a million entries under the table lock would stall every
+        # request for a good part of a second; a fork holds it for milliseconds
+        pid = self.store.fork()
+        if pid == 0:
+            status = 1
+            try:
+                # Collecting would touch every object and copy the whole heap
+                gc.disable()
+                self._write(self.store._snapshot_entries())
+                status = 0
+            finally:
+                os._exit(status)
+        _, status = os.waitpid(pid, 0)
+        if status != 0:
+            raise OSError('snapshot process for %s exited with status %d' % (self.path, status))
+        return read_header(self.path)[4]
+
+    def start(self) -> None:
+        """Snapshot every ``interval`` seconds on a background thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='session-snapshot', daemon=True)
+            self._thread.start()
+
+    def _loop(self) -> None:
+        while not self._closed.wait(self.interval):
+            try:
+                self.save()
+            except OSError:
+                log.exception('session snapshot to %s failed', self.path)
+
+    def close(self) -> None:
+        """Stop the snapshot thread and write a final snapshot."""
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.save()
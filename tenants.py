@@ -0,0 +1,274 @@
+"""Several colleges served by one process, each from its own data file.
+
+A tenant is a ``<tenant id>.json`` file in the tenants directory holding
+only what differs from the built-in content, for example:
+
+    {
+      "messages": {
+        "fee_structure": {"en": "...", "hi": "..."},
+        "total_seats": {"en": "...", "hi": "..."}
+      },
+      "clarifications": {"fee_structure": {"en": "...", "hi": "..."}},
+      "flow": {
+        "fee_structure": {"on_yes": "college_location", "yes_reply": "college_location",
+                          "on_no": "end", "no_reply": "end", "clarify": "fee_structure"}
+      }
+    }
+
+Whatever a tenant leaves out is the built-in content's own object, and
+loaded strings are interned. A message a tenant gives replaces the
+built-in one in every language; languages it leaves out show its English
+text. Tenants with equal flows share one compiled
+graph, so a college costs little more than its own texts, FAQ index and
+session table. ``default.json``, if present, replaces the content of the
+default chatbot.
+
+The directory is polled for changes. A changed file is loaded in full and
+then swapped in with one assignment, so conversations under way carry on
+with the new texts, and a file with a mistake leaves the old content
+serving.
+"""
+
+import atexit
+import json
+import logging
+import os
+import sys
+import threading
+from types import MappingProxyType
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from chatbot import DEFAULT_CONTENT, Content, ConversationState, NursingCollegeChatbot, Transition
+from reply_cache import ReplyCache
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TENANT = 'default'
+SECTIONS = ('messages', 'clarifications', 'flow')
+_STEP_FIELDS = frozenset(Transition._fields)
+# The yes/no answers a session records, the only things a step's flag may name
+SESSION_FLAGS = ('biology_studied', 'admission_interested')
+
+
+def _texts(by_lang: object, base: Optional[Mapping[str, str]], where: str) -> Mapping[str, str]:
+    """Texts by language replacing ``base``; ``base`` itself if they are the same.
+
+    Languages left out fall back to English rather than to the built-in
+    text, which would describe another college.
+    """
+    if not isinstance(by_lang, dict) or not all(isinstance(text, str) for text in by_lang.values()):
+        raise ValueError("%s must map languages to texts" % where)
+    if 'en' not in by_lang:
+        raise ValueError("%s has no 'en' text" % where)
+    if base is not None and by_lang == base:
+        return base
+    # The built-in string object if a text is unchanged, else one interned copy for every tenant
+    return MappingProxyType({
+        sys.intern(lang): base[lang] if base and base.get(lang) == text else sys.intern(text)
+        for lang, text in by_lang.items()
+    })
+
+
+def _section(data: Mapping[str, object], name: str, base: Mapping[str, Mapping[str, str]]
+             ) -> Mapping[str, Mapping[str, str]]:
+    entries = data.get(name, {})
+    if not isinstance(entries, dict):
+        raise ValueError("%r must be an object" % name)
+    if not entries:
+        return base
+    merged = dict(base)
+    for key, by_lang in entries.items():
+        merged[sys.intern(key)] = _texts(by_lang, base.get(key), '%s.%s' % (name, key))
+    return MappingProxyType(merged)
+
+
+def _state(name: object, where: str) -> ConversationState:
+    try:
+        return ConversationState(name)
+    except ValueError:
+        raise ValueError("%s: unknown state %r" % (where, name)) from None
+
+
+def _transition(step: object, where: str) -> Transition:
+    if not isinstance(step, dict) or not {'on_yes', 'yes_reply', 'on_no', 'no_reply'} <= set(step):
+        raise ValueError("%s needs on_yes, yes_reply, on_no and no_reply" % where)
+    unknown = set(step) - _STEP_FIELDS
+    if unknown:
+        raise ValueError("%s: unknown fields %s" % (where, ', '.join(sorted(unknown))))
+    clarify = step.get('clarify')
+    for field, key in (('yes_reply', step['yes_reply']), ('no_reply', step['no_reply']), ('clarify', clarify)):
+        if not isinstance(key, str) and not (field == 'clarify' and key is None):
+            raise ValueError("%s: %s must be a message key" % (where, field))
+    flag = step.get('flag')
+    if flag is not None and flag not in SESSION_FLAGS:
+        raise ValueError("%s: unknown session flag %r" % (where, flag))
+    return Transition(_state(step['on_yes'], where), step['yes_reply'], _state(step['on_no'], where),
+                      step['no_reply'], clarify, flag)
+
+
+def load_content(data: Mapping[str, object], base: Content = DEFAULT_CONTENT) -> Content:
+    """The content of one tenant file's ``data``, laid over ``base``.
+
+    Raises ValueError for anything the chatbot could not serve.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("a tenant file must hold a JSON object")
+    unknown = set(data) - set(SECTIONS)
+    if unknown:
+        raise ValueError("unknown sections %s" % ', '.join(sorted(unknown)))
+    steps = data.get('flow', {})
+    if not isinstance(steps, dict):
+        raise ValueError("'flow' must be an object")
+    flow = dict(base.flow)
+    for name, step in steps.items():
+        flow[_state(name, 'flow')] = _transition(step, 'flow.%s' % name)
+    return Content(
+        base.flow if flow == dict(base.flow) else MappingProxyType(flow),
+        _section(data, 'messages', base.messages),
+        _section(data, 'clarifications', base.clarifications),
+    )
+
+
+def read_content(path: str, base: Content = DEFAULT_CONTENT) -> Content:
+    with open(path, encoding='utf-8') as f:
+        return load_content(json.load(f), base)
+
+
+class TenantRegistry:
+    """Chatbots by tenant id, built from the files in ``directory`` and kept in step with them.
+
+    ``factory`` builds the chatbot of a new tenant from its content.
+    Requests without a tenant id go to ``default``.
+    """
+
+    def __init__(self, directory: Optional[str] = None,
+                 factory: Optional[Callable[[Content], NursingCollegeChatbot]] = None,
+                 default: Optional[NursingCollegeChatbot] = None, base: Content = DEFAULT_CONTENT,
+                 interval: float = 5.0):
+        if directory is not None and factory is None:
+            raise ValueError("a tenants directory needs a chatbot factory")
+        self.directory = directory
+        self.factory = factory
+        self.base = base
+        self.interval = interval
+        self.default = default
+        # Replaced, never changed in place, so lookups need no lock
+        self._tenants: Dict[str, NursingCollegeChatbot] = {} if default is None else {DEFAULT_TENANT: default}
+        # tenant id -> (mtime, size) of the file last read
+        self._stamps: Dict[str, Tuple[int, int]] = {}
+        self._replies: List[ReplyCache] = []
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.reload()
+
+    @classmethod
+    def from_env(cls, default: NursingCollegeChatbot) -> 'TenantRegistry':
+        """Tenants from ``CHATBOT_TENANTS``, sharing ``default``'s metrics, event log and classifiers."""
+        directory = os.environ.get('CHATBOT_TENANTS') or None
+
+        def factory(content: Content) -> NursingCollegeChatbot:
+            # Tenant sessions live in memory; the SQLite backend and snapshots cover the default college
+            return NursingCollegeChatbot(
+                content=content,
+                intent_classifier=default.intent_classifier,
+                language_detector=default.language_detector,
+                classification_cache=default.classification_cache,
+                max_sessions=int(os.environ.get('CHATBOT_MAX_SESSIONS', 100000)),
+                session_ttl=float(os.environ.get('CHATBOT_SESSION_TTL', 1800)),
+                metrics=default.metrics,
+                event_log=default.event_log,
+                transcript_size=default.transcript_size,
+            )
+
+        registry = cls(directory, factory, default,
+                       interval=float(os.environ.get('CHATBOT_TENANTS_INTERVAL', 5)))
+        if directory:
+            registry.start()
+            atexit.register(registry.close)
+        return registry
+
+    def get(self, tenant_id: Optional[str] = None) -> Optional[NursingCollegeChatbot]:
+        """The chatbot of ``tenant_id`` (the default one if empty), or None for an unknown tenant."""
+        return self._tenants.get(tenant_id or DEFAULT_TENANT)
+
+    def track_replies(self, replies: ReplyCache) -> None:
+        """Keep ``replies`` holding every reply of every tenant, as they are loaded."""
+        with self._lock:
+            self._replies.append(replies)
+            for chatbot in self._tenants.values():
+                replies.update(chatbot.reply_texts())
+
+    def _read_stamps(self) -> Dict[str, Tuple[int, int]]:
+        stamps = {}
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                try:
+                    st = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                stamps[name[:-len('.json')]] = (st.st_mtime_ns, st.st_size)
+        return stamps
+
+    def reload(self) -> List[str]:
+        """Load new and changed tenant files and drop removed ones; returns the tenant ids that changed."""
+        if self.directory is None:
+            return []
+        with self._lock:
+            stamps = self._read_stamps()
+            tenants = dict(self._tenants)
+            changed = []
+            for tenant_id, stamp in sorted(stamps.items()):
+                if self._stamps.get(tenant_id) == stamp:
+                    continue
+                try:
+                    content = read_content(os.path.join(self.directory, tenant_id + '.json'), self.base)
+                    chatbot = tenants.get(tenant_id)
+                    if chatbot is None:
+                        chatbot = self.factory(content)
+                    else:
+                        chatbot.set_content(content)
+                except (OSError, ValueError) as e:
+                    log.warning("not loading tenant %s: %s", tenant_id, e)
+                    continue
+                tenants[tenant_id] = chatbot
+                changed.append(tenant_id)
+                for replies in self._replies:
+                    replies.update(chatbot.reply_texts())
+            for tenant_id in set(self._stamps) - set(stamps):
+                if tenant_id == DEFAULT_TENANT and self.default is not None:
+                    self.default.set_content(self.base)
+                elif tenants.pop(tenant_id, None) is None:
+                    continue
+                changed.append(tenant_id)
+            self._stamps = stamps
+            self._tenants = tenants
+        return changed
+
+    def start(self) -> None:
+        """Reload every ``interval`` seconds on a background thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='tenant-reload', daemon=True)
+            self._thread.start()
+
+    def _loop(self) -> None:
+        while not self._closed.wait(self.interval):
+            try:
+                self.reload()
+            except Exception:
+                # Whatever went wrong, the next poll tries again
+                log.exception("reloading tenants from %s failed", self.directory)
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._tenants)
+
+    def __len__(self) -> int:
+        return len(self._tenants)
+
+    def __contains__(self, tenant_id: object) -> bool:
+        return tenant_id in self._tenants
@@ -4,7 +4,31 @@ Test script for Nursing College Admission Chatbot
 Verifies all requirements are properly implemented
 """
 
-from chatbot import NursingCollegeChatbot
+import asyncio
+import gzip
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from chatbot import (DEFAULT_CONTENT, FLOW, MESSAGES, SNAPSHOT_SCHEMA, ClassificationCache, ConversationState, Intent,
+                     IntentClassifier, LanguageDetector, NursingCollegeChatbot, Transition, UserSession, new_session)
+from session_store import SessionStore, SQLiteSessionStore
+from analytics import analyze, analyze_parallel, format_report, merged_events, segment_paths
+from asgi_app import ChatbotASGI
+from event_log import EventLog, read_events
+from metrics import ChatMetrics
+from rate_limit import Coalescer, RateLimiter, TokenBuckets
+from reply_cache import ReplyCache
+from router import ASGIWorker, HashRing, Router, worker_env
+from snapshot import ColdSessions, SnapshotError
+from tenants import TenantRegistry, load_content
+from benchmarks.bench_regression import DEFAULT_BASELINES, compare, hot_paths, load_baselines
+from benchmarks.loadtest import DEFAULT_CORPUS, load_corpus
 
 def test_positive_flow():
     """Test the complete positive conversation flow"""
@@ -180,6 +204,1401 @@ def test_fee_structure():
         print("✅ Fee structure test passed!")
         return True
 
+def test_flow_table():
+    """Test that the flow table covers every state and can be changed as data"""
+    print("\n🧪 Testing Flow Table...")
+
+    missing_states = [state.name for state in ConversationState if state not in FLOW]
+    if missing_states:
+        print(f"❌ States without a flow entry: {missing_states}")
+        return False
+
+    # Skip the hostel step without touching get_response
+    flow = dict(FLOW)
+    flow[ConversationState.FEE_STRUCTURE] = Transition(
+        ConversationState.COLLEGE_LOCATION, 'college_location',
+        ConversationState.END, 'end', clarify='fee_structure')
+    chatbot = NursingCollegeChatbot(flow=flow)
+
+    user_id = "test_user_flow"
+    for user_input in ["yes", "haan", "batao", "tell me"]:
+        chatbot.get_response(user_id, user_input)
+    response = chatbot.get_response(user_id, "ok")
+
+    if "College Location" in response and chatbot.sessions[user_id].state == ConversationState.COLLEGE_LOCATION:
+        print("✅ Flow table test passed!")
+        return True
+    else:
+        print("❌ Flow table test failed")
+        return False
+
+def test_intent_classifier():
+    """Test single-pass yes/no classification"""
+    print("\n🧪 Testing Intent Classifier...")
+    chatbot = NursingCollegeChatbot()
+
+    expected = {
+        "haan": Intent.YES,
+        "Tell me more!": Intent.YES,
+        "kya hai": Intent.YES,
+        "nahi": Intent.NO,
+        "don't": Intent.NO,
+        "I don't want to": Intent.YES,  # positive wins
+        "no thank you": Intent.NO,
+        "what's next?": Intent.YES,  # "what", as the \b patterns read it
+        "what's the fee": Intent.YES,
+        "what's up": Intent.YES,
+        "not interested": Intent.YES,  # positive wins, as before
+        "hmm": Intent.UNKNOWN,
+        "tell": Intent.UNKNOWN,
+        "": Intent.UNKNOWN,
+    }
+    for text, intent in expected.items():
+        if chatbot.classify_intent(text) is not intent:
+            print(f"❌ '{text}' classified as {chatbot.classify_intent(text)}, expected {intent}")
+            return False
+
+    if IntentClassifier(negative_wins=True).classify("not interested") is not Intent.NO:
+        print("❌ negative_wins did not prefer the negative match")
+        return False
+
+    for message in ["hello", "yes", "yes"]:
+        chatbot.get_response("test_user_apostrophe", message)
+    chatbot.get_response("test_user_apostrophe", "what's next?")
+    if chatbot.get_session("test_user_apostrophe").state != ConversationState.FEE_STRUCTURE:
+        print("❌ \"what's next?\" did not move on from the program details")
+        return False
+
+    print("✅ Intent classifier test passed!")
+    return True
+
+def test_session_store():
+    """Test session TTL expiry and LRU eviction"""
+    print("\n🧪 Testing Session Store...")
+    now = [0.0]
+    store = SessionStore(lambda user_id: {'user_id': user_id}, max_sessions=3, ttl=60, clock=lambda: now[0])
+
+    for user_id in ["a", "b", "c"]:
+        store.get_or_create(user_id)
+    store.get_or_create("a")  # "b" is now least recently used
+    store.get_or_create("d")
+
+    if "b" in store or len(store) != 3 or store.evictions != 1:
+        print(f"❌ LRU eviction failed: {sorted(store)}")
+        return False
+
+    now[0] = 30.0
+    store.get_or_create("d")
+    now[0] = 61.0
+    store.get_or_create("e")  # "c" and "a" have been idle for over a minute
+
+    if sorted(store) != ["d", "e"] or store.expirations != 2:
+        print(f"❌ TTL expiry failed: {sorted(store)}")
+        return False
+
+    chatbot = NursingCollegeChatbot(max_sessions=2)
+    for user_id in ["x", "y", "z"]:
+        chatbot.get_response(user_id, "")
+    if len(chatbot.sessions) != 2 or chatbot.sessions.stats()['evictions'] != 1:
+        print("❌ Chatbot sessions are not bounded")
+        return False
+
+    print("✅ Session store test passed!")
+    return True
+
+def test_user_session():
+    """Test the compact session keeps the dataclass-style API"""
+    print("\n🧪 Testing User Session...")
+    session = UserSession(user_id="u", state=ConversationState.INITIAL)
+
+    if hasattr(session, '__dict__'):
+        print("❌ UserSession has a per-instance __dict__")
+        return False
+    if (session.biology_studied, session.admission_interested, session.language) != (None, None, None):
+        print(f"❌ Unexpected defaults: {session}")
+        return False
+
+    session.state = ConversationState.SCHOLARSHIP
+    session.biology_studied = False
+    session.admission_interested = True
+    session.language = 'hi'
+    session.responses['note'] = 'x'
+    expected = UserSession("u", ConversationState.SCHOLARSHIP, {'note': 'x'},
+                           biology_studied=False, admission_interested=True, language='hi')
+    if session != expected or session.state is not ConversationState.SCHOLARSHIP:
+        print(f"❌ Round trip failed: {session}")
+        return False
+
+    try:
+        session.language = 'fr'
+    except ValueError:
+        pass
+    else:
+        print("❌ Unsupported language was accepted")
+        return False
+
+    print("✅ User session test passed!")
+    return True
+
+def test_session_history():
+    """Test each session keeps its last turns, serves them at /history and carries them when encoded"""
+    print("\n🧪 Testing Session History...")
+    chatbot = NursingCollegeChatbot(transcript_size=3)
+    messages = ["hello", "yes", "hmm", "hostel kaisa hai", "haan"]
+    replies = [chatbot.get_response("h", text) for text in messages]
+    expected = [{'message': text, 'response': reply} for text, reply in zip(messages, replies)][-3:]
+    if chatbot.get_history("h") != expected:
+        print(f"❌ History is not the last three turns: {chatbot.get_history('h')}")
+        return False
+    if chatbot.get_history("nobody") != [] or "nobody" in chatbot.sessions:
+        print("❌ History of an unknown user was not empty, or created a session")
+        return False
+
+    session = chatbot.get_session("h")
+    if session.transcript.replies.itemsize != 2 or len(session.transcript) != 3:
+        print("❌ Reply ids are not kept as a compact array")
+        return False
+    # A pinned yes/no reply is one string shared by every transcript
+    chatbot.get_response("h2", "".join(["ha", "an"]))
+    if next(iter(chatbot.get_session("h2").transcript))[0] is not next(reversed(list(session.transcript)))[0]:
+        print("❌ Pinned replies are not shared between transcripts")
+        return False
+
+    for copy in (UserSession.loads("h", session.dumps()), UserSession.unpack("h", *session.pack())):
+        if copy != session or list(copy.transcript) != list(session.transcript):
+            print("❌ Transcript did not survive encoding")
+            return False
+    old = UserSession.loads("old", json.dumps(["fee_structure", 0, "en", {}]))
+    if old.transcript is not None or UserSession.unpack("old", *old.pack()) != old:
+        print("❌ Sessions encoded without a transcript no longer load")
+        return False
+
+    # Sessions recorded with longer transcripts keep the latest turns
+    smaller = NursingCollegeChatbot(transcript_size=2)
+    smaller.sessions.put("h", UserSession.loads("h", session.dumps()))
+    smaller.get_response("h", "nahi")
+    if [turn['message'] for turn in smaller.get_history("h")] != ["haan", "nahi"]:
+        print(f"❌ Shrinking the transcript kept the wrong turns: {smaller.get_history('h')}")
+        return False
+
+    app = ChatbotASGI(chatbot)
+    status, body = asgi_request(app, 'POST', '/history', {'user_id': 'h'})
+    if status != 200 or body != {'user_id': 'h', 'history': expected}:
+        print(f"❌ Unexpected /history reply: {status} {body}")
+        return False
+
+    off = NursingCollegeChatbot(transcript_size=0)
+    off.get_response("q", "hello")
+    if off.get_history("q") != [] or off.get_session("q").transcript is not None:
+        print("❌ transcript_size=0 still kept turns")
+        return False
+
+    print("✅ Session history test passed!")
+    return True
+
+def test_sqlite_sessions():
+    """Test that two workers sharing a SQLite backend continue one conversation"""
+    print("\n🧪 Testing SQLite Sessions...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.db")
+        workers = [
+            NursingCollegeChatbot(sessions=SQLiteSessionStore(
+                path, new_session, UserSession.dumps, UserSession.loads, flush_interval=60))
+            for _ in range(2)
+        ]
+
+        user_id = "test_user_sqlite"
+        for i, user_input in enumerate(["hello", "yes", "haan", "batao"]):
+            worker = workers[i % 2]
+            worker.get_response(user_id, user_input)
+            worker.sessions.flush()
+
+        session = workers[0].get_session(user_id)
+        if session.state != ConversationState.FEE_STRUCTURE or session.biology_studied is not True:
+            print(f"❌ Conversation did not carry across workers: {session}")
+            return False
+
+        # Unflushed writes are still visible to the worker that made them
+        workers[1].get_response(user_id, "ok")
+        if workers[1].get_session(user_id).state != ConversationState.HOSTEL_FACILITIES:
+            print("❌ Write-behind buffer was not read back")
+            return False
+
+        del workers[1].sessions[user_id]
+        if user_id in workers[0].sessions:
+            print("❌ Reset did not remove the shared session")
+            return False
+
+        for worker in workers:
+            worker.sessions.close()
+
+        # Idle sessions are deleted in the background and not counted as live meanwhile
+        now = [1000.0]
+        store = SQLiteSessionStore(os.path.join(tmp, "expiry.db"), new_session, UserSession.dumps,
+                                   UserSession.loads, ttl=60, flush_interval=0.01, expire_interval=0.02,
+                                   clock=lambda: now[0])
+        for i in range(5):
+            store.save(f"idle_{i}", new_session(f"idle_{i}"))
+        store.flush()
+        now[0] += 30
+        store.save("active", new_session("active"))
+        store.flush()
+        now[0] += 45
+        if len(store) != 1 or "idle_0" in store or "active" not in store:
+            print(f"❌ Expired sessions were counted as live: {len(store)}")
+            return False
+        deadline = time.time() + 5
+        while store.expirations < 5 and time.time() < deadline:
+            time.sleep(0.01)
+        rows = store._conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+        store.close()
+        if store.expirations != 5 or rows != 1:
+            print(f"❌ Idle sessions were not expired in the background: {store.expirations} expired, {rows} left")
+            return False
+
+        # A flush blocked by another worker's write lock keeps its sessions for the next one
+        path = os.path.join(tmp, "busy.db")
+        store = SQLiteSessionStore(path, new_session, UserSession.dumps, UserSession.loads,
+                                   flush_interval=0.01, busy_timeout=0.05)
+        blocker = sqlite3.connect(path, isolation_level=None)
+        blocker.execute('BEGIN IMMEDIATE')
+        session = new_session("busy")
+        session.state = ConversationState.FEE_STRUCTURE
+        store.save("busy", session)
+        time.sleep(0.3)
+        alive, pending = store._flusher.is_alive(), store.stats()['pending_writes']
+        blocker.execute('ROLLBACK')
+        blocker.close()
+        deadline = time.time() + 5
+        while store.stats()['pending_writes'] and time.time() < deadline:
+            time.sleep(0.01)
+        store.close()
+        reopened = SQLiteSessionStore(path, new_session, UserSession.dumps, UserSession.loads)
+        state = reopened.get_or_create("busy").state
+        reopened.close()
+        if not alive or pending != 1 or state != ConversationState.FEE_STRUCTURE:
+            print(f"❌ Blocked flush lost its batch: flusher alive {alive}, {pending} pending, came back {state.name}")
+            return False
+
+    print("✅ SQLite sessions test passed!")
+    return True
+
+def test_concurrent_turns():
+    """Stress test: hot sessions hammered from many threads alongside cold ones"""
+    print("\n🧪 Testing Concurrent Turns...")
+    # Loop the flow back to the start so a hot session can take many turns
+    flow = dict(FLOW)
+    flow[ConversationState.ELIGIBILITY] = Transition(
+        ConversationState.INITIAL, 'final', ConversationState.INITIAL, 'final')
+    cycle = len(flow) - 1
+    rounds = 100
+
+    sequential = NursingCollegeChatbot(flow=flow)
+    expected = Counter(sequential.get_response("u", "yes") for _ in range(cycle * rounds))
+
+    class YieldingSession(UserSession):
+        # Give up the GIL between reading the state and advancing it: a turn
+        # records the answer after picking the next step and before moving there
+        __slots__ = ()
+
+        @property
+        def biology_studied(self):
+            return UserSession.biology_studied.fget(self)
+
+        @biology_studied.setter
+        def biology_studied(self, value):
+            time.sleep(0)
+            UserSession.biology_studied.fset(self, value)
+
+        @property
+        def admission_interested(self):
+            return UserSession.admission_interested.fget(self)
+
+        @admission_interested.setter
+        def admission_interested(self, value):
+            time.sleep(0)
+            UserSession.admission_interested.fset(self, value)
+
+    sessions = SessionStore(lambda user_id: YieldingSession(user_id, ConversationState.INITIAL))
+    chatbot = NursingCollegeChatbot(flow=flow, sessions=sessions)
+    hot_users = ["hot-%d" % i for i in range(4)]
+    received = {user_id: [] for user_id in hot_users}
+    threads_per_user = 6
+    cold_threads, cold_users = 4, 500
+    barrier = threading.Barrier(len(hot_users) * threads_per_user + cold_threads)
+
+    def hammer(user_id):
+        barrier.wait()
+        for _ in range(cycle * rounds // threads_per_user):
+            received[user_id].append(chatbot.get_response(user_id, "yes"))
+
+    def cold(offset):
+        barrier.wait()
+        for i in range(cold_users):
+            for reply in ["hello", "yes", "haan"]:
+                chatbot.get_response("cold-%d-%d" % (offset, i), reply)
+
+    threads = [threading.Thread(target=hammer, args=(user_id,))
+               for user_id in hot_users for _ in range(threads_per_user)]
+    threads += [threading.Thread(target=cold, args=(i,)) for i in range(cold_threads)]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    total = len(hot_users) * cycle * rounds + cold_threads * cold_users * 3
+    print(f"   {total} turns in {elapsed:.2f}s ({total / elapsed:.0f} turns/s)")
+    for user_id in hot_users:
+        if Counter(received[user_id]) != expected:
+            print(f"❌ {user_id} skipped or repeated steps")
+            return False
+        if chatbot.get_session(user_id).state != ConversationState.INITIAL:
+            print(f"❌ {user_id} did not finish on a whole number of rounds")
+            return False
+
+    print("✅ Concurrent turns test passed!")
+    return True
+
+def asgi_request(app, method, path, payload, **scope):
+    """Send one request through an ASGI app and return (status, JSON body); ``scope`` adds to its scope"""
+    messages = [{'type': 'http.request', 'body': json.dumps(payload).encode(), 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(dict({'type': 'http', 'method': method, 'path': path}, **scope), receive, send))
+    return sent[0]['status'], json.loads(sent[1]['body'])
+
+def asgi_websocket(app, path, query, frames):
+    """Run one WebSocket session through an ASGI app; returns what the app sent"""
+    events = [{'type': 'websocket.connect'}] + [
+        {'type': 'websocket.receive', 'bytes' if isinstance(frame, bytes) else 'text': frame} for frame in frames
+    ] + [{'type': 'websocket.disconnect', 'code': 1000}]
+    sent = []
+
+    async def receive():
+        return events.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app({'type': 'websocket', 'path': path, 'query_string': query}, receive, send))
+    return sent
+
+def test_asgi_endpoints():
+    """Test the ASGI /chat and /reset endpoints keep the Flask JSON contract"""
+    print("\n🧪 Testing ASGI Endpoints...")
+    app = ChatbotASGI(NursingCollegeChatbot())
+
+    status, body = asgi_request(app, 'POST', '/chat', {'message': 'hello'})
+    if status != 200 or 'admission' not in body['response'] or not body.get('user_id'):
+        print(f"❌ Unexpected /chat reply: {status} {body}")
+        return False
+
+    user_id = body['user_id']
+    status, body = asgi_request(app, 'POST', '/chat', {'message': 'yes', 'user_id': user_id})
+    if body != {'response': app.chatbot.get_biology_check_message('en'), 'user_id': user_id}:
+        print(f"❌ Conversation did not continue: {body}")
+        return False
+
+    status, body = asgi_request(app, 'POST', '/reset', {'user_id': user_id})
+    if body != {'status': 'success'} or user_id in app.chatbot.sessions:
+        print(f"❌ Reset failed: {body}")
+        return False
+
+    if asgi_request(app, 'GET', '/chat', {})[0] != 405 or asgi_request(app, 'POST', '/nope', {})[0] != 404:
+        print("❌ Unknown routes were not rejected")
+        return False
+
+    print("✅ ASGI endpoints test passed!")
+    return True
+
+def test_batch_responses():
+    """Test that a batch gives the same replies as one call per message"""
+    print("\n🧪 Testing Batch Responses...")
+    messages = [("a", "hello"), ("b", "hello"), ("a", "yes"), ("b", "nahi"), ("a", "haan"),
+                ("c", "नमस्ते"), ("a", "hmm"), ("c", "हाँ")]
+
+    one_by_one = NursingCollegeChatbot()
+    expected = [one_by_one.get_response(user_id, text) for user_id, text in messages]
+    batched = NursingCollegeChatbot()
+    if batched.get_responses_batch(messages) != expected:
+        print("❌ Batch replies differ from per-message replies")
+        return False
+    if batched.get_session("a").state != ConversationState.PROGRAM_DETAILS:
+        print("❌ Turns were not applied in arrival order")
+        return False
+
+    status, body = asgi_request(ChatbotASGI(NursingCollegeChatbot()), 'POST', '/chat/batch', {
+        'messages': [{'user_id': user_id, 'message': text} for user_id, text in messages]})
+    if status != 200 or [item['response'] for item in body['responses']] != expected:
+        print(f"❌ /chat/batch failed: {status}")
+        return False
+
+    print("✅ Batch responses test passed!")
+    return True
+
+def test_reply_cache():
+    """Test that pre-encoded replies cover the flow and decode to the same JSON"""
+    print("\n🧪 Testing Reply Cache...")
+    chatbot = NursingCollegeChatbot()
+    cache = ReplyCache(chatbot.reply_texts())
+
+    user_id = 'test_user_"cache"'
+    for user_input in ["hello", "yes", "hmm", "haan", "batao", "हाँ", "nahi", "what"]:
+        response = chatbot.get_response(user_id, user_input)
+        if response not in cache:
+            print(f"❌ Reply was not pre-encoded: {response[:40]!r}")
+            return False
+        expected = {'response': response, 'user_id': user_id}
+        if (json.loads(cache.chat_body(response, user_id)) != expected
+                or json.loads(gzip.decompress(cache.chat_body(response, user_id, gzip=True))) != expected):
+            print(f"❌ Encoded body does not round-trip: {response[:40]!r}")
+            return False
+
+    if json.loads(cache.chat_body("not cached", "u")) != {'response': "not cached", 'user_id': "u"}:
+        print("❌ Uncached reply was not encoded")
+        return False
+
+    print("✅ Reply cache test passed!")
+    return True
+
+def test_language_detection():
+    """Test Devanagari and romanized Hindi detection and the memo"""
+    print("\n🧪 Testing Language Detection...")
+    detector = LanguageDetector(memo_size=2, memo_max_length=10)
+    expected = {
+        "हाँ": 'hi',
+        "Haan": 'hi',
+        "nahi ji": 'hi',
+        "Batao!": 'hi',
+        "yes please": 'en',
+        "tell me more": 'en',
+        "": 'en',
+        "x" * 5000 + " नहीं": 'hi',
+        "spam " * 2000: 'en',
+        "ok 👍": 'en',
+        "haan 👍": 'hi',
+    }
+    for text, lang in expected.items():
+        if detector.detect(text) != lang:
+            print(f"❌ '{text[:20]}' detected as {detector.detect(text)}, expected {lang}")
+            return False
+
+    detector.detect("Haan")
+    detector.detect("Haan")
+    info = detector._memo.cache_info()
+    if info.currsize > 2 or info.hits == 0:
+        print(f"❌ Memo is not bounded or not used: {info}")
+        return False
+
+    chatbot = NursingCollegeChatbot()
+    chatbot.get_response("test_user_lang", "hello")
+    if chatbot.get_response("test_user_lang", "haan") != chatbot.get_biology_check_message('hi'):
+        print("❌ Romanized Hindi reply did not get a Hindi answer")
+        return False
+
+    print("✅ Language detection test passed!")
+    return True
+
+def test_classification_cache():
+    """Test the classification cache agrees with the classifier, shares entries across case and stays bounded"""
+    print("\n🧪 Testing Classification Cache...")
+    classifier, detector = IntentClassifier(), LanguageDetector()
+    cache = ClassificationCache(detector, classifier, max_size=3, max_length=20)
+    for text in ["yes", "YES", "Haan ji", "nahi", "not interested", "NO THANK YOU", "hmm", "yess", "  Nhi ",
+                 "fees kitni hai?", "हाँ", "", "tell me " * 10]:
+        reading = cache.read(text)
+        expected = (detector.detect(text), classifier.classify(text), classifier.intents(text),
+                    text.strip().lower() in classifier.words)
+        if tuple(reading) != expected:
+            print(f"❌ {text!r} read as {reading}, expected {expected}")
+            return False
+
+    stats = cache.stats()
+    if stats['size'] > 3 or stats['pinned'] < len(classifier.words):
+        print(f"❌ Cache not bounded or vocabulary not pinned: {stats}")
+        return False
+    # Vocabulary words are pinned hits from the start; other replies share one entry whatever their case
+    cache.clear()
+    before = cache.stats()
+    for text in ["Yes", "hmm", "HMM", " hmm "]:
+        cache.read(text)
+    after = cache.stats()
+    if (after['hits'] - before['hits'], after['misses'] - before['misses']) != (3, 1):
+        print(f"❌ Expected 3 hits and 1 miss, got {before} -> {after}")
+        return False
+    cache.read("tell me " * 10)
+    if cache.stats()['size'] != 1:
+        print("❌ A reply over max_length was cached")
+        return False
+
+    if NursingCollegeChatbot().classification_cache is not NursingCollegeChatbot().classification_cache:
+        print("❌ Default chatbots do not share the classification cache")
+        return False
+    custom = NursingCollegeChatbot(intent_classifier=IntentClassifier(negative_wins=True))
+    if custom.classify_intent("not interested") is not Intent.NO:
+        print("❌ A chatbot with its own classifier read replies with the default one")
+        return False
+
+    print("✅ Classification cache test passed!")
+    return True
+
+def test_replay_corpus():
+    """Test that the load-test corpus plays out as each conversation kind intends"""
+    print("\n🧪 Testing Replay Corpus...")
+    chatbot = NursingCollegeChatbot()
+    for conversation in load_corpus(DEFAULT_CORPUS):
+        user_id = conversation['conversation_id']
+        for message in conversation['messages']:
+            chatbot.get_response(user_id, message)
+        state = chatbot.get_session(user_id).state
+        if conversation['kind'] in ('positive', 'clarify') and state != ConversationState.END:
+            print(f"❌ {user_id} ({conversation['kind']}) stopped at {state.name}")
+            return False
+        if conversation['kind'] == 'biology_loop' and chatbot.get_session(user_id).biology_studied is not True:
+            print(f"❌ {user_id} never got past the Biology check")
+            return False
+
+    print("✅ Replay corpus test passed!")
+    return True
+
+def test_metrics():
+    """Test funnel counters, latency histograms and the /metrics exposition"""
+    print("\n🧪 Testing Metrics...")
+    chatbot = NursingCollegeChatbot(metrics=ChatMetrics())
+    app = ChatbotASGI(chatbot)
+    for user_input in ["hello", "yes", "hmm", "haan"]:
+        asgi_request(app, 'POST', '/chat', {'user_id': 'test_user_metrics', 'message': user_input})
+
+    metrics = chatbot.metrics
+    if (metrics.transitions.value('initial', 'admission_interest', 'en') != 1
+            or metrics.transitions.value('biology_check', 'program_details', 'hi') != 1
+            or metrics.clarifications.value('biology_check') != 1
+            or metrics.turn_seconds.count('biology_check') != 2
+            or metrics.request_seconds.count('/chat') != 4):
+        print("❌ Turns were not counted")
+        return False
+
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app({'type': 'http', 'method': 'GET', 'path': '/metrics'}, receive, send))
+    text = sent[1]['body'].decode()
+    expected_lines = [
+        '# TYPE chatbot_turn_seconds histogram',
+        'chatbot_transitions_total{from_state="admission_interest",to_state="biology_check",lang="en"} 1',
+        'chatbot_turn_seconds_count{state="biology_check"} 2',
+        'chatbot_turn_seconds_bucket{state="initial",le="+Inf"} 1',
+        'chatbot_clarification_rate 0.25',
+        'chatbot_live_sessions 1',
+    ]
+    missing = [line for line in expected_lines if line not in text.splitlines()]
+    if missing:
+        print(f"❌ Missing from /metrics: {missing}")
+        return False
+
+    print("✅ Metrics test passed!")
+    return True
+
+def test_faq_answers():
+    """Test free-form questions are answered in place and the flow resumes"""
+    print("\n🧪 Testing FAQ Answers...")
+    chatbot = NursingCollegeChatbot()
+    expected = {
+        "what is the fee?": 'fee_structure',
+        "फीस कितनी है?": 'fee_structure',
+        "hostel kaisa hai": 'hostel_facilities',
+        "kitni seats hain": 'total_seats',
+        "is it INC approved?": 'recognition',
+        "what is the age limit": 'eligibility',
+        "yes": None,
+        "hmm": None,
+    }
+    for question, topic in expected.items():
+        if chatbot.faq.best(question) != topic:
+            print(f"❌ '{question}' matched {chatbot.faq.best(question)}, expected {topic}")
+            return False
+
+    user_id = "test_user_faq"
+    chatbot.get_response(user_id, "hello")
+    chatbot.get_response(user_id, "yes")
+    response = chatbot.get_response(user_id, "what is the fee?")
+    if ("₹70,000" not in response or not response.endswith("Did you study Biology in 12th grade?")
+            or chatbot.get_session(user_id).state != ConversationState.BIOLOGY_CHECK
+            or chatbot.get_session(user_id).biology_studied is not None):
+        print("❌ FAQ answer did not keep the user at the Biology question")
+        return False
+
+    # A yes that names the topic offered next just moves on
+    chatbot.get_response(user_id, "haan")
+    chatbot.get_response(user_id, "yes, tell me the fees")
+    if chatbot.get_session(user_id).state != ConversationState.FEE_STRUCTURE:
+        print("❌ 'yes' to the next topic did not advance the flow")
+        return False
+
+    # A reply with a 'no' in it that mentions a topic is not a question about it
+    for reply in ("no i dont want to know the fees", "nahi, fees nahi chahiye"):
+        user_id = "test_user_faq_no"
+        chatbot.sessions.pop(user_id)
+        chatbot.get_response(user_id, "hello")
+        response = chatbot.get_response(user_id, reply)
+        if "₹70,000" in response or chatbot.get_session(user_id).state == ConversationState.ADMISSION_INTEREST:
+            print(f"❌ '{reply}' was answered as a question about fees")
+            return False
+    if chatbot.get_session(user_id).state != ConversationState.END:
+        print("❌ A plain 'no' naming a topic did not end the conversation")
+        return False
+
+    # A 'yes' that names a topic without asking about it answers the step
+    for reply, answered in (("yes I studied biology", 2), ("haan maine biology padhi hai", 2),
+                            ("yes, in 12th", 2), ("yes my age is 18", 1)):
+        user_id = "test_user_faq_yes"
+        chatbot.sessions.pop(user_id)
+        for message in ("hello", "yes")[:answered]:
+            chatbot.get_response(user_id, message)
+        state = chatbot.get_session(user_id).state
+        chatbot.get_response(user_id, reply)
+        if chatbot.get_session(user_id).state != FLOW[state].on_yes:
+            print(f"❌ '{reply}' at {state.name} did not move the flow on")
+            return False
+
+    print("✅ FAQ answers test passed!")
+    return True
+
+def test_fuzzy_intents():
+    """Test misspelt yes/no replies match and look-alike words do not"""
+    print("\n🧪 Testing Fuzzy Intents...")
+    classifier = IntentClassifier()
+    expected = {
+        "yess": Intent.YES,
+        "haa": Intent.YES,
+        "hn": Intent.YES,
+        "okk": Intent.YES,
+        "bilkull": Intent.YES,
+        "intrested": Intent.YES,
+        "nhi": Intent.NO,
+        "nooo": Intent.NO,
+        "now": Intent.UNKNOWN,
+        "on": Intent.UNKNOWN,
+        "hmm": Intent.UNKNOWN,
+        "hello": Intent.UNKNOWN,
+        "okk I will think about the bilkull": Intent.UNKNOWN,
+        "yse": Intent.YES,
+        "nahe": Intent.NO,
+        "hope": Intent.UNKNOWN,
+        "hot": Intent.UNKNOWN,
+        "can": Intent.UNKNOWN,
+        "has": Intent.UNKNOWN,
+        "less": Intent.UNKNOWN,
+        "fees": Intent.UNKNOWN,
+        "nahin": Intent.NO,
+        "interstd": Intent.YES,
+        "uninterested": Intent.UNKNOWN,
+        "im uninterested": Intent.UNKNOWN,
+        "fright": Intent.UNKNOWN,
+        "light": Intent.UNKNOWN,
+        "bright": Intent.UNKNOWN,
+        "upright": Intent.UNKNOWN,
+        "blight": Intent.UNKNOWN,
+        "donut": Intent.UNKNOWN,
+    }
+    for text, intent in expected.items():
+        if classifier.classify(text) != intent:
+            print(f"❌ '{text}' classified as {classifier.classify(text)}, expected {intent}")
+            return False
+    if IntentClassifier(fuzzy=False).classify("yess") != Intent.UNKNOWN:
+        print("❌ fuzzy=False still matched a typo")
+        return False
+
+    chatbot = NursingCollegeChatbot()
+    chatbot.get_response("test_user_fuzzy", "hello")
+    chatbot.get_response("test_user_fuzzy", "yess")
+    chatbot.get_response("test_user_fuzzy", "nhi")
+    if chatbot.get_session("test_user_fuzzy").biology_studied is not False:
+        print("❌ Misspelt replies did not drive the flow")
+        return False
+
+    # Nor may a word that only looks like an answer flip its meaning
+    chatbot.sessions.pop("test_user_fuzzy")
+    chatbot.get_response("test_user_fuzzy", "hello")
+    chatbot.get_response("test_user_fuzzy", "uninterested")
+    if chatbot.get_session("test_user_fuzzy").admission_interested is not None:
+        print("❌ 'uninterested' was read as interest in admission")
+        return False
+
+    # A short everyday word must not answer the question for the user
+    chatbot.sessions.pop("test_user_fuzzy")
+    for text in ("hi", "yes", "yes", "I hope so"):
+        chatbot.get_response("test_user_fuzzy", text)
+    if chatbot.get_session("test_user_fuzzy").state == ConversationState.END:
+        print("❌ 'I hope so' was read as a no and ended the conversation")
+        return False
+
+    print("✅ Fuzzy intents test passed!")
+    return True
+
+def test_event_log():
+    """Test turns are logged in the background to rotated segments"""
+    print("\n🧪 Testing Event Log...")
+    with tempfile.TemporaryDirectory() as directory:
+        log = EventLog(directory, max_bytes=400, flush_interval=0.01)
+        chatbot = NursingCollegeChatbot(event_log=log)
+        for message in ["hello", "yes", "hmm", "nahi"]:
+            chatbot.get_response("test_user_events", message)
+            log.flush()
+        log.close()
+        events = list(read_events(log.segments()))
+        steps = [(e['from_state'], e['to_state'], e['lang'], e['intent']) for e in events]
+        if steps != [('initial', 'admission_interest', 'en', 'yes'),
+                     ('admission_interest', 'biology_check', 'en', 'yes'),
+                     ('biology_check', 'biology_check', 'en', 'unknown'),
+                     ('biology_check', 'biology_check', 'hi', 'no')]:
+            print(f"❌ Unexpected events: {steps}")
+            return False
+        if [e['reply'] for e in events] != ['step', 'step', 'clarify', 'step']:
+            print(f"❌ Unexpected reply kinds: {[e['reply'] for e in events]}")
+            return False
+        if len(log.segments()) < 2 or log.rotations == 0:
+            print("❌ Segments were not rotated at max_bytes")
+            return False
+
+        # A restart starts a new segment; a cut-short last line is skipped
+        with open(log.segments()[-1], 'a', encoding='utf-8') as f:
+            f.write('{"ts": 1')
+        restarted = EventLog(directory, max_segments=2)
+        restarted.record(time.time(), "u", "initial", "admission_interest", "en", Intent.YES)
+        restarted.close()
+        if len(restarted.segments()) != 2 or len(list(read_events(restarted.segments()))) < 2:
+            print("❌ Restart or retention did not keep the newest segments")
+            return False
+
+    # Two processes logging to one directory keep to their own segments
+    with tempfile.TemporaryDirectory() as directory:
+        first = EventLog(directory, max_bytes=200, max_segments=2, writer="w1")
+        second = EventLog(directory, max_bytes=200, max_segments=2, writer="worker-2")
+        for i in range(6):
+            first.record(float(2 * i), "a", "initial", "admission_interest", "en", Intent.YES)
+            second.record(float(2 * i + 1), "b", "initial", "admission_interest", "en", Intent.YES)
+            first.flush()
+            second.flush()
+        first.close()
+        second.close()
+        if len(first.segments()) != 2 or len(second.segments()) != 2 or set(first.segments()) & set(second.segments()):
+            print(f"❌ Writers shared or pruned each other's segments: {sorted(os.listdir(directory))}")
+            return False
+        times = [event[0] for event in merged_events(segment_paths([directory]))]
+        if len(times) != 4 or times != sorted(times) or {t % 2 for t in times} != {0, 1}:
+            print(f"❌ Segments of two writers were not merged by time: {times}")
+            return False
+
+    with tempfile.TemporaryDirectory() as directory:
+        for overflow, kept in (('drop_newest', [0, 1, 2]), ('drop_oldest', [2, 3, 4])):
+            full = EventLog(directory, capacity=3, flush_interval=60, overflow=overflow)
+            full._flusher = threading.current_thread()  # nothing drains the buffer
+            for i in range(5):
+                full.record(float(i), "u", "initial", "initial", "en", None)
+            if full.dropped != 2 or [event[0] for event in full._buffer] != kept:
+                print(f"❌ {overflow} kept {list(full._buffer)}")
+                return False
+
+    print("✅ Event log test passed!")
+    return True
+
+def test_session_snapshot():
+    """Test sessions survive a restart through a snapshot, and a broken snapshot is not restored"""
+    print("\n🧪 Testing Session Snapshots...")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "sessions.snap")
+        chatbot = NursingCollegeChatbot()
+        chatbot.enable_snapshots(path, interval=3600)
+        for i in range(5):
+            chatbot.get_response(f"snap_user_{i}", "hello")
+            for _ in range(i):
+                chatbot.get_response(f"snap_user_{i}", "yes")
+        chatbot.get_session("snap_user_4").responses["note"] = "हाँ"
+        # Turns are stored as sent, a broken surrogate pair included
+        chatbot.get_response("snap_user_4", "fees? \ud83d")
+        if chatbot.snapshotter.save() != 5:
+            print("❌ Snapshot did not hold every session")
+            return False
+        good = open(path, 'rb').read()
+
+        restarted = NursingCollegeChatbot()
+        if restarted.enable_snapshots(path, interval=3600) != 5 or len(restarted.sessions) != 5:
+            print("❌ Restore did not bring back every session")
+            return False
+        for i in range(5):
+            if restarted.get_session(f"snap_user_{i}") != chatbot.get_session(f"snap_user_{i}"):
+                print(f"❌ snap_user_{i} came back as {restarted.get_session(f'snap_user_{i}')}")
+                return False
+        restarted.get_response("snap_user_2", "haan")
+        if restarted.get_session("snap_user_2").state != ConversationState.FEE_STRUCTURE:
+            print("❌ Restored user did not carry on mid-funnel")
+            return False
+
+        # Sessions not used since the restore are kept by the next snapshot
+        again = NursingCollegeChatbot(max_sessions=3)
+        again.enable_snapshots(path, interval=3600)
+        again.snapshotter.fork = False
+        if len(again.sessions) != 3 or "snap_user_0" in again.sessions or "snap_user_4" not in again.sessions:
+            print("❌ Restore into a smaller table did not keep the most recent sessions")
+            return False
+        again.get_response("new_user", "hello")
+        if again.snapshotter.save() != 3 or "snap_user_2" in again.sessions:
+            print("❌ Eviction after restore did not drop the least recently used session")
+            return False
+
+        # A snapshot interrupted part way through leaves the last one in place
+        with open(path, 'wb') as f:
+            f.write(good)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(good[:len(good) // 2])
+        broken = NursingCollegeChatbot()
+        broken.enable_snapshots(path, interval=3600)
+        broken.snapshotter.fork = False
+        fsync = os.fsync
+        def crash(fd):
+            raise OSError("disk full")
+        os.fsync = crash
+        try:
+            broken.get_response("late_user", "hello")
+            broken.snapshotter.save()
+            print("❌ Interrupted snapshot did not fail")
+            return False
+        except OSError:
+            pass
+        finally:
+            os.fsync = fsync
+        if open(path, 'rb').read() != good or NursingCollegeChatbot().enable_snapshots(path, 3600) != 5:
+            print("❌ Interrupted snapshot damaged the previous one")
+            return False
+
+        # Files cut short or damaged are refused
+        for damaged in (good[:len(good) - 3], good[:20], good[:-1] + bytes([good[-1] ^ 1])):
+            with open(path, 'wb') as f:
+                f.write(damaged)
+            try:
+                ColdSessions(path, UserSession.unpack, SNAPSHOT_SCHEMA)
+                print("❌ Damaged snapshot was restored")
+                return False
+            except SnapshotError:
+                pass
+            if NursingCollegeChatbot().enable_snapshots(path, interval=3600) != 0:
+                print("❌ Damaged snapshot was not skipped at startup")
+                return False
+        with open(path, 'wb') as f:
+            f.write(good)
+        try:
+            ColdSessions(path, UserSession.unpack, SNAPSHOT_SCHEMA + " changed")
+            print("❌ Snapshot of another flow was restored")
+            return False
+        except SnapshotError:
+            pass
+
+    print("✅ Session snapshot test passed!")
+    return True
+
+def test_funnel_analytics():
+    """Test the funnel report built from the event log, in one process and split across several"""
+    print("\n🧪 Testing Funnel Analytics...")
+    with tempfile.TemporaryDirectory() as directory:
+        log = EventLog(directory, max_bytes=2000)
+        chatbot = NursingCollegeChatbot(event_log=log)
+        turns = {
+            "done": ["hello"] + ["yes"] * 11,
+            "no_bio": ["hi", "yes", "no"],
+            'quote "user" ✓': ["hi", "yes", "yes", "yes", "purple", "purple", "no"],
+            "quiet": ["namaste", "haan"],
+        }
+        for user_id, messages in turns.items():
+            for message in messages:
+                chatbot.get_response(user_id, message)
+        log.flush()
+        # Two days later: one user starts over, one arrives mid-conversation
+        later = time.time() + 2 * 86400
+        log.record(later, "done", "initial", "admission_interest", "en", Intent.YES)
+        log.record(later + 1, "stranger", "fee_structure", "hostel_facilities", "en", Intent.YES)
+        log.close()
+
+        paths = segment_paths([directory])
+        report = analyze(paths)
+        funnel = report.funnel()
+        reached = {row['stage']: row['reached'] for row in funnel['stages']}
+        exits = {row['stage']: row['exits'] for row in funnel['stages'] if row['exits']}
+        if (funnel['conversations'], funnel['completed']) != (5, 1) or reached['program_details'] != 2 \
+                or reached['hostel_facilities'] != 1 or reached['completed'] != 1:
+            print(f"❌ Unexpected funnel: {funnel}")
+            return False
+        if exits != {'admission_interest': {'went_quiet': 1},
+                     'biology_check': {'no_biology': 1, 'went_quiet': 1},
+                     'fee_structure': {'said_no': 1}}:
+            print(f"❌ Unexpected exits: {exits}")
+            return False
+        if report.funnel(lang='hi')['conversations'] != 1 or len(report.days()) != 2:
+            print("❌ Funnel was not split by language and day")
+            return False
+        if report.clarifications() != [{'state': 'fee_structure', 'turns': 2, 'conversations': 1,
+                                        'turns_per_conversation': 2.0}]:
+            print(f"❌ Unexpected clarifications: {report.clarifications()}")
+            return False
+        if report.completion_percentiles()[50] is None or report.completion_percentiles('hi')[50] is not None:
+            print("❌ Completion times were not measured")
+            return False
+        if analyze_parallel(paths, 3).to_dict() != report.to_dict():
+            print("❌ Report split across processes differs")
+            return False
+        if "no biology" not in format_report(report):
+            print("❌ Text report is missing biology exits")
+            return False
+
+    # Questions answered in place are not clarifications
+    with tempfile.TemporaryDirectory() as directory:
+        log = EventLog(directory)
+        chatbot = NursingCollegeChatbot(event_log=log)
+        for message in ["hi", "is hostel available", "how many seats", "yes", "purple"]:
+            chatbot.get_response("asker", message)
+        log.close()
+        if analyze(segment_paths([directory])).clarifications() != [
+                {'state': 'biology_check', 'turns': 1, 'conversations': 1, 'turns_per_conversation': 1.0}]:
+            print("❌ FAQ answers counted as clarifications")
+            return False
+
+    print("✅ Funnel analytics test passed!")
+    return True
+
+def test_tenants():
+    """Test several colleges served from data files, routed by tenant_id and reloaded in place"""
+    print("\n🧪 Testing Tenants...")
+    with tempfile.TemporaryDirectory() as directory:
+        def write(tenant_id, data):
+            path = os.path.join(directory, tenant_id + ".json")
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            # A later mtime, however coarse the filesystem clock
+            stamp = os.stat(path).st_mtime_ns + 10 ** 9
+            os.utime(path, ns=(stamp, stamp))
+
+        fees = {lang: text.replace("₹60,000", "₹75,000") for lang, text in MESSAGES['fee_structure'].items()}
+        write("ranchi", {'messages': {'fee_structure': fees, 'college_location': {'en': "We are in Ranchi."}}})
+        write("no_hostel", {'flow': {'fee_structure': {
+            'on_yes': 'college_location', 'yes_reply': 'college_location',
+            'on_no': 'end', 'no_reply': 'end', 'clarify': 'fee_structure'}}})
+        default = NursingCollegeChatbot()
+        registry = TenantRegistry(directory, lambda content: NursingCollegeChatbot(content=content), default)
+        app = ChatbotASGI(default, registry)
+
+        ranchi = registry.get("ranchi")
+        if sorted(registry) != ["default", "no_hostel", "ranchi"] or registry.get() is not default:
+            print(f"❌ Unexpected tenants: {sorted(registry)}")
+            return False
+        if ranchi.content.messages['hostel_facilities'] is not DEFAULT_CONTENT.messages['hostel_facilities'] \
+                or ranchi.content.flow is not DEFAULT_CONTENT.flow \
+                or ranchi.get_college_location_message('hi') != "We are in Ranchi.":
+            print("❌ Tenant content did not fall back to the shared built-in content")
+            return False
+
+        for message in ["hello", "yes", "yes"]:
+            status, body = asgi_request(app, 'POST', '/chat', {'message': message, 'user_id': "u", 'tenant_id': "ranchi"})
+        status, body = asgi_request(app, 'POST', '/chat', {'message': "yes", 'user_id': "u", 'tenant_id': "ranchi"})
+        if status != 200 or "₹75,000" not in body['response'] or "u" in default.sessions:
+            print(f"❌ /chat was not routed to the tenant: {status} {body}")
+            return False
+        if body['response'] not in app.replies:
+            print("❌ Tenant replies were not pre-encoded")
+            return False
+        if asgi_request(app, 'POST', '/chat', {'message': "hi", 'tenant_id': "nowhere"})[0] != 404:
+            print("❌ Unknown tenant was not rejected")
+            return False
+
+        skip = registry.get("no_hostel")
+        for message in ["hello", "yes", "yes", "yes"]:
+            skip.get_response("u", message)
+        if "College Location" not in skip.get_response("u", "yes"):
+            print("❌ Tenant flow did not skip the hostel step")
+            return False
+
+        # A changed file is swapped in without losing sessions; a broken one leaves the old content
+        write("ranchi", {'messages': {'fee_structure': fees, 'college_location': {'en': "We moved to Hazaribagh."}}})
+        write("no_hostel", {'messages': {'fee_structure': "oops"}})
+        if registry.reload() != ["ranchi"] or registry.get("ranchi") is not ranchi:
+            print("❌ Reload did not swap the changed tenant in place")
+            return False
+        ranchi.get_response("u", "yes")
+        if "Hazaribagh" not in ranchi.get_response("u", "yes") or ranchi.get_session("u").state \
+                != ConversationState.COLLEGE_LOCATION:
+            print("❌ Conversation did not carry on with the new content")
+            return False
+        if "College Location" not in registry.get("no_hostel").get_college_location_message('en'):
+            print("❌ A broken tenant file replaced working content")
+            return False
+        # A reply key of the wrong type is a broken file too, and reloading carries on past it
+        write("no_hostel", {'flow': {'fee_structure': {
+            'on_yes': 'college_location', 'yes_reply': 5, 'on_no': 'end', 'no_reply': 'end'}}})
+        registry.reload()
+        write("no_hostel", {'messages': {'college_location': {'en': "Fixed."}}})
+        if registry.reload() != ["no_hostel"] or registry.get("no_hostel").get_college_location_message('en') != "Fixed.":
+            print("❌ A valid edit after a mistyped one was not loaded")
+            return False
+        os.remove(os.path.join(directory, "ranchi.json"))
+        if registry.reload() != ["ranchi"] or "ranchi" in registry:
+            print("❌ Removed tenant is still served")
+            return False
+
+        for data in ({'messages': {'final': {'hi': "no english"}}}, {'flow': {'nowhere': {}}},
+                     {'flow': {'end': {'on_yes': 'end', 'yes_reply': 'missing', 'on_no': 'end', 'no_reply': 'end'}}},
+                     {'flow': {'end': {'on_yes': 'end', 'yes_reply': 5, 'on_no': 'end', 'no_reply': 'end'}}},
+                     {'flow': {'end': {'on_yes': 'end', 'yes_reply': 'end', 'on_no': 'end', 'no_reply': 'end',
+                                       'clarify': ['final']}}},
+                     {'flow': {'end': {'on_yes': 'end', 'yes_reply': 'end', 'on_no': 'end', 'no_reply': 'end',
+                                       'flag': 'state'}}},
+                     {'message': {}}):
+            try:
+                NursingCollegeChatbot(content=load_content(data))
+                print(f"❌ Invalid tenant data was accepted: {data}")
+                return False
+            except ValueError:
+                pass
+
+    print("✅ Tenants test passed!")
+    return True
+
+def test_websocket_channel():
+    """Test the WebSocket channel binds the user once and answers frame for frame like POST /chat"""
+    print("\n🧪 Testing WebSocket Channel...")
+    chatbot = NursingCollegeChatbot()
+    app = ChatbotASGI(chatbot)
+    messages = ["hello", "yes", "hmm", "haan"]
+
+    sent = asgi_websocket(app, '/ws', b'user_id=ws_user', messages[:2] + [b"hmm", "haan"])
+    if [m['type'] for m in sent[:2]] != ['websocket.accept', 'websocket.send'] \
+            or json.loads(sent[1]['text']) != {'user_id': "ws_user"}:
+        print(f"❌ Socket was not accepted and bound: {sent[:2]}")
+        return False
+    http = ChatbotASGI(NursingCollegeChatbot())
+    expected = [asgi_request(http, 'POST', '/chat', {'message': m, 'user_id': "ws_user"})[1]['response']
+                for m in messages]
+    if [m['text'] for m in sent[2:]] != expected:
+        print("❌ Socket replies differ from POST /chat")
+        return False
+    if chatbot.get_session("ws_user").state != ConversationState.PROGRAM_DETAILS:
+        print("❌ Socket turns did not advance the bound session")
+        return False
+
+    # The page starts over HTTP, then carries on over a socket for the same user
+    status, body = asgi_request(app, 'POST', '/chat', {'message': "hello", 'user_id': None})
+    if not body['user_id']:
+        print("❌ A null user_id was echoed back instead of a new one")
+        return False
+    sent = asgi_websocket(app, '/ws', ('user_id=' + body['user_id']).encode(), ["yes"])
+    if sent[-1]['text'] != chatbot.get_biology_check_message('en'):
+        print("❌ Socket did not continue the HTTP conversation")
+        return False
+
+    anonymous = asgi_websocket(app, '/ws', b'', [])
+    if not json.loads(anonymous[1]['text'])['user_id']:
+        print("❌ Socket without a user id was not given one")
+        return False
+    for path, query in (('/nope', b''), ('/ws', b'tenant_id=nowhere')):
+        sent = asgi_websocket(app, path, query, ["hello"])
+        if [m['type'] for m in sent] != ['websocket.close']:
+            print(f"❌ Socket to {path}?{query} was not refused: {sent}")
+            return False
+    sent = asgi_websocket(app, '/ws', b'user_id=big', ["x" * 5000, "hello"])
+    if sent[-1] != {'type': 'websocket.close', 'code': 1009}:
+        print("❌ Oversized message did not close the socket")
+        return False
+
+    sent = []
+
+    async def page_request():
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            sent.append(message)
+        await app({'type': 'http', 'method': 'GET', 'path': '/'}, receive, send)
+    asyncio.run(page_request())
+    if sent[0]['status'] != 200 or b"new WebSocket" not in sent[1]['body']:
+        print("❌ Chat page with the socket upgrade was not served")
+        return False
+
+    print("✅ WebSocket channel test passed!")
+    return True
+
+def test_sticky_routing():
+    """Test the router keeps each user on one worker and hands sessions over when workers change"""
+    print("\n🧪 Testing Sticky Routing...")
+    def worker(name):
+        return ASGIWorker(name, ChatbotASGI(NursingCollegeChatbot(), router_token="secret"))
+
+    def chat(router, payload):
+        response = asyncio.run(router.dispatch('POST', '/chat', [], json.dumps(payload).encode()))
+        return response.status, json.loads(response.body)
+
+    # Workers never share a snapshot file
+    envs = [worker_env(name, "secret", {'CHATBOT_SNAPSHOT': '/var/lib/chatbot/sessions.snap'})
+            for name in ('worker-0', 'worker-1')]
+    if [env['CHATBOT_SNAPSHOT'] for env in envs] != ['/var/lib/chatbot/sessions-worker-0.snap',
+                                                     '/var/lib/chatbot/sessions-worker-1.snap'] \
+            or envs[1]['CHATBOT_WORKER_ID'] != 'worker-1' or 'CHATBOT_SNAPSHOT' in worker_env('w', 's', {}):
+        print(f"❌ Unexpected worker environments: {envs}")
+        return False
+
+    ring = HashRing(['a', 'b', 'c'])
+    keys = ['user-%d' % i for i in range(3000)]
+    grown = HashRing(['a', 'b', 'c', 'd'])
+    moved = [key for key in keys if ring.node_for(key) != grown.node_for(key)]
+    if not all(grown.node_for(key) == 'd' for key in moved) or not 500 < len(moved) < 1000:
+        print(f"❌ Adding a node moved {len(moved)} of {len(keys)} keys, not just the new node's share")
+        return False
+
+    router = Router([worker('w0'), worker('w1'), worker('w2')], token="secret")
+    users = ['router_user_%d' % i for i in range(60)]
+    reference = NursingCollegeChatbot()
+    for message in ("hello", "yes"):
+        for user_id in users:
+            expected = reference.get_response(user_id, message)
+            if chat(router, {'user_id': user_id, 'message': message}) != (200, {'response': expected, 'user_id': user_id}):
+                print(f"❌ Routed reply for {user_id} differs from a single chatbot")
+                return False
+    for user_id in users:
+        holders = [name for name, w in router.workers.items() if user_id in w.app.chatbot.sessions]
+        if holders != [router.ring.node_for(user_id)]:
+            print(f"❌ Session of {user_id} is on {holders}, not on its owner")
+            return False
+    status, body = chat(router, {'message': "hello"})
+    if 'user_id' not in body or body['user_id'] not in router.owner(body['user_id']).app.chatbot.sessions:
+        print("❌ A new user was not given an id on the worker owning it")
+        return False
+
+    batch = [{'user_id': user_id, 'message': "what is the fee"} for user_id in users[:12]]
+    response = asyncio.run(router.dispatch('POST', '/chat/batch', [], json.dumps({'messages': batch}).encode()))
+    if [item['user_id'] for item in json.loads(response.body)['responses']] != users[:12]:
+        print("❌ A batch split over workers did not come back in order")
+        return False
+    for path in ('/sessions/export', '/sessions/import'):
+        response = asyncio.run(router.dispatch('POST', path, [], b'{"nodes": []}'))
+        status, _ = asgi_request(router.workers['w0'].app, 'POST', path, {'nodes': []})
+        if response.status != 404 or status != 404:
+            print(f"❌ {path} was reachable without the router's token")
+            return False
+
+    moved = asyncio.run(router.add_worker(worker('w3')))
+    if moved != len(router.workers['w3'].app.chatbot.sessions) or not 0 < moved < 35:
+        print(f"❌ Adding a worker moved {moved} sessions")
+        return False
+    asyncio.run(router.remove_worker('w0'))
+    for user_id in users:
+        expected = reference.get_response(user_id, "yes")
+        if chat(router, {'user_id': user_id, 'message': "yes"})[1]['response'] != expected:
+            print(f"❌ Conversation of {user_id} did not survive the workers changing")
+            return False
+
+    print("✅ Sticky routing test passed!")
+    return True
+
+def test_rate_limiting():
+    """Test token buckets refuse floods and a repeated message is answered once"""
+    print("\n🧪 Testing Rate Limiting...")
+    now = [0.0]
+    buckets = TokenBuckets(rate=1, burst=3, clock=lambda: now[0])
+    if [buckets.take("flood") for _ in range(3)] != [0.0] * 3 or not 0.9 < buckets.take("flood") <= 1.0:
+        print("❌ Bucket did not allow its burst and then refuse")
+        return False
+    now[0] = 1.0
+    if buckets.take("flood") != 0.0 or buckets.take("flood") == 0.0:
+        print("❌ Bucket did not refill one token a second")
+        return False
+    now[0] = 10.0
+    buckets.take("other")
+    if len(buckets) != 1:
+        print("❌ A full bucket was kept in the table")
+        return False
+    bounded = TokenBuckets(rate=1, burst=1, max_keys=2, clock=lambda: now[0])
+    for key in ("a", "b", "c"):
+        bounded.take(key)
+    if len(bounded) != 2:
+        print("❌ Bucket table grew past max_keys")
+        return False
+
+    calls = []
+    coalescer = Coalescer(window=2.0, clock=lambda: now[0])
+    def turn():
+        calls.append(1)
+        return "reply %d" % len(calls)
+    replies = [coalescer.run("user", "yes", turn) for _ in range(2)]
+    if replies != [("reply 1", False), ("reply 2", False)] or len(coalescer) != 0:
+        print(f"❌ 'yes' sent twice in a row was not answered twice: {replies}")
+        return False
+    retries = [coalescer.run("user", "yes", turn, "m1") for _ in range(2)]
+    now[0] = 11.0
+    later = coalescer.run("user", "yes", turn, "m1")
+    if retries != [("reply 3", False), ("reply 3", True)] or later != ("reply 3", True):
+        print(f"❌ Retried message was not answered once: {retries}, {later}")
+        return False
+    now[0] = 13.5
+    late = coalescer.run("user", "yes", turn, "m1")
+    coalescer.forget("user")
+    if late != ("reply 4", False) or coalescer.run("user", "yes", turn, "m1")[1] or coalescer.run("user", "yes", turn, "m2")[1]:
+        print("❌ Retry after the window, a reset or a new message id was coalesced")
+        return False
+
+    # A retry arriving while the first request is still running waits for its reply
+    started, release = threading.Event(), threading.Event()
+    def slow_turn():
+        started.set()
+        release.wait()
+        return turn()
+    first = []
+    worker = threading.Thread(target=lambda: first.append(coalescer.run("slow", "hi", slow_turn)))
+    worker.start()
+    started.wait()
+    retry = []
+    waiter = threading.Thread(target=lambda: retry.append(coalescer.run("slow", "hi", turn)))
+    waiter.start()
+    time.sleep(0.05)
+    release.set()
+    worker.join()
+    waiter.join()
+    if retry != [(first[0][0], True)]:
+        print(f"❌ In-flight retry got {retry}, not the first reply {first}")
+        return False
+
+    chatbot = NursingCollegeChatbot()
+    app = ChatbotASGI(chatbot, limiter=RateLimiter(TokenBuckets(1, 5), TokenBuckets(1, 2), Coalescer(2.0)))
+    for message in ("hello", "yes", "yes"):
+        asgi_request(app, 'POST', '/chat', {'user_id': "double", 'message': message})
+    if chatbot.get_session("double").state != ConversationState.PROGRAM_DETAILS:
+        print("❌ 'yes' sent twice in a row did not advance the conversation twice")
+        return False
+    replies = [asgi_request(app, 'POST', '/chat', {'user_id': "double", 'message': "yes", 'message_id': "m1"})
+               for _ in range(2)]
+    if replies[0] != replies[1] or chatbot.get_session("double").state != ConversationState.FEE_STRUCTURE:
+        print("❌ Retry with the same message id moved the conversation twice")
+        return False
+    if asgi_request(app, 'POST', '/chat', {'user_id': "double", 'message': "haan"}) != (429, {'error': "too many requests"}):
+        print("❌ User over the limit was not refused")
+        return False
+    proxy = {'client': ('127.0.0.1', 1), 'headers': [(b'x-forwarded-for', b'198.51.100.1')]}
+    statuses = [asgi_request(app, 'POST', '/chat', {'user_id': "u%d" % i, 'message': "hello"}, **proxy)[0]
+                for i in range(3)]
+    other = asgi_request(app, 'POST', '/chat', {'message': "hello"}, client=('198.51.100.2', 1))[0]
+    if statuses != [200, 200, 429] or other != 200:
+        print(f"❌ Address limit behind a local proxy gave {statuses}, another address {other}")
+        return False
+
+    print("✅ Rate limiting test passed!")
+    return True
+
+FUZZ_REPLIES = {
+    'yes': ['yes', 'Yes', 'ok', 'sure', 'tell me more', 'YES!!', '  okay  ', 'yess',
+            'haan', 'haan ji', 'batao', 'bilkul', 'हाँ haan', 'zaroor', 'yes I studied biology',
+            'haan maine biology padhi hai', 'yes, in 12th', 'yes my age is 18'],
+    'no': ['no', 'No', 'nope', 'no thanks', 'nahi', 'नहीं, nahi', 'nhi', 'nahin'],
+    'question': ['what is the fee?', 'hostel kaisa hai', 'फीस कितनी है?', 'where is the college'],
+}
+
+def fuzz_message(rng):
+    """A yes, no or question in either language, or gibberish, with random case and padding"""
+    kind = rng.choice(['yes', 'no', 'question', 'gibberish', 'gibberish'])
+    if kind != 'gibberish':
+        text = rng.choice(FUZZ_REPLIES[kind])
+    elif rng.random() < 0.5:
+        text = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz ?!.') for _ in range(rng.randint(0, 12)))
+    else:
+        text = ''.join(chr(rng.randint(0x0900, 0x097F)) for _ in range(rng.randint(1, 6)))
+    if rng.random() < 0.2:
+        text = text.upper() if rng.random() < 0.5 else text.title()
+    return ' ' * rng.randint(0, 2) + text + ' ' * rng.randint(0, 2)
+
+def test_state_machine_fuzz():
+    """Test random yes/no/gibberish conversations in both languages only take valid transitions"""
+    print("\n🧪 Testing State Machine Fuzz...")
+    seed = 2024
+    rng = random.Random(seed)
+    chatbot = NursingCollegeChatbot()
+    replies = set(chatbot.reply_texts())
+    middle = set(list(FLOW)[list(FLOW).index(ConversationState.PROGRAM_DETAILS):-1])
+    conversations = {"fuzz-%d" % i: [fuzz_message(rng) for _ in range(rng.randint(1, 25))] for i in range(200)}
+    answers = {text.lower() for text in FUZZ_REPLIES['yes']}
+
+    for user_id, messages in conversations.items():
+        session = chatbot.get_session(user_id)
+        for turn, message in enumerate(messages):
+            state, step = session.state, FLOW[session.state]
+            intent = chatbot.classify_intent(message)
+            reply = chatbot.get_response(user_id, message)
+            new_state = session.state
+            problem = None
+            if reply not in replies:
+                problem = f"unknown reply {reply[:40]!r}"
+            elif session.language != chatbot.detect_language(message):
+                problem = f"language {session.language}"
+            elif new_state not in (state, step.on_yes, step.on_no):
+                problem = f"jumped to {new_state.name}"
+            elif new_state != state and not (
+                    (intent is Intent.YES or step.clarify is None) and new_state == step.on_yes
+                    or intent is Intent.NO and new_state == step.on_no):
+                problem = f"moved to {new_state.name} on {intent.name}"
+            elif step.clarify is not None and intent is Intent.UNKNOWN and new_state != state:
+                problem = "moved on an unclear reply"
+            elif step.clarify is not None and message.strip().lower() in answers and new_state == state:
+                problem = "stayed put on a yes"
+            elif new_state in middle and not (session.admission_interested and session.biology_studied):
+                problem = f"in {new_state.name} without a yes to admission and Biology"
+            if problem:
+                print(f"❌ Seed {seed}, {user_id} turn {turn}: {message!r} in {state.name}: {problem}")
+                return False
+
+    # The same conversations interleaved through the batch path give the same replies
+    one_by_one, batched = NursingCollegeChatbot(), NursingCollegeChatbot()
+    pending = {user_id: list(messages) for user_id, messages in conversations.items()}
+    interleaved = []
+    while pending:
+        user_id = rng.choice(sorted(pending))
+        interleaved.append((user_id, pending[user_id].pop(0)))
+        if not pending[user_id]:
+            del pending[user_id]
+    expected = [one_by_one.get_response(user_id, text) for user_id, text in interleaved]
+    for start in range(0, len(interleaved), 64):
+        if batched.get_responses_batch(interleaved[start:start + 64]) != expected[start:start + 64]:
+            print(f"❌ Seed {seed}: batched replies differ from one call per message")
+            return False
+
+    print(f"✅ State machine fuzz test passed! ({sum(map(len, conversations.values()))} turns)")
+    return True
+
+def test_perf_baselines():
+    """Test the regression check flags a slower hot path and every hot path has a baseline"""
+    print("\n🧪 Testing Performance Baselines...")
+    baselines = {'a': 1.0, 'b': 2.0}
+    changes = {c.name: c for c in compare(baselines, {'a': 1.2, 'b': 2.6, 'new': 5.0}, 0.25)}
+    if changes['a'].regressed or not changes['b'].regressed or changes['new'].regressed:
+        print(f"❌ Wrong regressions: {changes}")
+        return False
+
+    recorded = load_baselines(DEFAULT_BASELINES)
+    missing = [path.name for path in hot_paths() if path.name not in recorded]
+    if missing:
+        print(f"❌ Hot paths without a baseline, run benchmarks.bench_regression --record: {missing}")
+        return False
+
+    print("✅ Performance baselines test passed!")
+    return True
+
 def main():
     """Run all tests"""
     print("🚀 Starting Nursing College Chatbot Tests\n")
@@ -190,7 +1609,32 @@ def main():
         test_biology_requirement,
         test_response_detection,
         test_required_topics,
-        test_fee_structure
+        test_fee_structure,
+        test_flow_table,
+        test_intent_classifier,
+        test_session_store,
+        test_user_session,
+        test_session_history,
+        test_sqlite_sessions,
+        test_concurrent_turns,
+        test_asgi_endpoints,
+        test_batch_responses,
+        test_reply_cache,
+        test_language_detection,
+        test_classification_cache,
+        test_replay_corpus,
+        test_metrics,
+        test_faq_answers,
+        test_fuzzy_intents,
+        test_event_log,
+        test_session_snapshot,
+        test_funnel_analytics,
+        test_tenants,
+        test_websocket_channel,
+        test_sticky_routing,
+        test_rate_limiting,
+        test_state_machine_fuzz,
+        test_perf_baselines
     ]
     
     passed = 0